@@ -33,9 +33,18 @@ while (!db.isMaster().ismaster) {
 }
 ______________________MONGO_SCRIPT______________________
 
+# Forward the stop signals to the server so it shuts down cleanly, and stop restarting it
+trap 'STOPPING=1; kill -TERM ${SERVER_PID} 2> /dev/null' TERM INT
+
 # Keep the python server in a loop
-while true
+while [ -z "${STOPPING}" ]
 do
-    python $(dirname $0)/server.py
-    sleep 5
+    python $(dirname $0)/server.py &
+    SERVER_PID=$!
+
+    # The first wait returns as soon as a signal is trapped, the second one waits for the shutdown
+    wait ${SERVER_PID}
+    wait ${SERVER_PID} 2> /dev/null
+
+    [ -z "${STOPPING}" ] && sleep 5
 done
\ No newline at end of file
@@ -15,15 +15,21 @@ limitations under the License.
 """
 
 import logging
+from collections import namedtuple
 
 from tornado.gen import coroutine, Return
-from tornado.httpclient import AsyncHTTPClient
+from tornado.httpclient import AsyncHTTPClient, HTTPError
 from tornado.httputil import url_concat
 
 from api.heapster.metrics import Metric
 
 AsyncHTTPClient.configure("tornado.curl_httpclient.CurlAsyncHTTPClient")
 
+DEFAULT_MAX_CONNECTIONS = 10
+
+MetricQuery = namedtuple("MetricQuery", ["entity", "metric_name", "name", "namespace", "pod_name"])
+MetricQuery.__new__.__defaults__ = (None, None, None)
+
 
 class HeapsterClient(object):
 
@@ -35,10 +41,13 @@ class HeapsterClient(object):
         "containers": "namespaces/{namespace}/pods/{pod_name}/containers/"
     }
 
-    def __init__(self, endpoint):
+    def __init__(self, endpoint, max_connections=DEFAULT_MAX_CONNECTIONS):
         self.endpoint = endpoint
+        self.max_connections = max_connections
         self.metrics = {}
 
+        self._client = None
+
         self.build_metrics()
 
     def __getitem__(self, item):
@@ -75,23 +84,52 @@ class HeapsterClient(object):
         for metric_entity, metric_path in self.METRICS_METADATA.iteritems():
             self.metrics[metric_entity] = Metric(self, metric_path)
 
+    @property
+    def client(self):
+        # Shared by all the requests, max_connections also caps how many requests are in flight
+        if self._client is None:
+            self._client = AsyncHTTPClient(force_instance=True, max_clients=self.max_connections)
+
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
     @coroutine
     def is_heapster_available(self):
-        client = AsyncHTTPClient(force_instance=True)
-        try:
-            result = yield client.fetch(self.endpoint + "/metrics", method="GET", raise_error=False)
-            raise Return(not result.error)
-        finally:
-            client.close()
+        result = yield self.client.fetch(self.endpoint + "/metrics", method="GET", raise_error=False)
+        raise Return(not result.error)
 
     @coroutine
     def get(self, url_path, raise_error=True, **kwargs):
         params = self.build_params(url_path, **kwargs)
         url = url_concat(self.build_url(url_path, **kwargs), params)
 
-        client = AsyncHTTPClient(force_instance=True)
+        response = yield self.client.fetch(url, method="GET", raise_error=raise_error)
+        raise Return(response)
+
+    @coroutine
+    def metrics_batch(self, queries):
+        """Retrieves many metrics concurrently.
+
+        Takes an iterable of MetricQuery and returns a dict with the response of every query, or None when the
+        metric is not available. The requests share the pooled client, so at most max_connections are in flight.
+        """
+
+        results = yield dict((query, self._get_metric(query)) for query in set(queries))
+        raise Return(results)
+
+    @coroutine
+    def _get_metric(self, query):
+        params = dict((key, value) for key, value in [("namespace", query.namespace), ("pod_name", query.pod_name)]
+                      if value is not None)
+
         try:
-            response = yield client.fetch(url, method="GET", raise_error=raise_error)
-            raise Return(response)
-        finally:
-            client.close()
+            response = yield self.metrics[query.entity].metric(query.metric_name, name=query.name, **params)
+        except HTTPError as http_error:
+            logging.warning("Failed to retrieve metric %s: %s", query, http_error)
+            response = None
+
+        raise Return(response)
@@ -18,29 +18,74 @@ import json
 import logging
 import urlparse
 
+import pycurl
 from tornado.gen import coroutine, Return
 from tornado.concurrent import Future, chain_future
 from tornado.httpclient import AsyncHTTPClient, HTTPError, HTTPRequest
 from tornado.httputil import url_concat
 
 from api.kube.exceptions import KubernetesException, ResourceNotFoundException
+from api.kube.informer import InformerRegistry
 from api.kube.pods import Pods
 from api.kube.resources import Resource, NamespacedResource
+from api.kube.stream import JSONStreamDecoder
+
+DEFAULT_MAX_CONNECTIONS = 10
+KEEPALIVE_IDLE = 60
+KEEPALIVE_INTERVAL = 30
 
 
 class HTTPClient(object):
 
-    def __init__(self, endpoint, token=None):
+    def __init__(self, endpoint, token=None, max_connections=DEFAULT_MAX_CONNECTIONS):
         self.endpoint = endpoint
         self.token = token
+        self.max_connections = max_connections
 
         if endpoint.startswith("http"):
             self._base_url = self.endpoint
         else:
             self._base_url = "https://%s" % self.endpoint
 
+        self._client = None
+        self._curl_share = None
+
         AsyncHTTPClient.configure("tornado.curl_httpclient.CurlAsyncHTTPClient", defaults=dict(validate_cert=False))
 
+    @property
+    def client(self):
+        # Long-lived client shared by every non streaming request, curl keeps the connections alive and
+        # the TLS sessions cached between requests, so only the first request to the host pays the handshake
+        if self._client is None:
+            self._curl_share = pycurl.CurlShare()
+            self._curl_share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+            self._curl_share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+
+            self._client = AsyncHTTPClient(
+                force_instance=True,
+                max_clients=self.max_connections,
+                defaults=dict(validate_cert=False, prepare_curl_callback=self._prepare_curl))
+
+            logging.debug("Created HTTPClient pool with %d connections for %s", self.max_connections, self._base_url)
+
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            logging.debug("HTTPClient pool for %s closed", self._base_url)
+
+        if self._curl_share is not None:
+            self._curl_share.close()
+            self._curl_share = None
+
+    def _prepare_curl(self, curl):
+        curl.setopt(pycurl.SHARE, self._curl_share)
+        curl.setopt(pycurl.TCP_KEEPALIVE, 1)
+        curl.setopt(pycurl.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+        curl.setopt(pycurl.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+
     def get_base_url(self):
         return self._base_url
 
@@ -81,90 +126,68 @@ class HTTPClient(object):
         else:
             url = url_concat(url_path, params)
 
-        client = AsyncHTTPClient(force_instance=True)
-        try:
-            result = yield client.fetch(url, method=method, headers=self.build_headers())
-            raise Return(result)
-        finally:
-            client.close()
+        result = yield self.client.fetch(url, method=method, headers=self.build_headers())
+        raise Return(result)
 
     @coroutine
     def get(self, url_path, **kwargs):
         params = self.build_params(url_path, **kwargs)
         url = url_concat(self.build_url(url_path, **kwargs), params)
 
-        client = AsyncHTTPClient(force_instance=True)
-        try:
-            result = yield client.fetch(url, method="GET", headers=self.build_headers())
-            raise Return(result)
-        finally:
-            client.close()
+        result = yield self.client.fetch(url, method="GET", headers=self.build_headers())
+        raise Return(result)
 
     @coroutine
     def post(self, url_path, **kwargs):
         url = self.build_url(url_path, **kwargs)
         params = self.build_params(url_path, **kwargs)
 
-        client = AsyncHTTPClient(force_instance=True)
-        try:
-            result = yield client.fetch(
-                url,
-                method="POST",
-                headers=self.build_headers("application/json"),
-                **params)
+        result = yield self.client.fetch(
+            url,
+            method="POST",
+            headers=self.build_headers("application/json"),
+            **params)
 
-            raise Return(result)
-        finally:
-            client.close()
+        raise Return(result)
 
     @coroutine
     def put(self, url_path, **kwargs):
         url = self.build_url(url_path, **kwargs)
         params = self.build_params(url_path, **kwargs)
 
-        client = AsyncHTTPClient(force_instance=True)
-        try:
-            result = yield client.fetch(
-                url,
-                method="PUT",
-                headers=self.build_headers("application/json"),
-                **params)
+        result = yield self.client.fetch(
+            url,
+            method="PUT",
+            headers=self.build_headers("application/json"),
+            **params)
 
-            raise Return(result)
-        finally:
-            client.close()
+        raise Return(result)
 
     @coroutine
     def delete(self, url_path, **kwargs):
-        client = AsyncHTTPClient(force_instance=True)
-        try:
-            response = yield client.fetch(
-                self.build_url(url_path, **kwargs),
-                method="DELETE",
-                headers=self.build_headers())
-            raise Return(response)
-        finally:
-            client.close()
+        response = yield self.client.fetch(
+            self.build_url(url_path, **kwargs),
+            method="DELETE",
+            headers=self.build_headers())
+        raise Return(response)
 
     @coroutine
     def patch(self, url_path, **kwargs):
         url = self.build_url(url_path, **kwargs)
         params = self.build_params(url_path, **kwargs)
 
-        client = AsyncHTTPClient(force_instance=True)
-        try:
-            result = yield client.fetch(
-                url,
-                method="PATCH",
-                headers=self.build_headers("application/merge-patch+json"),
-                **params)
+        result = yield self.client.fetch(
+            url,
+            method="PATCH",
+            headers=self.build_headers("application/merge-patch+json"),
+            **params)
 
-            raise Return(result)
-        finally:
-            client.close()
+        raise Return(result)
 
     def watch(self, url_path, on_data, **kwargs):
-        local_data = dict(buffer="")
+        # Watches hold their connection open for up to an hour and are cancelled by closing the client,
+        # so they get a dedicated client instead of taking a slot from the shared pool
+        decoder = JSONStreamDecoder(on_data)
 
         class WatchFuture(Future):
 
@@ -172,14 +195,9 @@ class HTTPClient(object):
                 client.close()
                 logging.debug("AsyncHTTPClient closed")
 
-        def data_callback(data):
-            split_data = data.split("\n")
-            for index, fragment in enumerate(split_data):
-                if index + 1 < len(split_data):
-                    on_data(json.loads(local_data["buffer"] + fragment))
-                    local_data["buffer"] = ""
-                else:
-                    local_data["buffer"] += fragment
+            @staticmethod
+            def stats():
+                return decoder.stats()
 
         params = self.build_params(url_path, **kwargs)
         url = url_concat(self.build_url(url_path, **kwargs), params)
@@ -189,10 +207,11 @@ class HTTPClient(object):
             method="GET",
             headers=self.build_headers(),
             request_timeout=3600,
-            streaming_callback=data_callback)
+            streaming_callback=decoder.feed)
 
         client = AsyncHTTPClient(force_instance=True)
         future = WatchFuture()
+        future.add_done_callback(lambda _: logging.debug("Watch %s closed with stats %s", url_path, decoder.stats()))
 
         chain_future(client.fetch(request), future)
         return future
@@ -228,8 +247,9 @@ class KubeClient(object):
         "services": "Service"
     }
 
-    def __init__(self, endpoint, token=None):
-        self.http_client = HTTPClient(endpoint, token)
+    def __init__(self, endpoint, token=None, max_connections=DEFAULT_MAX_CONNECTIONS):
+        self.http_client = HTTPClient(endpoint, token, max_connections=max_connections)
+        self.informers = InformerRegistry(self)
         self.resources = {}
         self.kind_to_resource = {}
 
@@ -259,6 +279,10 @@ class KubeClient(object):
         else:
             raise Return()
 
+    def close(self):
+        self.informers.close()
+        self.http_client.close()
+
     def get_resource_type(self, kind):
         if kind not in self.kind_to_resource.keys():
             raise ResourceNotFoundException("Resource %s not found." % kind)
@@ -0,0 +1,164 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+
+from tornado.concurrent import Future
+from tornado.gen import coroutine, Return
+
+from api.kube.exceptions import ResourceNotFoundException
+from api.kube.resumable import ResumableWatch
+
+
+class Informer(object):
+    """Keeps an in-memory copy of a Kubernetes resource using a single resumable LIST+WATCH.
+
+    Objects are indexed by uid and by name, the stored objects are shared between all the
+    subscribers so they must be treated as read only.
+    """
+
+    def __init__(self, resource, resource_name, params):
+        self.resource_name = resource_name
+        self.params = params
+        self.single_object = "name" in params
+
+        self.names = dict()
+
+        self._handlers = []
+        self._sync_future = None
+        self._watch = ResumableWatch(resource, self._on_event, **params)
+
+    @property
+    def kind(self):
+        return self._watch.kind
+
+    @property
+    def resource_version(self):
+        return self._watch.resource_version
+
+    @property
+    def store(self):
+        return self._watch.objects
+
+    @coroutine
+    def start(self):
+        if self._sync_future is None:
+            self._sync_future = Future()
+            try:
+                yield self._watch.relist()
+                self._sync_future.set_result(True)
+            except Exception as error:
+                future, self._sync_future = self._sync_future, None
+                future.set_exception(error)
+                raise
+
+            self.names = dict((document["metadata"]["name"], uid) for uid, document in self.store.iteritems())
+            self._watch.resume()
+        else:
+            yield self._sync_future
+
+        raise Return()
+
+    def stop(self):
+        logging.debug("Stopping informer for %s with params %s", self.resource_name, self.params)
+
+        del self._handlers[:]
+        self._watch.stop()
+
+    def add_handler(self, handler):
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+
+    def remove_handler(self, handler):
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+
+    def get(self, name):
+        uid = self.names.get(name)
+        return self.store.get(uid) if uid else None
+
+    def snapshot(self):
+        if self.single_object:
+            document = self.get(self.params["name"])
+            if document is None:
+                raise ResourceNotFoundException("%s %s not found." % (self.kind, self.params["name"]))
+
+            return document
+
+        return dict(
+            kind=self.kind + "List",
+            metadata=dict(resourceVersion=self.resource_version),
+            items=self.store.values()
+        )
+
+    def _on_event(self, event):
+        metadata = event["object"]["metadata"]
+        if event["type"] == "DELETED":
+            if self.names.get(metadata["name"]) == metadata["uid"]:
+                del self.names[metadata["name"]]
+        else:
+            self.names[metadata["name"]] = metadata["uid"]
+
+        for handler in list(self._handlers):
+            try:
+                handler(event)
+            except Exception:
+                logging.exception("Informer handler failed for %s", self.resource_name)
+
+
+class InformerRegistry(object):
+    """Shares one Informer per resource and parameters between all the subscribers.
+
+    Informers are reference counted, the last release stops the underlying watch.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._informers = dict()
+        self._references = dict()
+
+    @staticmethod
+    def _get_key(resource_name, params):
+        return resource_name, tuple(sorted((key, value) for key, value in params.iteritems()
+                                           if key != "resourceVersion"))
+
+    def acquire(self, resource_name, **params):
+        key = self._get_key(resource_name, params)
+        if key not in self._informers:
+            params.pop("resourceVersion", None)
+            self._informers[key] = Informer(self.api[resource_name], resource_name, params)
+            self._references[key] = 0
+
+        self._references[key] += 1
+        return self._informers[key]
+
+    def release(self, informer):
+        key = self._get_key(informer.resource_name, informer.params)
+        if self._informers.get(key) is not informer:
+            return
+
+        self._references[key] -= 1
+        if self._references[key] <= 0:
+            informer.stop()
+            del self._informers[key]
+            del self._references[key]
+
+    def close(self):
+        for informer in self._informers.values():
+            informer.stop()
+
+        self._informers.clear()
+        self._references.clear()
@@ -21,8 +21,11 @@ import time
 from tornado.gen import coroutine, Return
 from tornado.httpclient import HTTPError
 
+from api.heapster.client import MetricQuery
 from api.kube.resources import NamespacedResource
 
+CONTAINER_METRICS = ["cpu/limit", "memory/limit", "cpu/usage_rate", "memory/usage"]
+
 
 class Pods(NamespacedResource):
 
@@ -31,119 +34,83 @@ class Pods(NamespacedResource):
         metrics = dict(kind="MetricList", items=[], metadata=dict(resourceVersion=time.time()))
 
         if (yield heapster_client.is_heapster_available()):
-            pods = yield heapster_client.pods.get(namespace=namespace)
+            pods, pod = yield [heapster_client.pods.get(namespace=namespace), self.get(namespace=namespace, name=name)]
             if name not in pods:
                 raise Return(metrics)
 
-            node_cpu_limit = None
-            node_mem_limit = None
-
-            pod = yield self.get(namespace=namespace, name=name)
-            for container in pod["spec"]["containers"]:
-                cpu_limit_response = yield heapster_client.containers.metric(
-                    "cpu/limit",
-                    name=container["name"],
-                    namespace=namespace,
-                    pod_name=name,
-                )
-
-                if not cpu_limit_response:
-                    continue
+            node_metrics = dict()
+            responses = yield heapster_client.metrics_batch(
+                MetricQuery("containers", metric_name, name=container["name"], namespace=namespace, pod_name=name)
+                for container in pod["spec"]["containers"] for metric_name in CONTAINER_METRICS)
 
-                cpu_limits = cpu_limit_response.get("metrics", [])
-                if len(cpu_limits) == 0:
-                    continue
-
-                cpu_limit = cpu_limits[-1]["value"]
-                if cpu_limit == 0:
-                    if not node_cpu_limit:
-                        node_cpu_limit, _ = yield self._get_node_metrics(heapster_client, pod["spec"]["nodeName"])
+            def get_node_metrics():
+                # Shared by all the containers so the node capacity is only requested once
+                if "future" not in node_metrics:
+                    node_metrics["future"] = self._get_node_metrics(heapster_client, pod["spec"]["nodeName"])
 
-                    cpu_limit = node_cpu_limit
+                return node_metrics["future"]
 
-                mem_limit_response = yield heapster_client.containers.metric(
-                    "memory/limit",
-                    name=container["name"],
-                    namespace=namespace,
-                    pod_name=name,
-                )
+            @coroutine
+            def get_container_metrics(container):
+                cpu_limit_response, mem_limit_response, cpu_usage_response, mem_usage_response = [
+                    responses[MetricQuery("containers", metric_name, container["name"], namespace, name)]
+                    for metric_name in CONTAINER_METRICS]
 
-                if not mem_limit_response:
-                    continue
+                if not cpu_limit_response or not mem_limit_response or not cpu_usage_response or \
+                        not mem_usage_response:
+                    raise Return(None)
 
+                cpu_limits = cpu_limit_response.get("metrics", [])
                 mem_limits = mem_limit_response.get("metrics", [])
-                if len(mem_limits) == 0:
-                    continue
+                if len(cpu_limits) == 0 or len(mem_limits) == 0:
+                    raise Return(None)
 
+                cpu_limit = cpu_limits[-1]["value"]
                 mem_limit = mem_limits[-1]["value"]
-                if mem_limit == 0:
-                    if not node_mem_limit:
-                        node_cpu_limit, node_mem_limit = yield self._get_node_metrics(
-                            heapster_client,
-                            pod["spec"]["nodeName"])
-
-                    mem_limit = node_mem_limit
-
-                try:
-                    cpu_usage_response = yield heapster_client.containers.metric(
-                        "cpu/usage_rate",
-                        name=container["name"],
-                        namespace=namespace,
-                        pod_name=name
-                    )
-                except HTTPError as http_error:
-                    logging.exception(http_error)
-                    continue
-
-                cpu_usage = 0
-                for metric in cpu_usage_response["metrics"]:
-                    if metric["timestamp"] == cpu_usage_response["latestTimestamp"]:
-                        cpu_usage = metric["value"]
-                        break
-
-                try:
-                    mem_usage_response = yield heapster_client.containers.metric(
-                        "memory/usage",
-                        name=container["name"],
-                        namespace=namespace,
-                        pod_name=name
-
-                    )
-                except HTTPError as http_error:
-                    logging.exception(http_error)
-                    continue
-
-                mem_usage = 0
-                for metric in mem_usage_response["metrics"]:
-                    if metric["timestamp"] == mem_usage_response["latestTimestamp"]:
-                        mem_usage = metric["value"]
-                        break
-
-                container_metrics = dict(
+                if cpu_limit == 0 or mem_limit == 0:
+                    node_cpu_limit, node_mem_limit = yield get_node_metrics()
+                    cpu_limit = cpu_limit or node_cpu_limit
+                    mem_limit = mem_limit or node_mem_limit
+
+                cpu_usage = self._get_latest_value(cpu_usage_response)
+                mem_usage = self._get_latest_value(mem_usage_response)
+
+                raise Return(dict(
                     name=container["name"],
                     cpuUsage=int(cpu_usage / float(cpu_limit) * 100),
                     memUsage=int(mem_usage / float(mem_limit) * 100)
-                )
+                ))
 
-                metrics["items"].append(container_metrics)
+            container_metrics = yield [get_container_metrics(container) for container in pod["spec"]["containers"]]
+            metrics["items"] = [item for item in container_metrics if item]
 
         raise Return(metrics)
 
+    @staticmethod
+    def _get_latest_value(response):
+        for metric in response.get("metrics", []):
+            if metric["timestamp"] == response["latestTimestamp"]:
+                return metric["value"]
+
+        return 0
+
     @coroutine
     def _get_node_metrics(self, heapster_client, node_name):
-        node_response = yield self.api.http_client.get("/api/v1/nodes/" + node_name)
-        node = json.loads(node_response.body)
+        node_response, cpu_request_response, mem_request_response = yield [
+            self.api.http_client.get("/api/v1/nodes/" + node_name),
+            heapster_client.nodes.metric("cpu/request", name=node_name),
+            heapster_client.nodes.metric("memory/request", name=node_name)
+        ]
 
+        node = json.loads(node_response.body)
         node_cpu = int(node["status"]["capacity"]["cpu"]) * 1024
         node_mem = int(node["status"]["capacity"]["memory"].replace("Ki", ""))
 
         node_cpu_request = 0
-        cpu_request_response = yield heapster_client.nodes.metric("cpu/request", name=node_name)
         if cpu_request_response and len(cpu_request_response.get("metrics", [])) > 0:
             node_cpu_request = cpu_request_response.get("metrics")[-1]["value"]
 
         node_mem_request = 0
-        mem_request_response = yield heapster_client.nodes.metric("memory/request", name=node_name)
         if mem_request_response and len(mem_request_response.get("metrics", [])) > 0:
             node_mem_request = mem_request_response.get("metrics")[-1]["value"]
 
@@ -68,7 +68,6 @@ class Resource(object):
         result = yield self.api.patch(self.base_url_path + "/{name}", **dict(name=name, body=json.dumps(partial)))
         raise Return(result)
 
-    @coroutine
     def watch(self, on_data=None, **kwargs):
         url_path = self.api_path + "/watch" + self.resource_path
         params = dict()
@@ -80,7 +79,7 @@ class Resource(object):
         for key in kwargs.iterkeys():
             params[key] = kwargs[key]
 
-        yield self.api.watch(url_path, on_data, **params)
+        return self.api.watch(url_path, on_data, **params)
 
 
 class NamespacedResource(object):
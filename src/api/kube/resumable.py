@@ -0,0 +1,197 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import random
+import time
+
+from tornado.gen import coroutine
+from tornado.httpclient import HTTPError
+from tornado.ioloop import IOLoop
+
+from api.kube.exceptions import KubernetesException, ResourceNotFoundException
+
+MIN_BACKOFF = 1
+MAX_BACKOFF = 60
+WATCH_EVENTS = ["ADDED", "MODIFIED", "DELETED"]
+
+
+class ResumableWatch(object):
+    """LIST+WATCH of a Kubernetes resource that survives disconnections.
+
+    The watch is resumed from the last resourceVersion seen, reconnecting with a jittered exponential
+    backoff. When the resourceVersion has expired (410 Gone) the resource is listed again and the
+    difference with the known objects is notified as synthetic ADDED, MODIFIED and DELETED events.
+    """
+
+    def __init__(self, resource, on_event, min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF, **params):
+        self.resource = resource
+        self.on_event = on_event
+        self.params = params
+
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.kind = None
+        self.resource_version = None
+        self.objects = dict()
+
+        self._watcher = None
+        self._timeout = None
+        self._stopped = False
+        self._expired = False
+        self._retries = 0
+        self._connected_at = None
+
+    @coroutine
+    def start(self):
+        yield self.relist()
+        self.resume()
+
+    def stop(self):
+        self._stopped = True
+
+        if self._timeout is not None:
+            IOLoop.current().remove_timeout(self._timeout)
+            self._timeout = None
+
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    @coroutine
+    def relist(self, notify=False):
+        try:
+            result = yield self.resource.get(**self.params)
+        except ResourceNotFoundException:
+            if "name" not in self.params:
+                raise
+
+            # The watched object does not exist anymore
+            result = dict(kind=self.kind, metadata=dict(resourceVersion=self.resource_version), items=[])
+
+        objects = dict()
+        if "items" in result:
+            self.kind = result["kind"].replace("List", "") if result["kind"] else self.kind
+            for item in result["items"]:
+                item["kind"] = self.kind
+                objects[item["metadata"]["uid"]] = item
+        else:
+            self.kind = result["kind"]
+            objects[result["metadata"]["uid"]] = result
+
+        previous_objects, self.objects = self.objects, objects
+        self.resource_version = result["metadata"]["resourceVersion"]
+
+        if notify:
+            for uid, document in previous_objects.iteritems():
+                if uid not in objects:
+                    self._notify(dict(type="DELETED", object=document))
+
+            for uid, document in objects.iteritems():
+                if uid not in previous_objects:
+                    self._notify(dict(type="ADDED", object=document))
+                elif (previous_objects[uid]["metadata"]["resourceVersion"] !=
+                      document["metadata"]["resourceVersion"]):
+                    self._notify(dict(type="MODIFIED", object=document))
+
+    def resume(self):
+        self._timeout = None
+        if self._stopped:
+            return
+
+        logging.debug("Watching %s from resourceVersion %s", self.params, self.resource_version)
+
+        # Without resourceVersion, e.g. the watched object was not found, the watch starts from now
+        params = dict(self.params)
+        if self.resource_version is not None:
+            params["resourceVersion"] = self.resource_version
+
+        self._expired = False
+        self._connected_at = time.time()
+        self._watcher = self.resource.watch(on_data=self._on_data, **params)
+
+        self._watcher.add_done_callback(self._on_disconnected)
+
+    @coroutine
+    def _recover(self):
+        self._timeout = None
+        if self._stopped:
+            return
+
+        try:
+            yield self.relist(notify=True)
+            self.resume()
+        except (HTTPError, KubernetesException) as error:
+            logging.warning("Failed to list %s: %s", self.params, error)
+            self._schedule(self._recover)
+
+    def _schedule(self, callback):
+        delay = min(self.max_backoff, self.min_backoff * 2 ** self._retries)
+        delay = random.uniform(delay / 2.0, delay)
+        self._retries += 1
+
+        logging.debug("Retrying watch %s in %.2f seconds", self.params, delay)
+        self._timeout = IOLoop.current().call_later(delay, callback)
+
+    def _on_data(self, event):
+        event_type = event.get("type")
+        if event_type == "ERROR":
+            if event.get("object", {}).get("code") == 410:
+                logging.info("resourceVersion %s expired for %s", self.resource_version, self.params)
+                self._expired = True
+            else:
+                logging.warning("Error raised from Kubernetes: %s", event.get("object"))
+
+        elif event_type == "BOOKMARK":
+            self.resource_version = event["object"]["metadata"]["resourceVersion"]
+
+        elif event_type in WATCH_EVENTS:
+            document = event["object"]
+            if event_type == "DELETED":
+                self.objects.pop(document["metadata"]["uid"], None)
+            else:
+                self.objects[document["metadata"]["uid"]] = document
+
+            self.resource_version = document["metadata"]["resourceVersion"]
+            self._notify(event)
+
+        else:
+            logging.warning("Unexpected message from Kubernetes: %s", event)
+
+    def _on_disconnected(self, future):
+        self._watcher = None
+        if self._stopped:
+            return
+
+        error = future.exception()
+        if error is not None and not (isinstance(error, HTTPError) and error.code == 599):
+            logging.warning("Watch %s disconnected: %s", self.params, error)
+
+        # Only back off when the connections are not lasting, a long lived watch closed by the server is normal
+        if time.time() - self._connected_at > self.max_backoff:
+            self._retries = 0
+
+        if self._expired or (isinstance(error, HTTPError) and error.code == 410):
+            self._schedule(self._recover)
+        else:
+            self._schedule(self.resume)
+
+    def _notify(self, event):
+        try:
+            self.on_event(event)
+        except Exception:
+            logging.exception("Failed to notify watch event for %s", self.params)
@@ -0,0 +1,102 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import time
+
+try:
+    import ujson
+    json_loads = ujson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Layout of the watch events encoded by the API server, the type is always before the object
+EVENT_PREFIX = '{"type":"'
+OBJECT_SEPARATOR = '","object":'
+
+
+def get_raw_object(line):
+    """Returns the encoded object of a watch event line, or None if the line has another layout.
+    """
+
+    line = line.rstrip()
+    if not line.startswith(EVENT_PREFIX) or not line.endswith("}"):
+        return None
+
+    start = line.find(OBJECT_SEPARATOR, len(EVENT_PREFIX))
+    if start == -1:
+        return None
+
+    return line[start + len(OBJECT_SEPARATOR):-1]
+
+
+class JSONStreamDecoder(object):
+    """Splits a stream of newline delimited JSON documents and decodes each one.
+
+    Partial lines are kept as a list of chunks and only joined once the newline arrives, so a
+    large object received over many chunks is copied once instead of on every chunk. The object of
+    the watch events is also kept encoded as raw_object, to forward it without encoding it again.
+    """
+
+    def __init__(self, on_data, loads=json_loads):
+        self.on_data = on_data
+        self.loads = loads
+
+        self.bytes_received = 0
+        self.events = 0
+        self.decode_time = 0.0
+
+        self._chunks = []
+
+    def feed(self, data):
+        self.bytes_received += len(data)
+
+        start = 0
+        newline = data.find("\n")
+        while newline != -1:
+            if self._chunks:
+                self._chunks.append(data[start:newline])
+                line = "".join(self._chunks)
+                self._chunks = []
+            else:
+                line = data[start:newline]
+
+            self._decode(line)
+
+            start = newline + 1
+            newline = data.find("\n", start)
+
+        if start < len(data):
+            self._chunks.append(data[start:])
+
+    def stats(self):
+        return dict(bytes=self.bytes_received, events=self.events, decode_time=self.decode_time)
+
+    def _decode(self, line):
+        if not line.strip():
+            return
+
+        start_time = time.time()
+        document = self.loads(line)
+        if isinstance(document, dict) and "object" in document:
+            raw_object = get_raw_object(line)
+            if raw_object is not None:
+                document["raw_object"] = raw_object
+
+        self.decode_time += time.time() - start_time
+        self.events += 1
+
+        self.on_data(document)
@@ -14,15 +14,19 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import os
 import sys
+import signal
 import logging
+from functools import partial
 
 from tornado.httpserver import HTTPServer
 from tornado.ioloop import IOLoop
 from tornado.netutil import bind_unix_socket
+from tornado.process import fork_processes
 from tornado.web import Application
 
-from api.v1 import configure, initialize
+from api.v1 import configure, initialize, shutdown
 from api.v1.main import MainWebSocketHandler
 from api.v1.auth import AuthProvidersHandler, ChangePasswordHandler, GoogleOAuth2LoginHandler, PasswordHandler, \
     RequestInviteHandler, ResetPasswordHandler, Saml2LoginHandler, Saml2MetadataHandler, SignupHandler
@@ -30,23 +34,56 @@ from api.v1.icons import IconGenerator
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG, format='%(asctime)s %(message)s')
 
+API_SOCKET = "/var/run/elastickube-api.sock"
 
-def setup_server():
+
+def setup_server(workers=1):
     # Config tornado.curl_httpclient to use NullHandler
     tornado_logger = logging.getLogger('tornado.curl_httpclient')
     tornado_logger.addHandler(logging.NullHandler())
     tornado_logger.propagate = False
 
+    # Bound before forking so all the workers accept from the same socket
+    socket = bind_unix_socket(API_SOCKET, mode=0777)
+
+    worker_id = None
+    if workers > 1:
+        # Own process group so the stop signals are only forwarded to the workers
+        os.setpgrp()
+        signal.signal(signal.SIGTERM, stop_workers)
+        signal.signal(signal.SIGINT, stop_workers)
+
+        # Nothing touching the IOLoop or Mongo can be created before forking
+        worker_id = fork_processes(workers)
+
     settings = dict(
-        autoreload=True,
+        autoreload=workers == 1,
         secret="ElasticKube",
     )
 
+    # Every worker shuts down by itself, releasing its resources and leases
+    signal.signal(signal.SIGTERM, partial(stop_server, settings))
+    signal.signal(signal.SIGINT, partial(stop_server, settings))
+
     configure(settings)
-    IOLoop.current().add_future(initialize(settings), start_server)
+    IOLoop.current().add_future(initialize(settings, worker_id), partial(start_server, socket))
+
+    return settings
+
+
+def stop_workers(signum, _frame):
+    # The parent exits once every worker has stopped without errors
+    signal.signal(signum, signal.SIG_IGN)
+    os.killpg(os.getpgrp(), signum)
+
+
+def stop_server(settings, signum, _frame):
+    logging.info("Received signal %s, stopping", signum)
+    settings["stopping"] = True
+    IOLoop.current().add_callback_from_signal(IOLoop.current().stop)
 
 
-def start_server(future):
+def start_server(socket, future):
     settings = future.result()
 
     handlers = [
@@ -66,10 +103,17 @@ def start_server(future):
     application = Application(handlers, **settings)
 
     server = HTTPServer(application)
-    socket = bind_unix_socket("/var/run/elastickube-api.sock", mode=0777)
     server.add_socket(socket)
 
 
 if __name__ == "__main__":
-    setup_server()
-    IOLoop.current().start()
+    api_workers = int(os.getenv("API_WORKERS", 1))
+    server_settings = setup_server(api_workers)
+    try:
+        IOLoop.current().start()
+    finally:
+        shutdown(server_settings)
+
+    if api_workers > 1 and not server_settings.get("stopping", False):
+        # The loop stopped on a failure, a worker exiting with an error is restarted by the parent
+        sys.exit(1)
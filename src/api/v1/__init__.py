@@ -18,38 +18,50 @@ import httplib
 import json
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 
 import jwt
-from bson.json_util import dumps
 from motor.motor_tornado import MotorClient
 from pymongo.errors import PyMongoError
 from tornado.gen import coroutine, Return
 from tornado.httpclient import HTTPError
-from tornado.ioloop import IOLoop
+from tornado.ioloop import IOLoop, PeriodicCallback
 from tornado.websocket import WebSocketHandler, WebSocketClosedError
 
 from api.heapster.client import HeapsterClient
-from api.kube.client import KubeClient
+from api.kube.client import DEFAULT_MAX_CONNECTIONS, KubeClient
+from api.v1.serializer import dumps
+from api.v1.tokens import TokenCache
 from api.v1.sync.metrics import SyncMetrics
 from api.v1.sync.namespaces import SyncNamespaces
-from data import watch, init as initialize_database
+from data import watch, init as initialize_database, wait_for_schema
+from data.election import LeaderElection
+from data.membership import NamespaceMembership
+from data.users import UserCache
 from data.son.manipulators import KeyManipulator
 
 PING_FREQUENCY = timedelta(seconds=5)
 RESPONSE_TIMEOUT = timedelta(seconds=5)
+STATS_INTERVAL = timedelta(minutes=5)
 ELASTICKUBE_TOKEN_HEADER = "ElasticKube-Token"
 ELASTICKUBE_VALIDATION_TOKEN_HEADER = "ElasticKube-Validation-Token"
+SYNC_LEASE = "api-sync"
+LEASE_RELEASE_TIMEOUT = timedelta(seconds=5)
 
 
 def configure(settings):
+    kube_max_connections = int(os.getenv("KUBE_API_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS))
     if "KUBE_API_TOKEN_PATH" in os.environ and os.path.exists(os.environ["KUBE_API_TOKEN_PATH"]):
         logging.info("Reading token from '%s'.", os.environ["KUBE_API_TOKEN_PATH"])
 
         with open(os.environ["KUBE_API_TOKEN_PATH"]) as token:
-            settings["kube"] = KubeClient(os.environ["KUBERNETES_SERVICE_HOST"], token=token.read())
+            settings["kube"] = KubeClient(
+                os.environ["KUBERNETES_SERVICE_HOST"],
+                token=token.read(),
+                max_connections=kube_max_connections)
     else:
-        settings["kube"] = KubeClient(os.getenv('KUBERNETES_SERVICE_HOST'))
+        settings["kube"] = KubeClient(os.getenv('KUBERNETES_SERVICE_HOST'), max_connections=kube_max_connections)
 
     if "HEAPSTER_SERVICE_HOST" in os.environ:
         heapster_endpoint = os.getenv("HEAPSTER_SERVICE_HOST")
@@ -70,19 +82,37 @@ def configure(settings):
     settings["motor"] = MotorClient(mongo_url)
 
     elastickube_db = settings["motor"].elastickube
-    elastickube_db.add_son_manipulator(KeyManipulator())
+    elastickube_db.add_son_manipulator(KeyManipulator(collections=["Charts"]))
     settings["database"] = elastickube_db
+    settings["membership"] = NamespaceMembership(elastickube_db)
+    settings["users"] = UserCache(elastickube_db)
+    settings["tokens"] = TokenCache(settings["secret"])
+    settings["election"] = LeaderElection(
+        elastickube_db,
+        SYNC_LEASE,
+        on_elected=lambda: start_sync(settings),
+        on_demoted=lambda: stop_sync(settings))
+
+    watch.configure(
+        queue_size=int(os.getenv("WATCH_QUEUE_SIZE", watch.DEFAULT_QUEUE_SIZE)),
+        overflow=os.getenv("WATCH_OVERFLOW_POLICY", watch.DEFAULT_OVERFLOW),
+        backend=os.getenv("WATCH_BACKEND", watch.DEFAULT_BACKEND))
 
 
 @coroutine
-def initialize(settings):
+def initialize(settings, worker_id=None):
     try:
-        yield initialize_database(settings["database"])
         yield settings["kube"].build_resources()
-        yield SyncNamespaces(settings).start_sync()
-        yield SyncMetrics(settings).start_sync()
+        yield settings["election"].start()
+
+        # Only the elected leader migrates the database, the caches and the watch need its schema
+        yield wait_for_schema(settings["database"])
+        yield settings["membership"].start()
+        yield settings["users"].start()
 
-        IOLoop.current().add_future(watch.start_monitor(settings["motor"]), IOLoop.current().stop)
+        # Every worker follows the oplog on its own, resuming from its own checkpoint
+        monitor_name = "api" if worker_id is None else "api.%d" % worker_id
+        IOLoop.current().add_future(watch.start_monitor(settings["motor"], name=monitor_name), IOLoop.current().stop)
     except (HTTPError, PyMongoError):
         logging.exception("Cannot initialize ElasticKube")
         IOLoop.current().stop()
@@ -90,6 +120,47 @@ def initialize(settings):
     raise Return(settings)
 
 
+@coroutine
+def start_sync(settings):
+    """Initializes the database and starts the sync jobs, only run by the elected leader.
+    """
+
+    yield initialize_database(settings["database"])
+
+    settings["sync"] = [SyncNamespaces(settings), SyncMetrics(settings)]
+    for sync in settings["sync"]:
+        yield sync.start_sync()
+
+
+def stop_sync(settings):
+    for sync in settings.pop("sync", []):
+        sync.stop_sync()
+
+
+def shutdown(settings):
+    logging.info("Shutting down ElasticKube")
+
+    if "kube" in settings:
+        settings["kube"].close()
+
+    if "heapster" in settings:
+        settings["heapster"].close()
+
+    if "membership" in settings:
+        settings["membership"].stop()
+
+    if "users" in settings:
+        settings["users"].stop()
+
+    if "election" in settings:
+        # Releases the lease so a follower takes over at its next campaign, within a third of the lease duration,
+        # instead of once the lease expires. Runs on SIGTERM too, the loop is already stopped
+        try:
+            IOLoop.current().run_sync(settings["election"].stop, timeout=LEASE_RELEASE_TIMEOUT.total_seconds())
+        except Exception:
+            logging.exception("Cannot stop the %s election", SYNC_LEASE)
+
+
 class SecureWebSocketHandler(WebSocketHandler):
 
     def __init__(self, application, request, **kwargs):
@@ -98,6 +169,24 @@ class SecureWebSocketHandler(WebSocketHandler):
         self.user = None
         self.ping_timeout_handler = None
 
+        self.opened_at = time.time()
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self._stats_callback = None
+
+    def get_compression_options(self):
+        # Negotiates permessage-deflate with the clients supporting it
+        return dict()
+
+    def stats(self):
+        duration = max(time.time() - self.opened_at, 1)
+        return dict(
+            duration=duration,
+            frames=self.frames_sent,
+            bytes=self.bytes_sent,
+            frames_per_second=self.frames_sent / duration,
+            bytes_per_second=self.bytes_sent / duration)
+
     def open(self):
         # Try the header if not the cookie
         encoded_token = self.request.headers.get(ELASTICKUBE_TOKEN_HEADER)
@@ -110,22 +199,29 @@ class SecureWebSocketHandler(WebSocketHandler):
         else:
             token = None
             try:
-                token = jwt.decode(encoded_token, self.settings['secret'], algorithm='HS256')
+                token = self.settings["tokens"].decode(encoded_token)
             except jwt.InvalidTokenError as jwt_error:
                 logging.exception(jwt_error)
                 self.write_message({"error": {"message": "Invalid token."}})
                 self.close(httplib.UNAUTHORIZED, "Invalid token.")
 
             if token:
-                self.user = self.settings["database"].Users.find_one({"username": token["username"]})
+                self.user = self.settings["users"].get(token["username"])
                 self.ping_timeout_handler = IOLoop.current().add_timeout(PING_FREQUENCY, self.send_ping)
 
+                # Long lived connections are reported while they are open, not only once they close
+                self._stats_callback = PeriodicCallback(self._log_stats, STATS_INTERVAL.total_seconds() * 1000)
+                self._stats_callback.start()
+
     def on_message(self, message):
         pass
 
     @coroutine
     def write_message(self, message, binary=False):
         serialized = dumps(message)
+        self.frames_sent += 1
+        self.bytes_sent += len(serialized)
+
         yield super(SecureWebSocketHandler, self).write_message(serialized, binary=binary)
 
     @coroutine
@@ -151,6 +247,15 @@ class SecureWebSocketHandler(WebSocketHandler):
 
         self.ping_timeout_handler = None
 
+        if self._stats_callback is not None:
+            self._stats_callback.stop()
+            self._stats_callback = None
+
+        logging.info("WebSocket closed with stats %s", self.stats())
+
+    def _log_stats(self):
+        logging.info("WebSocket stats %s", self.stats())
+
     def check_origin(self, _origin):
         return True
 
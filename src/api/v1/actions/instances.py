@@ -29,14 +29,15 @@ class InstancesActions(object):
 
         self.kube = settings["kube"]
         self.database = settings["database"]
+        self.membership = settings["membership"]
         self.user = user
 
     @coroutine
     def check_permissions(self, operation, document):
         logging.debug("check_permissions for user %s and operation %s on instances", self.user["username"], operation)
         if self.user["role"] != "administrator":
-            namespace = yield Query(self.database, "Namespaces").find_one({"name": document["namespace"]})
-            if self.user["username"] not in namespace["members"]:
+            is_member = yield self.membership.is_member(document["namespace"], self.user["username"])
+            if not is_member:
                 raise Return(False)
 
         raise Return(True)
@@ -55,9 +55,10 @@ class InvitationsActions(object):
             except DuplicateKeyError:
                 logging.exception("User %s already exists sending invitation." % email_address)
         else:
-            user["invite_token"] = invite_user["invite_token"]
-            user["namespaces"] = invite_user["namespaces"]
-            yield Query(self.database, "Users").update(user)
+            yield Query(self.database, "Users").find_one_and_update(
+                {"_id": user["_id"]},
+                {"$set": {"invite_token": invite_user["invite_token"], "namespaces": invite_user["namespaces"]}},
+                projection=["_id"])
 
         invite_info = {
             "email": email_address,
@@ -68,21 +68,21 @@ class NamespacesActions(object):
                               self._wait_namespace_creation(cursor, last_timestamp, document["name"])]
 
         namespace["members"] = document["members"]
-        namespace = yield Query(self.database, "Namespaces").update(namespace)
+        namespace = yield Query(self.database, "Namespaces").find_one_and_replace(namespace, upsert=True)
         raise Return(namespace)
 
     @coroutine
     def update(self, document):
         logging.debug("Updating namespace %s", document["_id"])
 
-        namespace = yield Query(self.database, "Namespaces").find_one({"_id": document['_id']})
-        if not namespace:
+        # TODO: validate members before inserting
+        try:
+            updated_namespace = yield Query(self.database, "Namespaces").find_one_and_update(
+                {"_id": document["_id"], "metadata.deletionTimestamp": None},
+                {"$set": {"members": document["members"]}})
+        except ObjectNotFoundError:
             raise ObjectNotFoundError("Namespace %s not found." % document["_id"])
 
-        # TODO: validate members before inserting and do an intersection for race conditions
-        namespace["members"] = document["members"]
-        updated_namespace = yield Query(self.database, "Namespaces").update(namespace)
-
         raise Return(updated_namespace)
 
     @coroutine
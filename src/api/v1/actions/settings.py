@@ -55,5 +55,5 @@ class SettingsActions(object):
             saml_config['idp_cert'] = idp_cert
             saml_config['idp_sso'] = idp_sso
 
-        setting = yield Query(self.database, "Settings").update(document)
+        setting = yield Query(self.database, "Settings").find_one_and_replace(document, upsert=True)
         raise Return(setting)
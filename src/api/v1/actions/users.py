@@ -52,20 +52,21 @@ class UsersActions(object):
     def update(self, document):
         logging.debug("Updating user %s", document["_id"])
 
-        user = yield Query(self.database, "Users").find_one({"_id": ObjectId(document['_id'])})
-        if not user:
+        document["_id"] = ObjectId(document["_id"])
+        try:
+            updated_user = yield Query(self.database, "Users").find_one_and_replace(document)
+        except ObjectNotFoundError:
             raise ObjectNotFoundError("User %s not found." % document["_id"])
 
-        updated_user = yield Query(self.database, "Users").update(document)
         raise Return(updated_user)
 
     @coroutine
     def delete(self, document):
         logging.info("Deleting user %s", document["_id"])
 
-        user = yield Query(self.database, "Users").find_one({"_id": ObjectId(document["_id"])})
-        if user is not None:
-            user["metadata"]["deletionTimestamp"] = datetime.utcnow().isoformat()
-            yield Query(self.database, "Users").update(user)
-        else:
+        try:
+            yield Query(self.database, "Users").find_one_and_update(
+                {"_id": ObjectId(document["_id"]), "metadata.deletionTimestamp": None},
+                {"$set": {"metadata.deletionTimestamp": datetime.utcnow().isoformat()}})
+        except ObjectNotFoundError:
             raise ObjectNotFoundError("User %s not found." % document["_id"])
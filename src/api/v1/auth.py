@@ -19,7 +19,6 @@ import cgi
 import json
 import logging
 import random
-import re
 import string
 import urllib
 import urlparse
@@ -38,7 +37,7 @@ from tornado.web import RequestHandler, HTTPError
 
 from api.v1 import ELASTICKUBE_TOKEN_HEADER, ELASTICKUBE_VALIDATION_TOKEN_HEADER
 from api.v1.actions import emails
-from data.query import Query
+from data.query import ObjectNotFoundError, Query
 
 
 ROUNDS = 40000
@@ -141,16 +140,12 @@ class SignupHandler(AuthHandler):
 
         if user is not None and "email_validated_at" not in user:
             for namespace_name in user["namespaces"]:
-                namespace = yield Query(self.settings["database"], "Namespaces").find_one({"name": namespace_name})
-                if namespace is None:
+                try:
+                    yield Query(self.settings["database"], "Namespaces").find_one_and_update(
+                        {"name": namespace_name, "metadata.deletionTimestamp": None},
+                        {"$push": {"members": user["username"]}})
+                except ObjectNotFoundError:
                     logging.warn("Cannot find namespace %s", namespace_name)
-                else:
-                    if "members" in namespace:
-                        namespace["members"].append(user["username"])
-                    else:
-                        namespace["members"] = [user["username"]]
-
-                    yield Query(self.settings["database"], "Namespaces").update(namespace)
 
             del user["namespaces"]
 
@@ -567,14 +562,14 @@ class Saml2LoginHandler(AuthHandler):
         if not user_email:
             raise HTTPError(401, reason="SAML email attribute is missing.")
 
-        user = yield self.settings["database"].Users.find_one({"saml_id": name_id})
+        user = yield Query(self.settings["database"], "Users").find_one({"saml_id": name_id})
         user_updated = False
         if user and user["email"] != user_email:
             logging.info("User email changed!")
             user["email"] = user_email
             user_updated = True
         elif not user:
-            user = yield self.settings["database"].Users.find_one({"email": re.compile(user_email, re.IGNORECASE)})
+            user = yield Query(self.settings["database"], "Users").find_one({"email_lower": user_email})
             if user:
                 user["saml_id"] = name_id
                 user_updated = True
@@ -603,16 +598,12 @@ class Saml2LoginHandler(AuthHandler):
     @coroutine
     def _update_invited_user(self, user, attributes):
         for namespace_name in user["namespaces"]:
-            namespace = yield Query(self.settings["database"], "Namespaces").find_one({"name": namespace_name})
-            if namespace is None:
+            try:
+                yield Query(self.settings["database"], "Namespaces").find_one_and_update(
+                    {"name": namespace_name, "metadata.deletionTimestamp": None},
+                    {"$push": {"members": user["username"]}})
+            except ObjectNotFoundError:
                 logging.warn("Cannot find namespace %s", namespace_name)
-            else:
-                if "members" in namespace:
-                    namespace["members"].append(user["username"])
-                else:
-                    namespace["members"] = [user["username"]]
-
-                yield Query(self.settings["database"], "Namespaces").update(namespace)
 
         del user["namespaces"]
 
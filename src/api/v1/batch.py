@@ -0,0 +1,83 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from datetime import timedelta
+
+from api.v1.serializer import RawJSON
+
+BATCH_PROTOCOL = "elastickube.batch"
+BATCH_INTERVAL = timedelta(milliseconds=50)
+MAX_BATCH_EVENTS = 200
+
+COLLAPSIBLE_OPERATIONS = ["created", "updated", "deleted"]
+
+
+class EventBatch(object):
+    """Events waiting to be sent together in a single batch message.
+
+    A change of an object supersedes its previous change in the batch, the event keeps the position of
+    the first one. Any other message is a barrier, the changes after it are not collapsed with the
+    ones before it.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.collapsed = 0
+
+        self._indexes = dict()
+
+    def __len__(self):
+        return len(self.events)
+
+    def add(self, event):
+        key = self._get_key(event)
+        if key is None:
+            self._indexes.clear()
+        elif key in self._indexes:
+            # A created object may already be known by the client, e.g. from a snapshot, so it is still deleted
+            index = self._indexes[key]
+            if self.events[index]["operation"] == "created" and event["operation"] == "updated":
+                event = dict(event, operation="created")
+
+            self.events[index] = event
+            self.collapsed += 1
+            return
+        else:
+            self._indexes[key] = len(self.events)
+
+        self.events.append(event)
+
+    def pop_message(self):
+        message = dict(operation="batch", status_code=200, body=self.events)
+
+        self.events = []
+        self._indexes.clear()
+        return message
+
+    @staticmethod
+    def _get_key(event):
+        body = event.get("body")
+        if isinstance(body, RawJSON):
+            body = body.value
+
+        if event.get("operation") not in COLLAPSIBLE_OPERATIONS or not isinstance(body, dict):
+            return None
+
+        uid = body.get("metadata", {}).get("uid") or body.get("_id")
+        if uid is None:
+            return None
+
+        return event["action"], body.get("kind"), str(uid)
@@ -20,9 +20,12 @@ import httplib
 from bson.json_util import loads
 from pymongo.errors import DuplicateKeyError, PyMongoError
 from tornado.gen import coroutine, Return, Future
+from tornado.ioloop import IOLoop
+from tornado.websocket import WebSocketClosedError
 
 from api.kube.exceptions import KubernetesException
 from api.v1 import SecureWebSocketHandler
+from api.v1.batch import BATCH_INTERVAL, BATCH_PROTOCOL, MAX_BATCH_EVENTS, EventBatch
 from api.v1.actions.logs import LogsActions
 from api.v1.actions.instances import InstancesActions
 from api.v1.actions.namespaces import NamespacesActions
@@ -58,10 +61,62 @@ class MainWebSocketHandler(SecureWebSocketHandler):
         self.connected = False
         self.current_watchers = dict()
 
+        self.batch = None
+        self.events_sent = 0
+        self._batch_timeout = None
+
+    def select_subprotocol(self, subprotocols):
+        # Clients opting in receive the events in batches
+        if BATCH_PROTOCOL in subprotocols:
+            self.batch = EventBatch()
+            return BATCH_PROTOCOL
+
+        return None
+
     def open(self):
         logging.info("Initializing MainWebSocketHandler")
         super(MainWebSocketHandler, self).open()
 
+    def stats(self):
+        stats = super(MainWebSocketHandler, self).stats()
+        if self.batch is not None:
+            stats.update(events=self.events_sent, collapsed=self.batch.collapsed)
+
+        return stats
+
+    @coroutine
+    def write_message(self, message, binary=False):
+        if self.batch is None or not isinstance(message, dict) or "correlation" in message:
+            # Responses are sent right away, after the events queued before them
+            yield self.flush_batch()
+            yield super(MainWebSocketHandler, self).write_message(message, binary=binary)
+            raise Return()
+
+        self.events_sent += 1
+        self.batch.add(message)
+        if len(self.batch) >= MAX_BATCH_EVENTS:
+            yield self.flush_batch()
+        elif self._batch_timeout is None:
+            self._batch_timeout = IOLoop.current().call_later(
+                BATCH_INTERVAL.total_seconds(), self._flush_batch_timeout)
+
+    @coroutine
+    def flush_batch(self):
+        if self._batch_timeout is not None:
+            IOLoop.current().remove_timeout(self._batch_timeout)
+            self._batch_timeout = None
+
+        if self.batch:
+            yield super(MainWebSocketHandler, self).write_message(self.batch.pop_message())
+
+    @coroutine
+    def _flush_batch_timeout(self):
+        self._batch_timeout = None
+        try:
+            yield self.flush_batch()
+        except WebSocketClosedError:
+            logging.debug("WebSocket closed before sending a batch of events")
+
     @coroutine
     def on_message(self, message):
         # Wait the user to be authenticated before accepting message
@@ -151,7 +206,7 @@ class MainWebSocketHandler(SecureWebSocketHandler):
                         yield self.write_message(response)
 
                     else:
-                        watcher = watcher_cls(request, self.settings, self.user, self.write_message)
+                        watcher = watcher_cls(request, self.settings, self.user, self.write_message, self.close)
                         if not (yield watcher.check_permissions(request["operation"], body)):
                             error = "Operation %s forbidden for action %s." % (request["operation"], request["action"])
                             response.update(dict(status_code=403, body=dict(message=error)))
@@ -182,6 +237,10 @@ class MainWebSocketHandler(SecureWebSocketHandler):
             logging.debug("Closing watcher %s", key)
             watcher.unwatch()
 
+        if self._batch_timeout is not None:
+            IOLoop.current().remove_timeout(self._batch_timeout)
+            self._batch_timeout = None
+
         yield super(MainWebSocketHandler, self).on_close()
 
     @coroutine
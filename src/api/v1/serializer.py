@@ -0,0 +1,81 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+from datetime import datetime
+
+from bson import json_util
+from bson.objectid import ObjectId
+
+
+class RawJSON(str):
+    """JSON already encoded, written by dumps as it is.
+
+    value is the decoded document, for the code that needs to look into it without decoding it again.
+    """
+
+    def __new__(cls, encoded, value=None):
+        raw = super(RawJSON, cls).__new__(cls, encoded)
+        raw.value = value
+        return raw
+
+
+def _default(value):
+    # Only called for the values the json encoder does not know, so plain JSON payloads are not walked twice
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+
+    if isinstance(value, datetime):
+        return json_util.default(value)
+
+    if hasattr(value, "__iter__") and not isinstance(value, basestring):
+        return list(value)
+
+    return json_util.default(value)
+
+
+_encoder = json.JSONEncoder(separators=(",", ":"), default=_default)
+
+
+def _has_raw_body(value):
+    if not isinstance(value, dict):
+        return False
+
+    body = value.get("body")
+    return isinstance(body, RawJSON) or (isinstance(body, list) and any(_has_raw_body(item) for item in body))
+
+
+def dumps(value):
+    """Serializes a websocket message with the BSON types in extended JSON, like bson.json_util.dumps.
+
+    RawJSON bodies, also the ones of the messages in a list body, are written without encoding them again.
+    """
+
+    if isinstance(value, RawJSON):
+        return value
+
+    if isinstance(value, list) and any(_has_raw_body(item) for item in value):
+        return "[%s]" % ",".join(dumps(item) for item in value)
+
+    if _has_raw_body(value):
+        fields = dict(value)
+        body = fields.pop("body")
+        if not fields:
+            return '{"body":%s}' % dumps(body)
+
+        return '%s,"body":%s}' % (_encoder.encode(fields)[:-1], dumps(body))
+
+    return _encoder.encode(value)
@@ -19,7 +19,11 @@ import logging
 from tornado.gen import coroutine, Return
 from tornado import ioloop
 
+from api.heapster.client import MetricQuery
 from data.query import Query
+from data.retention import parse_timestamp, rollup_metrics
+
+NAMESPACE_METRICS = ["cpu/request", "memory/request", "cpu/usage_rate", "memory/usage"]
 
 
 class SyncMetrics(object):
@@ -27,6 +31,7 @@ class SyncMetrics(object):
     def __init__(self, settings):
         logging.info("Initializing SyncMetrics")
         self.settings = settings
+        self.periodic_callbacks = []
 
     @coroutine
     def start_sync(self):
@@ -34,42 +39,25 @@ class SyncMetrics(object):
         def sync_metrics():
             heapster_namespaces = yield self.settings["heapster"].namespaces.get()
             if len(heapster_namespaces) > 0:
-                kube_namespaces = yield self.settings["kube"].namespaces.get()
-
                 # We are assuming that the cluster has a constant capacity over the period
-                cluster_cpu_capacity, cluster_mem_capacity = yield self._get_cluster_capacity()
-
-                metrics = []
-                for namespace in heapster_namespaces:
-                    namespace_uid = None
-                    for existing_namespace in kube_namespaces.get("items", []):
-                        if existing_namespace["metadata"]["name"] == namespace:
-                            namespace_uid = existing_namespace["metadata"]["uid"]
-                            break
-
-                    namespace_metrics = yield self._get_all_metrics(namespace)
-                    metrics.append(dict(name=namespace, uid=namespace_uid, results=namespace_metrics))
-
-                for metric in metrics:
-                    for timestamp, results in metric["results"]["timestamps"].iteritems():
-                        usage = dict()
-
-                        others_ns_cpu = 0
-                        others_ns_mem = 0
-                        for cpu_metric in metrics:
-                            if cpu_metric["uid"] != metric["uid"]:
-                                for cpu_timestamp, cpu_results in cpu_metric["results"]["timestamps"].iteritems():
-                                    if cpu_timestamp == timestamp:
-                                        others_ns_cpu += max(cpu_results["cpu_request"],
-                                                             cpu_results["cpu_usage"])
-                                        others_ns_mem += max(cpu_results["mem_request"],
-                                                             cpu_results["mem_usage"])
-
-                        usage["cpu_ratio"] = float(results["cpu_usage"]) / (cluster_cpu_capacity - others_ns_cpu) * 100
-                        usage["mem_ratio"] = float(results["mem_usage"]) / (cluster_mem_capacity - others_ns_mem) * 100
-
-                        data = self._build_base_metric(metric["name"], metric["uid"], timestamp, usage)
-                        yield Query(self.settings["database"], "Metrics").insert(data)
+                kube_namespaces, (cluster_cpu_capacity, cluster_mem_capacity), all_metrics = yield [
+                    self.settings["kube"].namespaces.get(),
+                    self._get_cluster_capacity(),
+                    self._get_all_metrics(heapster_namespaces)
+                ]
+
+                namespace_uids = dict((namespace["metadata"]["name"], namespace["metadata"]["uid"])
+                                      for namespace in kube_namespaces.get("items", []))
+
+                metrics = [dict(name=namespace, uid=namespace_uids.get(namespace), results=all_metrics[namespace])
+                           for namespace in heapster_namespaces]
+
+                usages = self._compute_usages(metrics, cluster_cpu_capacity, cluster_mem_capacity)
+                documents = [self._build_base_metric(name, uid, timestamp, usage)
+                             for name, uid, timestamp, usage in usages]
+
+                if documents:
+                    yield Query(self.settings["database"], "Metrics").insert_many(documents)
 
         logging.info("start_sync SyncMetrics")
 
@@ -77,51 +65,82 @@ class SyncMetrics(object):
             logging.info("Heapster not available, stopping SyncMetrics.start_sync()")
             raise Return()
 
-        periodic_callback = ioloop.PeriodicCallback(sync_metrics, 60000 * 3)
-        periodic_callback.start()
+        self.periodic_callbacks = [
+            ioloop.PeriodicCallback(sync_metrics, 60000 * 3),
+            ioloop.PeriodicCallback(lambda: rollup_metrics(self.settings["database"]), 60000 * 5)
+        ]
+
+        for periodic_callback in self.periodic_callbacks:
+            periodic_callback.start()
+
+    def stop_sync(self):
+        for periodic_callback in self.periodic_callbacks:
+            periodic_callback.stop()
+
+        self.periodic_callbacks = []
 
     @coroutine
-    def _get_all_metrics(self, namespace_name):
-        metric = dict(namespace=namespace_name, timestamps=dict())
-
-        namespace_metrics = yield self.settings["heapster"].namespaces.metrics(namespace_name)
-        if "cpu/request" in namespace_metrics:
-            cpu_limit_response = yield self.settings["heapster"].namespaces.metric("cpu/request", name=namespace_name)
-            cpu_limits = cpu_limit_response.get("metrics", [])
-            timestamps = [value["timestamp"] for value in cpu_limits]
-
-            for timestamp in timestamps:
-                for item in cpu_limits:
-                    if item["timestamp"] == timestamp:
-                        metric["timestamps"][timestamp] = {"cpu_request": item["value"]}
-
-        if "memory/request" in namespace_metrics:
-            mem_limit_response = yield self.settings["heapster"].namespaces.metric("memory/request",
-                                                                                   name=namespace_name)
-            mem_limits = mem_limit_response.get("metrics", [])
-            for timestamp in metric["timestamps"].keys():
-                for item in mem_limits:
-                    if item["timestamp"] == timestamp:
-                        metric["timestamps"][timestamp].update({"mem_request": item["value"]})
-
-        if "cpu/usage_rate" in namespace_metrics:
-            cpu_usage_response = yield self.settings["heapster"].namespaces.metric(
-                "cpu/usage_rate", name=namespace_name)
-            cpu_usages = cpu_usage_response.get("metrics", [])
-            for timestamp in metric["timestamps"].keys():
-                for item in cpu_usages:
-                    if item["timestamp"] == timestamp:
-                        metric["timestamps"][timestamp]["cpu_usage"] = item["value"]
-
-        if "memory/usage" in namespace_metrics:
-            mem_usage_response = yield self.settings["heapster"].namespaces.metric("memory/usage", name=namespace_name)
-            mem_usages = mem_usage_response.get("metrics", [])
-            for timestamp in metric["timestamps"].keys():
-                for item in mem_usages:
-                    if item["timestamp"] == timestamp:
-                        metric["timestamps"][timestamp].update({"mem_usage": item["value"]})
-
-        raise Return(metric)
+    def _get_all_metrics(self, namespace_names):
+        responses = yield self.settings["heapster"].metrics_batch(
+            MetricQuery("namespaces", metric_name, name=namespace_name)
+            for namespace_name in namespace_names for metric_name in NAMESPACE_METRICS)
+
+        all_metrics = dict()
+        for namespace_name in namespace_names:
+            cpu_requests = self._get_values(responses, namespace_name, "cpu/request")
+            mem_requests = self._get_values(responses, namespace_name, "memory/request")
+            cpu_usages = self._get_values(responses, namespace_name, "cpu/usage_rate")
+            mem_usages = self._get_values(responses, namespace_name, "memory/usage")
+
+            # The series are joined on the timestamps of cpu/request
+            timestamps = dict()
+            for timestamp, cpu_request in cpu_requests.iteritems():
+                timestamps[timestamp] = dict(
+                    cpu_request=cpu_request,
+                    mem_request=mem_requests.get(timestamp, 0),
+                    cpu_usage=cpu_usages.get(timestamp, 0),
+                    mem_usage=mem_usages.get(timestamp, 0)
+                )
+
+            all_metrics[namespace_name] = dict(namespace=namespace_name, timestamps=timestamps)
+
+        raise Return(all_metrics)
+
+    @staticmethod
+    def _compute_usages(metrics, cluster_cpu_capacity, cluster_mem_capacity):
+        # Reserved resources of every namespace added per timestamp, so the usage of the other namespaces
+        # is the total minus the namespace own share instead of a walk over all the other namespaces
+        cpu_totals = dict()
+        mem_totals = dict()
+        for metric in metrics:
+            for timestamp, results in metric["results"]["timestamps"].iteritems():
+                cpu_totals[timestamp] = cpu_totals.get(timestamp, 0) + max(results["cpu_request"],
+                                                                           results["cpu_usage"])
+                mem_totals[timestamp] = mem_totals.get(timestamp, 0) + max(results["mem_request"],
+                                                                           results["mem_usage"])
+
+        usages = []
+        for metric in metrics:
+            for timestamp, results in metric["results"]["timestamps"].iteritems():
+                others_ns_cpu = cpu_totals[timestamp] - max(results["cpu_request"], results["cpu_usage"])
+                others_ns_mem = mem_totals[timestamp] - max(results["mem_request"], results["mem_usage"])
+
+                usage = dict(
+                    cpu_ratio=float(results["cpu_usage"]) / (cluster_cpu_capacity - others_ns_cpu) * 100,
+                    mem_ratio=float(results["mem_usage"]) / (cluster_mem_capacity - others_ns_mem) * 100
+                )
+
+                usages.append((metric["name"], metric["uid"], timestamp, usage))
+
+        return usages
+
+    @staticmethod
+    def _get_values(responses, namespace_name, metric_name):
+        response = responses[MetricQuery("namespaces", metric_name, name=namespace_name)]
+        if not response:
+            return dict()
+
+        return dict((item["timestamp"], item["value"]) for item in response.get("metrics", []))
 
     @staticmethod
     def _build_base_metric(name, uid, timestamp, data):
@@ -133,6 +152,7 @@ class SyncMetrics(object):
                 uid=uid
             ),
             timestamp=timestamp,
+            date=parse_timestamp(timestamp),
             data=data
         )
 
@@ -17,8 +17,8 @@ limitations under the License.
 import logging
 
 from tornado.gen import coroutine
-from tornado.httpclient import HTTPError
 
+from api.kube.resumable import ResumableWatch
 from data.query import Query
 
 
@@ -28,7 +28,7 @@ class SyncNamespaces(object):
         logging.info("Initializing SyncNamespaces")
 
         self.settings = settings
-        self.resource_version = None
+        self.watcher = None
 
     @staticmethod
     def _convert_namespace(kube_namespace):
@@ -47,13 +47,20 @@ class SyncNamespaces(object):
         )
 
     @coroutine
-    def _update_namespace(self, namespace):
+    def _upsert_namespace(self, namespace):
         update = {
-            "metadata.name": namespace["metadata"]["name"],
-            "metadata.labels": namespace["metadata"]["labels"]
+            "$set": {
+                "metadata.name": namespace["metadata"]["name"],
+                "metadata.labels": namespace["metadata"]["labels"]
+            },
+            "$setOnInsert": {
+                "name": namespace["name"],
+                "metadata.uid": namespace["metadata"]["uid"]
+            }
         }
 
-        yield Query(self.settings["database"], "Namespaces").update_fields({"_id": namespace["_id"]}, update)
+        yield Query(self.settings["database"], "Namespaces").find_one_and_update(
+            {"_id": namespace["_id"]}, update, upsert=True, projection=["_id"])
 
     @coroutine
     def start_sync(self):
@@ -61,49 +68,22 @@ class SyncNamespaces(object):
         def data_callback(data):
             logging.debug("Calling data_callback for SyncNamespaces")
 
-            self.resource_version = data["object"]["metadata"]["resourceVersion"]
-
             converted_namespace = self._convert_namespace(data["object"])
-            if data["type"] == "ADDED":
-                yield Query(self.settings["database"], "Namespaces").insert(converted_namespace)
-
-            elif data["type"] == "DELETED":
+            if data["type"] == "DELETED":
                 yield Query(self.settings["database"], "Namespaces").remove(converted_namespace)
-
             else:
-                yield self._update_namespace(converted_namespace)
-
-        def done_callback(future):
-            logging.warn("Disconnected from kubeclient in SyncNamespaces")
-
-            if future and future.exception():
-                logging.exception(future.exception())
-
-                if isinstance(future.exception(), HTTPError) and future.exception().code == 599:
-                    logging.debug("Reconnecting to kubeclient in SyncNamespaces on 599 error code")
-                    self.settings["kube"].namespaces.watch(
-                        resourceVersion=self.resource_version,
-                        on_data=data_callback).add_done_callback(done_callback)
-            else:
-                logging.debug("Reconnecting to kubeclient in SyncNamespaces")
-                self.settings["kube"].namespaces.watch(
-                    resourceVersion=self.resource_version,
-                    on_data=data_callback).add_done_callback(done_callback)
+                yield self._upsert_namespace(converted_namespace)
 
         logging.info("start_sync SyncNamespaces")
 
-        existing_namespaces = yield Query(self.settings["database"], "Namespaces").find(projection=["_id"])
-        namespace_ids = [namespace["_id"] for namespace in existing_namespaces]
+        self.watcher = ResumableWatch(self.settings["kube"].namespaces, data_callback)
+        yield self.watcher.relist()
 
-        result = yield self.settings["kube"].namespaces.get()
-        for item in result.get("items", []):
-            namespace = self._convert_namespace(item)
-            if namespace["_id"] in namespace_ids:
-                yield self._update_namespace(namespace)
-            else:
-                yield Query(self.settings["database"], "Namespaces").insert(namespace)
+        yield [self._upsert_namespace(self._convert_namespace(item)) for item in self.watcher.objects.values()]
+
+        self.watcher.resume()
 
-        self.resource_version = result["metadata"]["resourceVersion"]
-        self.settings["kube"].namespaces.watch(
-            on_data=data_callback,
-            resourceVersion=self.resource_version).add_done_callback(done_callback)
+    def stop_sync(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
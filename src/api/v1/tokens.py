@@ -0,0 +1,53 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+
+import jwt
+
+MAX_CACHED_TOKENS = 10000
+
+
+class TokenCache(object):
+    """Payloads of the tokens whose signature has already been verified.
+
+    A cached token is returned without checking its signature again until it expires.
+    """
+
+    def __init__(self, secret, algorithm="HS256"):
+        self.secret = secret
+        self.algorithm = algorithm
+
+        self._payloads = dict()
+
+    def decode(self, encoded_token):
+        """Returns the payload of the token, raises jwt.InvalidTokenError if it is not valid.
+        """
+
+        payload = self._payloads.get(encoded_token)
+        if payload is not None:
+            if "exp" not in payload or payload["exp"] > time.time():
+                return payload
+
+            del self._payloads[encoded_token]
+
+        payload = jwt.decode(encoded_token, self.secret, algorithms=[self.algorithm])
+
+        if len(self._payloads) >= MAX_CACHED_TOKENS:
+            self._payloads.clear()
+
+        self._payloads[encoded_token] = payload
+        return payload
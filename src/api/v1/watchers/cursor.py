@@ -22,15 +22,19 @@ from api.v1.watchers.metadata import WatcherMetadata
 from data.query import Query
 from data.watch import add_callback, remove_callback
 
+SNAPSHOT_PAGE_SIZE = 100
+
 
 class CursorWatcher(object):
 
-    def __init__(self, message, settings, user, callback):
+    def __init__(self, message, settings, user, callback, close_callback=None):
         logging.info("Initializing CursorWatcher")
 
         self._params = dict()
+        self._pending = None
 
         self.callback = callback
+        self.close_callback = close_callback
         self.message = message
         self.settings = settings
         self.user = user
@@ -42,29 +46,85 @@ class CursorWatcher(object):
     def watch(self):
         logging.info("Starting watch for collection %s", self.metadata["collection"])
 
-        data = yield Query(
+        # Subscribed before reading the snapshot, the changes made meanwhile are sent once it is complete
+        pending = self._pending = []
+        yield add_callback(self.metadata["collection"], self._on_change, predicate=self.match_document,
+                           criteria=self.get_watch_criteria(), projection=self.metadata["projection"],
+                           on_overflow=self.close_callback, on_resync=self.resync)
+
+        try:
+            yield self.send_snapshot(self.message["correlation"])
+            yield self._send_pending(pending)
+        except Exception:
+            self.unwatch()
+            raise
+
+    def get_watch_criteria(self):
+        return self.metadata["criteria"] or None
+
+    def get_snapshot_cursor(self):
+        return Query(
             self.settings["database"],
             self.metadata["collection"],
-            manipulate=self.metadata["manipulate"]).find(
+            manipulate=self.metadata["manipulate"]).find_batches(
+                criteria=self.metadata["criteria"],
                 projection=self.metadata["projection"],
                 sort=self.metadata["sort"],
-                limit=self.metadata["limit"])
+                limit=self.metadata["limit"],
+                batch_size=SNAPSHOT_PAGE_SIZE)
 
-        filtered_data = []
-        for item in data:
-            filtered_item = self.filter_data(item)
-            if filtered_item:
-                filtered_data.append(filtered_item)
+    @coroutine
+    def send_snapshot(self, correlation=None):
+        """Streams the documents in "watching" pages, the last page is sent as the "watched" message.
+
+        Every page is tagged with the correlation of the watch message, so clients tell apart the pages
+        of the snapshots of different watches with the same action.
+        """
+
+        cursor = self.get_snapshot_cursor()
+        try:
+            page = yield cursor.next_batch()
+            while True:
+                data = []
+                for item in page:
+                    filtered_item = self.filter_snapshot(item)
+                    if filtered_item:
+                        data.append(filtered_item)
+
+                next_page = []
+                if not cursor.exhausted:
+                    next_page = yield cursor.next_batch()
+
+                response = dict(
+                    action=self.message["action"],
+                    operation="watched" if not next_page else "watching",
+                    status_code=200,
+                    watch=self.message["correlation"],
+                    body=data
+                )
+
+                # Without correlation the snapshot is a resync, the client replaces its data
+                if correlation is not None:
+                    response["correlation"] = correlation
+
+                yield self.callback(response)
+                if not next_page:
+                    break
+
+                page = next_page
+        finally:
+            cursor.close()
 
-        self.callback(dict(
-            action=self.message["action"],
-            operation="watched",
-            correlation=self.message["correlation"],
-            status_code=200,
-            body=filtered_data
-        ))
+    @coroutine
+    def resync(self):
+        logging.info("Resyncing watch for collection %s", self.metadata["collection"])
 
-        add_callback(self.metadata["collection"], self.data_callback)
+        pending = self._pending = []
+        yield self.send_snapshot()
+        yield self._send_pending(pending)
+
+    def match_document(self, _document):
+        return True
 
     @coroutine
     def data_callback(self, document):
@@ -76,12 +136,12 @@ class CursorWatcher(object):
         elif document["op"] == "d":
             operation = "deleted"
 
+        # The oplog document is shared with the other subscribers
+        data = document["o"]
         if self.metadata["projection"]:
-            for key in self.metadata["projection"].iterkeys():
-                if key in document["o"]:
-                    del document["o"][key]
+            data = dict((key, value) for key, value in data.iteritems() if key not in self.metadata["projection"])
 
-        data = self.filter_data(document["o"])
+        data = self.filter_data(data)
         yield self.callback(dict(
             action=self.message["action"],
             operation=operation,
@@ -93,7 +153,29 @@ class CursorWatcher(object):
 
     def unwatch(self):
         logging.info("Stopping watch for collection %s", self.metadata["collection"])
-        remove_callback(self.metadata["collection"], self.data_callback)
+
+        self._pending = None
+        remove_callback(self.metadata["collection"], self._on_change)
+
+    @coroutine
+    def _on_change(self, document):
+        if self._pending is not None:
+            self._pending.append(document)
+        else:
+            yield self.data_callback(document)
+
+    @coroutine
+    def _send_pending(self, pending):
+        # Changes already in the snapshot are sent again, the clients apply them by document
+        while pending and self._pending is pending:
+            yield self.data_callback(pending.pop(0))
+
+        # A resync started meanwhile sends its own pending changes
+        if self._pending is pending:
+            self._pending = None
+
+    def filter_snapshot(self, document):
+        return self.filter_data(document)
 
     def filter_data(self, data):
         if self.metadata["filter_data"]:
@@ -19,13 +19,13 @@ import logging
 from tornado.gen import coroutine, Return
 from tornado.httpclient import HTTPError
 
+from api.v1.serializer import RawJSON
 from api.v1.watchers.metadata import WatcherMetadata
-from data.query import Query
 
 
 class KubeWatcher(object):
 
-    def __init__(self, message, settings, user, callback):
+    def __init__(self, message, settings, user, callback, _close_callback=None):
         logging.info("Initializing KubeWatcher")
 
         self.settings = settings
@@ -34,7 +34,8 @@ class KubeWatcher(object):
         self.user = user
 
         self._metadata = None
-        self._watchers = dict()
+        self._informers = []
+        self._pending_events = None
         self._params = dict()
         self._connected = False
 
@@ -48,52 +49,38 @@ class KubeWatcher(object):
             if "namespace" not in document:
                 raise Return(False)
 
-            namespace = yield Query(self.settings["database"], "Namespaces").find_one({"name": document["namespace"]})
-            if "members" in namespace and self.user["username"] not in namespace["members"]:
+            is_member = yield self.settings["membership"].is_member(
+                document["namespace"], self.user["username"], default=True)
+            if not is_member:
                 raise Return(False)
 
         raise Return(True)
 
     @coroutine
     def watch(self):
-        def done_callback(future):
-            logging.warn("Disconnected from kubeclient.")
-            if future.exception():
-                logging.exception(future.exception())
-
-            if self._connected and (isinstance(future.exception(), HTTPError) and future.exception().code == 599):
-                for watcher_key, watcher_value in self._watchers.iteritems():
-                    if watcher_value == future:
-                        for name, metadata in watcher_metadata.get("resources", {}).iteritems():
-                            if watcher_key != metadata["type"]:
-                                continue
-
-                            self._watchers[watcher_key] = getattr(
-                                self.settings["kube"][name], metadata["method"].lower())(
-                                    on_data=self._data_callback,
-                                    **self._get_params(metadata["parameters"]))
-
-                            self._watchers[watcher_key].add_done_callback(done_callback)
-                            logging.debug("Reconnected watcher for %s with params %s", watcher_key, self._params)
-
         try:
             logging.info("Starting watch KubeWatcher for message %s", self.message)
+            self._pending_events = []
             yield self._init_data()
 
             logging.debug("Starting watch %s connected", self.message["action"])
             watcher_metadata = self._metadata.get("watch", {})
             for resource_name, resource_metadata in watcher_metadata.get("resources", {}).iteritems():
-                self._watchers[resource_metadata["type"]] = getattr(
-                    self.settings["kube"][resource_name], resource_metadata["method"].lower())(
-                        on_data=self._data_callback,
-                        **self._get_params(resource_metadata["parameters"]))
+                params = self._get_params(resource_metadata["parameters"])
+                yield self._subscribe_informer(resource_name, params).start()
 
-                self._watchers[resource_metadata["type"]].add_done_callback(done_callback)
-                self._connected = True
                 logging.debug("Added watcher for resource %s and params %s", resource_metadata["type"], self._params)
 
+            self._connected = True
+
+            # Deliver the events received while the initial snapshot was being sent
+            pending_events, self._pending_events = self._pending_events, None
+            for event in pending_events:
+                yield self._data_callback(event)
+
         except HTTPError as http_error:
             logging.exception(http_error)
+            self._release_informers()
             self.callback(dict(
                 action=self.message["action"],
                 operation="watched",
@@ -101,13 +88,38 @@ class KubeWatcher(object):
                 correlation=self.message["correlation"],
                 body={"error": {"message": "Failed to connect to event source."}},
             ))
+        except Exception:
+            self._release_informers()
+            raise
 
     def unwatch(self):
         logging.info("Stopping watch for message %s", self.message)
+        self._connected = False
+        self._release_informers()
+
+    def _subscribe_informer(self, resource_name, params):
+        informer = self.settings["kube"].informers.acquire(resource_name, **params)
+        if informer in self._informers:
+            self.settings["kube"].informers.release(informer)
+            return informer
+
+        # Subscribe before starting so no event is lost between the LIST and the first watch event
+        informer.add_handler(self._on_informer_event)
+        self._informers.append(informer)
+        return informer
 
-        if self._connected:
-            for watcher in self._watchers.values():
-                watcher.cancel()
+    def _release_informers(self):
+        for informer in self._informers:
+            informer.remove_handler(self._on_informer_event)
+            self.settings["kube"].informers.release(informer)
+
+        self._informers = []
+
+    def _on_informer_event(self, event):
+        if self._pending_events is not None:
+            self._pending_events.append(event)
+        else:
+            return self._data_callback(event)
 
     def _get_metadata(self):
         if "body" in self.message and "kind" in self.message["body"]:
@@ -149,16 +161,26 @@ class KubeWatcher(object):
 
         init_metadata = self._metadata.get("init", {})
         for _, resource_metadata in init_metadata.get("resources", {}).iteritems():
-            result = yield getattr(
-                self.settings["kube"][resource_metadata["resource"]],
-                resource_metadata["method"].lower())(**self._get_params(resource_metadata["parameters"]))
+            params = self._get_params(resource_metadata["parameters"])
+            if resource_metadata["method"] == "GET":
+                # Served from the shared informer store instead of listing from the apiserver
+                informer = self._subscribe_informer(resource_metadata["resource"], params)
+                yield informer.start()
+                result = informer.snapshot()
+            else:
+                result = yield getattr(
+                    self.settings["kube"][resource_metadata["resource"]],
+                    resource_metadata["method"].lower())(**params)
 
             self._params["resourceVersion" + result["kind"]] = result["metadata"]["resourceVersion"]
 
             documents = []
             if "items" in result:
+                kind = result["kind"].replace("List", "")
                 for item in result.get("items", []):
-                    item["kind"] = result["kind"].replace("List", "")
+                    if item.get("kind") != kind:
+                        item["kind"] = kind
+
                     documents.append(item)
             else:
                 self._params["uid"] = result["metadata"]["uid"]
@@ -191,17 +213,16 @@ class KubeWatcher(object):
             logging.warn("Error raised from Kubernetes: %s", data["object"])
             raise Return()
 
-        resource_list = data["object"]["kind"]
-        if resource_list not in self._watchers.keys():
-            resource_list += "List"
-
-        self._params["resourceVersion" + resource_list] = data["object"]["metadata"]["resourceVersion"]
+        # Forwarded as received from Kubernetes when the encoded object is available
+        body = data["object"]
+        if "raw_object" in data:
+            body = RawJSON(data["raw_object"], body)
 
         response = dict(
             action=self.message["action"],
             operation=operation,
             status_code=200,
-            body=data["object"]
+            body=body
         )
 
         yield self.callback(response)
@@ -55,7 +55,7 @@ class WatcherMetadata(object):
             },
             "charts": {
                 "collection": "Charts",
-                "projection": None,
+                "projection": {"resources": 0},
                 "criteria": {},
                 "sort": None,
                 "limit": 0,
@@ -15,15 +15,124 @@ limitations under the License.
 """
 
 import logging
+from datetime import datetime, timedelta
 
 from tornado.gen import coroutine, Return
+from tornado.ioloop import IOLoop
 
-from api.v1.watchers.cursor import CursorWatcher
+from api.v1.watchers.cursor import CursorWatcher, SNAPSHOT_PAGE_SIZE
 from data.query import Query
+from data.retention import (
+    build_downsample_pipeline, build_downsampled_metric, get_metrics_collection, get_resolution)
+
+BATCH_DELAY = timedelta(milliseconds=500)
+BATCH_SIZE = 500
+MAX_POINTS = 500
 
 
 class MetricsWatcher(CursorWatcher):
 
+    def __init__(self, message, settings, user, callback, close_callback=None):
+        self._batch = []
+        self._batch_timeout = None
+
+        self._since = None
+        self._resolution = None
+
+        super(MetricsWatcher, self).__init__(message, settings, user, callback, close_callback)
+
+    def get_snapshot_cursor(self):
+        # The stored resolution already fits, the cursor is filtered and limited by the database
+        if self._resolution is None:
+            return super(MetricsWatcher, self).get_snapshot_cursor()
+
+        pipeline = build_downsample_pipeline(self.metadata["criteria"], self._resolution) + [
+            {"$sort": {"_id.bucket": -1}},
+            {"$limit": self.metadata["limit"]}
+        ]
+
+        return Query(self.settings["database"], self.metadata["collection"]).aggregate_batches(
+            pipeline, batch_size=SNAPSHOT_PAGE_SIZE)
+
+    def filter_snapshot(self, document):
+        if self._resolution is not None:
+            document = build_downsampled_metric(document)
+
+        return self.filter_data(document)
+
+    def get_watch_criteria(self):
+        # The window start is fixed when the watch starts, it is matched by match_document so the
+        # subscriptions of every window share the same change stream pipeline
+        criteria = dict((key, value) for key, value in self.metadata["criteria"].iteritems() if key != "date")
+        return criteria or None
+
+    def match_document(self, document):
+        # Skips the metrics of other namespaces or before the window before they are queued for this client
+        if document["op"] == "i":
+            metric = document["o"]
+            if self._params.get("name") and metric.get("involvedObject", {}).get("name") != self._params["name"]:
+                return False
+
+            if self._since and "date" in metric and metric["date"] < self._since:
+                return False
+
+        return True
+
+    def filter_data(self, data):
+        # Live documents are not matched by the database criteria, drop the ones outside the request
+        if self._params.get("name") and data.get("involvedObject", {}).get("name") != self._params["name"]:
+            return None
+
+        if self._since and "date" in data and data["date"] < self._since:
+            return None
+
+        return dict((key, value) for key, value in data.iteritems() if key not in self.metadata["projection"])
+
+    @coroutine
+    def data_callback(self, document):
+        # Metrics are inserted in bulk by SyncMetrics, send them to the client in a single message
+        if document["op"] != "i":
+            yield super(MetricsWatcher, self).data_callback(document)
+            raise Return()
+
+        data = self.filter_data(document["o"])
+        if data:
+            self._batch.append(data)
+
+        if len(self._batch) >= BATCH_SIZE:
+            yield self._flush_batch()
+        elif self._batch and self._batch_timeout is None:
+            self._batch_timeout = IOLoop.current().add_timeout(BATCH_DELAY, self._flush_batch)
+
+    def unwatch(self):
+        if self._batch_timeout is not None:
+            IOLoop.current().remove_timeout(self._batch_timeout)
+            self._batch_timeout = None
+
+        super(MetricsWatcher, self).unwatch()
+
+    @coroutine
+    def _flush_batch(self):
+        if self._batch_timeout is not None:
+            IOLoop.current().remove_timeout(self._batch_timeout)
+            self._batch_timeout = None
+
+        batch, self._batch = self._batch, []
+        if not batch:
+            raise Return()
+
+        logging.debug("MetricsWatcher sending %d metrics", len(batch))
+        try:
+            yield self.callback(dict(
+                action=self.message["action"],
+                operation="created",
+                status_code=200,
+                body=batch
+            ))
+        except Exception:
+            logging.exception("Failed to send metrics, stopping watch")
+            self.unwatch()
+
     @coroutine
     def check_permissions(self, operation, _document):
         logging.debug("check_permissions for user %s and operation %s on db watch", self.user["username"], operation)
@@ -32,9 +141,9 @@ class MetricsWatcher(CursorWatcher):
             if "name" not in self.message["body"]:
                 raise Return(False)
 
-            namespace = yield Query(self.settings["database"], "Namespaces").find_one(
-                {"name": self.message["body"]["name"]})
-            if self.user["username"] not in namespace["members"]:
+            is_member = yield self.settings["membership"].is_member(
+                self.message["body"]["name"], self.user["username"])
+            if not is_member:
                 raise Return(False)
 
         raise Return(True)
@@ -79,3 +188,49 @@ class MetricsWatcher(CursorWatcher):
 
         if "name" in self.message["body"]:
             self._params["name"] = self.message["body"]["name"]
+
+        window = self._get_int_param("window")
+        max_points = self._get_int_param("max_points")
+
+        # Only the requested documents are read instead of filtering the whole collection in memory
+        criteria = {"involvedObject.kind": self._params["kind"]}
+        if "name" in self._params:
+            criteria["involvedObject.name"] = self._params["name"]
+
+        if window:
+            window = timedelta(seconds=window)
+            self._since = datetime.utcnow() - window
+            criteria["date"] = {"$gte": self._since}
+
+            # Read from the collection with the finest resolution that keeps the whole window
+            self.metadata["collection"] = get_metrics_collection(window, max_points)
+
+            # Points are averaged by the database when even the coarsest collection has too many
+            resolution = get_resolution(self.metadata["collection"])
+            if max_points and window.total_seconds() / resolution.total_seconds() > max_points:
+                self._resolution = timedelta(seconds=int(window.total_seconds() / max_points) + 1)
+
+        self.metadata["criteria"] = criteria
+        self.metadata["projection"] = {"metadata": 0, "date": 0}
+        self.metadata["limit"] = min(max_points or MAX_POINTS, MAX_POINTS)
+
+    def _get_int_param(self, name):
+        if name not in self.message["body"]:
+            return None
+
+        try:
+            value = int(self.message["body"][name])
+            if value <= 0:
+                raise ValueError()
+        except (TypeError, ValueError):
+            self.callback(dict(
+                action=self.message["action"],
+                operation=self.message["operation"],
+                correlation=self.message["correlation"],
+                body={"message": "%s must be a positive integer in request body %s" % (name, self.message["body"])},
+                status_code=400
+            ))
+
+            raise RuntimeError()
+
+        return value
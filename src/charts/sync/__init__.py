@@ -38,10 +38,11 @@ def initialize():
     motor_client = MotorClient(mongo_url)
 
     try:
-        watch.start_monitor(motor_client)
+        watch.configure(backend=os.getenv("WATCH_BACKEND", watch.DEFAULT_BACKEND))
+        watch.start_monitor(motor_client, name="charts")
 
         elastickube_db = motor_client.elastickube
-        elastickube_db.add_son_manipulator(KeyManipulator())
+        elastickube_db.add_son_manipulator(KeyManipulator(collections=["Charts"]))
         yield GitSync(elastickube_db).sync_loop()
     except:
         logging.exception("Unexpected error executing GitSync sync loop.")
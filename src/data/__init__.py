@@ -16,12 +16,19 @@ limitations under the License.
 
 import logging
 import time
+from datetime import timedelta
 
-from tornado.gen import coroutine
+from pymongo import UpdateOne
+from tornado.gen import coroutine, sleep
+
+from data.indexes import setup_indexes as setup_collection_indexes
+from data.retention import parse_timestamp, setup_metrics_indexes
 
 DEFAULT_GITREPO = "https://github.com/helm/charts-classic.git"
 DEFAULT_PASSWORD_REGEX = "^.{8,256}$"
-SCHEMA_VERSION = 3
+SCHEMA_VERSION = 5
+SCHEMA_POLL_INTERVAL = timedelta(seconds=1)
+MIGRATION_BATCH_SIZE = 1000
 
 
 @coroutine
@@ -57,11 +64,28 @@ def init(database):
             yield migrate(database, settings)
 
 
+@coroutine
+def wait_for_schema(database):
+    """Waits until the database has been initialized and migrated to SCHEMA_VERSION by another process.
+    """
+
+    logged = False
+    while True:
+        settings = yield database.Settings.find_one({"metadata.deletionTimestamp": None}, ["schema_version"])
+        if settings is not None and settings.get("schema_version", 0) >= SCHEMA_VERSION:
+            break
+
+        if not logged:
+            logging.info("Waiting for the database to be migrated to schema %d", SCHEMA_VERSION)
+            logged = True
+
+        yield sleep(SCHEMA_POLL_INTERVAL.total_seconds())
+
+
 @coroutine
 def setup_indexes(database):
-    yield database.Users.ensure_index(key_or_list="email", unique=True, sparse=True)
-    yield database.Users.ensure_index(key_or_list="username", unique=True, sparse=True)
-    yield database.Users.ensure_index(key_or_list="metadata.deletionTimestamp", unique=False, sparse=True)
+    yield setup_collection_indexes(database)
+    yield setup_metrics_indexes(database)
 
 
 @coroutine
@@ -90,3 +114,41 @@ def migrate(database, settings):
 
         settings["schema_version"] = 3
         database.Settings.update({"_id": settings["_id"]}, settings)
+
+    if settings["schema_version"] == 3:
+
+        # Metrics expire using a TTL index on their date
+        cursor = database.Metrics.find({"date": {"$exists": False}, "timestamp": {"$exists": True}}, ["timestamp"])
+        yield update_documents(
+            database.Metrics, cursor, lambda metric: {"$set": {"date": parse_timestamp(metric["timestamp"])}})
+
+        settings["schema_version"] = 4
+        yield database.Settings.update({"_id": settings["_id"]}, settings)
+
+    if settings["schema_version"] == 4:
+
+        # Users are searched by email without case using a lowercase copy
+        cursor = database.Users.find({"email": {"$type": "string"}, "email_lower": {"$exists": False}}, ["email"])
+        yield update_documents(database.Users, cursor, lambda user: {"$set": {"email_lower": user["email"].lower()}})
+
+        settings["schema_version"] = 5
+        yield database.Settings.update({"_id": settings["_id"]}, settings)
+
+
+@coroutine
+def update_documents(collection, cursor, update):
+    """Updates every document of the cursor with update(document), in unordered bulk writes of
+    MIGRATION_BATCH_SIZE documents.
+    """
+
+    requests = []
+    while (yield cursor.fetch_next):
+        document = cursor.next_object()
+        requests.append(UpdateOne({"_id": document["_id"]}, update(document)))
+
+        if len(requests) == MIGRATION_BATCH_SIZE:
+            yield collection.bulk_write(requests, ordered=False)
+            requests = []
+
+    if requests:
+        yield collection.bulk_write(requests, ordered=False)
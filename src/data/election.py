@@ -0,0 +1,128 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+from tornado.gen import coroutine, Return
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+from data.lease import Lease, LEASE_DURATION
+
+
+class LeaderElection(object):
+    """Elects a single leader between the processes campaigning for the same lease.
+
+    Every candidate tries to acquire the lease every third of its duration, the leader renewing it. A
+    leader that cannot renew the lease steps down before it may expire, so when the leader dies or is
+    partitioned a follower takes over within the lease duration plus one campaign interval, about 40 seconds
+    with the default 30 seconds lease. A leader stopping cleanly releases the lease, so a follower takes over
+    at its next campaign instead, within one campaign interval.
+
+    on_elected runs apart from the campaigns so the lease keeps being renewed while the leader starts,
+    if the lease is lost meanwhile on_demoted is called once on_elected finishes.
+    """
+
+    def __init__(self, database, name, on_elected, on_demoted, duration=LEASE_DURATION, holder=None):
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+
+        self.lease = Lease(database, name, holder=holder, duration=duration)
+        self.interval = duration / 3
+        self.leader = False
+
+        self._campaigning = False
+        self._periodic_campaign = PeriodicCallback(self.campaign, self.interval.total_seconds() * 1000)
+
+    @coroutine
+    def start(self):
+        yield self.campaign()
+        self._periodic_campaign.start()
+
+    @coroutine
+    def stop(self):
+        self._periodic_campaign.stop()
+        self._demote()
+
+        try:
+            yield self.lease.release()
+        except PyMongoError:
+            logging.exception("Cannot release lease %s", self.lease.name)
+
+    @coroutine
+    def campaign(self):
+        if self._campaigning:
+            raise Return()
+
+        self._campaigning = True
+        try:
+            try:
+                elected = yield self.lease.acquire()
+            except PyMongoError:
+                logging.exception("Cannot acquire lease %s", self.lease.name)
+
+                # Still the leader only if the lease cannot expire before the next campaign
+                elected = (self.leader and
+                           self.lease.expires is not None and
+                           self.lease.expires - datetime.utcnow() > self.interval)
+
+            if elected and not self.leader:
+                self.leader = True
+                IOLoop.current().spawn_callback(self._elect)
+            elif not elected and self.leader:
+                self._demote()
+        finally:
+            self._campaigning = False
+
+    @coroutine
+    def _elect(self):
+        logging.info("%s elected leader of %s", self.lease.holder, self.lease.name)
+
+        try:
+            yield self.on_elected()
+        except Exception:
+            logging.exception("Failed to start leading %s, stepping down", self.lease.name)
+            self._demote()
+
+            # Leaves the lease to another candidate
+            try:
+                yield self.lease.release()
+            except PyMongoError:
+                logging.exception("Cannot release lease %s", self.lease.name)
+
+            raise Return()
+
+        # What on_elected started after a demotion while it was running must be stopped too
+        if not self.leader or not self.lease.held:
+            logging.warning("%s lost lease %s while starting to lead", self.lease.holder, self.lease.name)
+            self.leader = False
+            self._stop_leading()
+
+    def _demote(self):
+        if not self.leader:
+            return
+
+        logging.info("%s is no longer the leader of %s", self.lease.holder, self.lease.name)
+
+        self.leader = False
+        self._stop_leading()
+
+    def _stop_leading(self):
+        try:
+            self.on_demoted()
+        except Exception:
+            logging.exception("Failed to stop leading %s", self.lease.name)
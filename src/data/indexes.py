@@ -0,0 +1,76 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+
+import pymongo
+from tornado.gen import coroutine
+
+# Partial indexes only keep the documents not deleted, the ones Query reads
+PARTIAL_FILTER = {"metadata.deletionTimestamp": None}
+
+INDEXES = {
+    "Users": [
+        dict(keys=[("email", pymongo.ASCENDING)], unique=True, sparse=True),
+        dict(keys=[("username", pymongo.ASCENDING)], unique=True, sparse=True),
+        dict(keys=[("metadata.deletionTimestamp", pymongo.ASCENDING)], sparse=True),
+        dict(keys=[("email_lower", pymongo.ASCENDING)], partial=True),
+        dict(keys=[("invite_token", pymongo.ASCENDING)], partial=True),
+        dict(keys=[("saml_id", pymongo.ASCENDING)], partial=True),
+        dict(keys=[("role", pymongo.ASCENDING)], partial=True)
+    ],
+    "Namespaces": [
+        dict(keys=[("name", pymongo.ASCENDING)], partial=True),
+        dict(keys=[("members", pymongo.ASCENDING)], partial=True)
+    ],
+    "Charts": [
+        dict(keys=[("path", pymongo.ASCENDING)], partial=True)
+    ]
+}
+
+# Lowercase copies of the fields searched without case, kept by Query on every write
+LOWERCASE_FIELDS = {
+    "Users": {"email": "email_lower"}
+}
+
+
+def set_lowercase_fields(collection, document):
+    for field, lowercase_field in LOWERCASE_FIELDS.get(collection, dict()).iteritems():
+        if document.get(field) is not None:
+            document[lowercase_field] = document[field].lower()
+
+
+def set_lowercase_updates(collection, update):
+    for field, lowercase_field in LOWERCASE_FIELDS.get(collection, dict()).iteritems():
+        for operator in ["$set", "$setOnInsert"]:
+            if field in update.get(operator, dict()):
+                value = update[operator][field]
+                update[operator][lowercase_field] = value.lower() if value is not None else None
+
+        if field in update.get("$unset", dict()):
+            update["$unset"][lowercase_field] = ""
+
+
+@coroutine
+def setup_indexes(database):
+    for collection, indexes in INDEXES.iteritems():
+        for index in indexes:
+            options = dict((key, value) for key, value in index.iteritems() if key not in ["keys", "partial"])
+            if index.get("partial", False):
+                options["partialFilterExpression"] = PARTIAL_FILTER
+
+            logging.debug("Creating index %s on %s", index["keys"], collection)
+            yield database[collection].create_index(index["keys"], **options)
@@ -0,0 +1,81 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from tornado.gen import coroutine, Return
+
+LEASE_COLLECTION = "Leases"
+LEASE_DURATION = timedelta(seconds=30)
+
+
+def get_holder_id():
+    return "%s-%d" % (socket.gethostname(), os.getpid())
+
+
+class Lease(object):
+    """Exclusive lease on a named resource stored in the Leases collection.
+
+    The lease is held until its expiration date, the holder must renew it before it expires. Expiration
+    dates are computed with the clock of each holder, so the duration must be well above their skew.
+    """
+
+    def __init__(self, database, name, holder=None, duration=LEASE_DURATION):
+        self.collection = database[LEASE_COLLECTION]
+        self.name = name
+        self.holder = holder or get_holder_id()
+        self.duration = duration
+
+        self.expires = None
+
+    @property
+    def held(self):
+        return self.expires is not None and self.expires > datetime.utcnow()
+
+    @coroutine
+    def acquire(self):
+        """Acquires or renews the lease, returns whether it is held.
+        """
+
+        now = datetime.utcnow()
+        try:
+            yield self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires": {"$lt": now}}]},
+                {"$set": {"holder": self.holder, "expires": now + self.duration}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # The lease exists and it is held by another holder
+            self.expires = None
+            raise Return(False)
+
+        if self.expires is None:
+            logging.info("Lease %s acquired by %s", self.name, self.holder)
+
+        self.expires = now + self.duration
+        raise Return(True)
+
+    @coroutine
+    def release(self):
+        if self.expires is not None:
+            self.expires = None
+            yield self.collection.delete_one({"_id": self.name, "holder": self.holder})
+            logging.info("Lease %s released by %s", self.name, self.holder)
@@ -0,0 +1,198 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+from datetime import timedelta
+
+from tornado.gen import coroutine, Return
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+from data import watch
+from data.query import Query
+
+STATS_INTERVAL = timedelta(minutes=5)
+
+
+class NamespaceMembership(object):
+    """Members of every namespace kept in memory and updated from the Namespaces oplog.
+
+    Once loaded a namespace missing from the cache does not exist, so permission checks only read the
+    database while the cache is (re)loading. A cache that may have missed changes is loaded again.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+
+        self._members = dict()
+        self._names = dict()
+        self._pending = None
+        self._generation = 0
+        self._subscription = None
+        self._stats_callback = None
+
+    @coroutine
+    def start(self):
+        # Subscribed before loading so the changes made meanwhile are not lost
+        self._subscription = yield watch.add_callback(
+            "Namespaces",
+            self._on_change,
+            overflow=watch.OVERFLOW_DISCONNECT,
+            on_overflow=self._on_overflow,
+            on_resync=self.load)
+
+        yield self.load()
+
+        if self._stats_callback is None:
+            self._stats_callback = PeriodicCallback(
+                self._log_stats, STATS_INTERVAL.total_seconds() * 1000)
+            self._stats_callback.start()
+
+    def stop(self):
+        if self._stats_callback is not None:
+            self._stats_callback.stop()
+            self._stats_callback = None
+
+        if self._subscription is not None:
+            watch.remove_callback("Namespaces", self._on_change)
+            self._subscription = None
+
+        self._pending = None
+        self.loaded = False
+
+    @coroutine
+    def load(self):
+        self.loaded = False
+
+        # The query may not include the changes delivered while it runs, they are applied once it is swapped
+        self._generation += 1
+        generation = self._generation
+        pending = self._pending = []
+
+        members = dict()
+        names = dict()
+        namespaces = yield Query(self.database, "Namespaces").find(projection=["name", "members"])
+        for namespace in namespaces:
+            members[namespace["name"]] = self._get_members(namespace)
+            names[namespace["_id"]] = namespace["name"]
+
+        # A newer load replaces this one
+        if generation != self._generation:
+            raise Return()
+
+        self._members = members
+        self._names = names
+
+        while pending and generation == self._generation:
+            yield self._apply(pending.pop(0))
+
+        if generation != self._generation:
+            raise Return()
+
+        self._pending = None
+        self.loaded = True
+
+        logging.debug("Loaded members of %d namespaces", len(members))
+
+    @coroutine
+    def is_member(self, namespace, username, default=False):
+        """Returns whether username is a member of namespace, or default if the namespace has no members.
+        """
+
+        if self.loaded:
+            self.hits += 1
+            if namespace not in self._members:
+                raise Return(False)
+
+            members = self._members[namespace]
+        else:
+            self.misses += 1
+            document = yield Query(self.database, "Namespaces").find_one({"name": namespace}, ["members"])
+            if document is None:
+                raise Return(False)
+
+            members = self._get_members(document)
+
+        raise Return(default if members is None else username in members)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=float(self.hits) / total if total else 0.0,
+            namespaces=len(self._members))
+
+    @staticmethod
+    def _get_members(namespace):
+        return frozenset(namespace["members"]) if "members" in namespace else None
+
+    @coroutine
+    def _on_change(self, document):
+        if self._pending is not None:
+            self._pending.append(document)
+        else:
+            yield self._apply(document)
+
+    @coroutine
+    def _apply(self, document):
+        document_id = watch.get_document_id(document)
+
+        try:
+            if document["op"] == "d":
+                self._remove(document_id)
+            elif document["op"] == "u" and any(key.startswith("$") for key in document["o"]):
+                # Partial updates only have the modified fields
+                namespace = yield Query(self.database, "Namespaces").find_one(
+                    {"_id": document_id}, ["name", "members"])
+                if namespace is None:
+                    self._remove(document_id)
+                else:
+                    self._set(namespace)
+            elif document["o"].get("metadata", {}).get("deletionTimestamp") is not None:
+                self._remove(document_id)
+            else:
+                self._set(document["o"])
+        except Exception:
+            logging.exception("Failed to update the members of namespace %s, loading them again", document_id)
+            self.loaded = False
+            IOLoop.current().spawn_callback(self.load)
+
+    def _set(self, namespace):
+        previous_name = self._names.get(namespace["_id"])
+        if previous_name is not None and previous_name != namespace["name"]:
+            self._members.pop(previous_name, None)
+
+        self._names[namespace["_id"]] = namespace["name"]
+        self._members[namespace["name"]] = self._get_members(namespace)
+
+    def _remove(self, document_id):
+        name = self._names.pop(document_id, None)
+        if name is not None:
+            self._members.pop(name, None)
+
+    def _on_overflow(self):
+        logging.warning("Namespace membership cache fell behind, loading it again")
+
+        self.loaded = False
+        self._subscription = None
+        IOLoop.current().spawn_callback(self.start)
+
+    def _log_stats(self):
+        logging.info("Namespace membership cache stats %s", self.stats())
@@ -17,15 +17,97 @@ limitations under the License.
 import time
 
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 from pymongo.errors import PyMongoError
 from tornado.gen import coroutine, Return
 
+from data.indexes import set_lowercase_fields, set_lowercase_updates
+
 
 class ObjectNotFoundError(PyMongoError):
     """Raised when object is not found into the collection.
     """
 
 
+DELETION_TIMESTAMP = "metadata.deletionTimestamp"
+DEFAULT_BATCH_SIZE = 100
+
+
+class CompiledQuery(object):
+    """Immutable filter of the documents not deleted that match the criteria.
+
+    The criteria are compiled once, the deletionTimestamp equality is kept at the top level of the
+    filter so it can use an index and nested $and clauses are flattened when their fields do not
+    collide. Compiled queries can be reused safely, each filter returned is a new dict.
+    """
+
+    __slots__ = ["_clauses", "_conjunction"]
+
+    def __init__(self, criteria=None):
+        clauses = [(DELETION_TIMESTAMP, None)]
+        conjunction = []
+
+        for key, value in self._flatten(criteria or dict()):
+            if key in dict(clauses):
+                # The same field twice can only be expressed with $and
+                conjunction.append({key: value})
+            else:
+                clauses.append((key, value))
+
+        self._clauses = tuple(clauses)
+        self._conjunction = tuple(conjunction)
+
+    @classmethod
+    def _flatten(cls, criteria):
+        for key, value in criteria.iteritems():
+            if key == "$and":
+                for clause in value:
+                    for item in cls._flatten(clause):
+                        yield item
+            else:
+                yield key, value
+
+    def as_filter(self):
+        query = dict(self._clauses)
+        if self._conjunction:
+            query["$and"] = list(self._conjunction)
+
+        return query
+
+
+NOT_DELETED = CompiledQuery()
+
+
+class BatchCursor(object):
+    """Reads the results of a Motor cursor in batches instead of materializing all of them.
+    """
+
+    def __init__(self, cursor, batch_size=DEFAULT_BATCH_SIZE):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.exhausted = False
+
+    @coroutine
+    def next_batch(self):
+        """Returns up to batch_size documents, an empty list once the cursor is exhausted.
+        """
+
+        documents = []
+        while len(documents) < self.batch_size:
+            if not (yield self.cursor.fetch_next):
+                self.exhausted = True
+                break
+
+            documents.append(self.cursor.next_object())
+
+        raise Return(documents)
+
+    def close(self):
+        if not self.exhausted:
+            self.exhausted = True
+            self.cursor.close()
+
+
 class Query(object):
 
     def __init__(self, database, collection, manipulate=False):
@@ -33,18 +115,15 @@ class Query(object):
         self.collection = collection
         self.manipulate = manipulate
 
-        self.default_criteria = {"$and": [{"metadata.deletionTimestamp": None}]}
+    @staticmethod
+    def _generate_query(criteria):
+        if isinstance(criteria, CompiledQuery):
+            return criteria.as_filter()
 
-    def _generate_query(self, criteria):
-        query = self.default_criteria
-        if criteria:
-            if len(criteria) > 1:
-                for key, value in criteria.iteritems():
-                    query['$and'].append({key: value})
-            else:
-                query['$and'].append(criteria)
+        if not criteria:
+            return NOT_DELETED.as_filter()
 
-        return query
+        return CompiledQuery(criteria).as_filter()
 
     @coroutine
     def find_one(self, criteria=None, projection=None):
@@ -58,19 +137,25 @@ class Query(object):
     def find(self, criteria=None, projection=None, sort=None, limit=0):
         documents = []
 
+        cursor = self.find_batches(criteria, projection, sort, limit)
+        while not cursor.exhausted:
+            documents.extend((yield cursor.next_batch()))
+
+        raise Return(documents)
+
+    def find_batches(self, criteria=None, projection=None, sort=None, limit=0, batch_size=DEFAULT_BATCH_SIZE):
         cursor = self.database[self.collection].find(
             self._generate_query(criteria),
             projection,
             sort=sort,
             limit=limit,
             manipulate=self.manipulate)
-        while (yield cursor.fetch_next):
-            documents.append(cursor.next_object())
+        cursor.batch_size(batch_size)
 
-        raise Return(documents)
+        return BatchCursor(cursor, batch_size)
 
-    @coroutine
-    def insert(self, document):
+    @staticmethod
+    def _set_creation_metadata(document):
         if "metadata" in document:
             document["metadata"]["resourceVersion"] = time.time()
             document["metadata"]["creationTimestamp"] = time.time()
@@ -82,34 +167,126 @@ class Query(object):
                 deletionTimestamp=None
             )
 
-        if '_id' not in document and not self.manipulate:
+    @coroutine
+    def aggregate(self, pipeline, criteria=None):
+        documents = []
+
+        cursor = self.aggregate_batches(pipeline, criteria)
+        while not cursor.exhausted:
+            documents.extend((yield cursor.next_batch()))
+
+        raise Return(documents)
+
+    def aggregate_batches(self, pipeline, criteria=None, batch_size=DEFAULT_BATCH_SIZE):
+        cursor = self.database[self.collection].aggregate(
+            [{"$match": self._generate_query(criteria)}] + pipeline,
+            batchSize=batch_size)
+
+        return BatchCursor(cursor, batch_size)
+
+    @coroutine
+    def insert(self, document):
+        """Inserts the document and returns it without reading it back, it is the same document stored.
+        """
+
+        self._set_creation_metadata(document)
+        set_lowercase_fields(self.collection, document)
+
+        if '_id' not in document:
             document['_id'] = ObjectId()
-        document_id = yield self.database[self.collection].insert(document, manipulate=self.manipulate)
-        inserted_document = yield self.database[self.collection].find_one(
-            {"_id": document_id},
-            manipulate=self.manipulate)
-        raise Return(inserted_document)
+        yield self.database[self.collection].insert(document, manipulate=self.manipulate)
+        raise Return(document)
+
+    @coroutine
+    def insert_many(self, documents):
+        """Inserts the documents with an unordered bulk write, the documents are not read back.
+        """
+
+        for document in documents:
+            self._set_creation_metadata(document)
+            set_lowercase_fields(self.collection, document)
+            if '_id' not in document:
+                document['_id'] = ObjectId()
+
+        if self.manipulate:
+            # insert_many does not apply the SON manipulators
+            document_ids = yield self.database[self.collection].insert(
+                documents,
+                manipulate=True,
+                continue_on_error=True)
+            raise Return(document_ids)
+
+        result = yield self.database[self.collection].insert_many(documents, ordered=False)
+        raise Return(result.inserted_ids)
 
     @coroutine
     def update(self, document):
+        document = yield self.find_one_and_replace(document, upsert=True)
+        raise Return(document)
+
+    @coroutine
+    def find_one_and_replace(self, document, upsert=False, read_back=True):
+        """Replaces the document with the same _id and returns the stored document in the same round trip.
+
+        Without upsert only documents not deleted are replaced. With read_back False the given
+        document is returned instead, find_one_and_replace does not apply the SON manipulators so
+        manipulated collections are never read back.
+        """
+
         document["metadata"]["resourceVersion"] = time.time()
-        response = yield self.database[self.collection].update(
-            {"_id": document["_id"]},
+        set_lowercase_fields(self.collection, document)
+
+        criteria = {"_id": document["_id"]} if upsert else self._generate_query({"_id": document["_id"]})
+        if self.manipulate or not read_back:
+            response = yield self.database[self.collection].update(
+                criteria,
+                document,
+                upsert=upsert,
+                manipulate=self.manipulate)
+            if response['n'] == 0:
+                raise ObjectNotFoundError()
+
+            raise Return(document)
+
+        updated_document = yield self.database[self.collection].find_one_and_replace(
+            criteria,
             document,
-            upsert=True,
-            manipulate=self.manipulate)
-        if response['n'] == 0:
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER)
+        if updated_document is None:
+            raise ObjectNotFoundError()
+
+        raise Return(updated_document)
+
+    @coroutine
+    def find_one_and_update(self, criteria, update, upsert=False, projection=None):
+        """Applies the update operators to the first document matching criteria and returns it updated.
+        """
+
+        update.setdefault("$set", dict())["metadata.resourceVersion"] = time.time()
+        if upsert:
+            update.setdefault("$setOnInsert", dict())
+            for key, value in [("metadata.creationTimestamp", time.time()), ("metadata.deletionTimestamp", None)]:
+                if key not in update["$set"]:
+                    update["$setOnInsert"][key] = value
+
+        set_lowercase_updates(self.collection, update)
+        updated_document = yield self.database[self.collection].find_one_and_update(
+            criteria,
+            update,
+            projection,
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER)
+        if updated_document is None:
             raise ObjectNotFoundError()
 
-        updated_document = yield self.database[self.collection].find_one(
-            {"_id": document["_id"]},
-            manipulate=self.manipulate)
         raise Return(updated_document)
 
     @coroutine
     def update_fields(self, criteria, fields):
         update = {"$set": fields}
         update["$set"]["metadata.resourceVersion"] = time.time()
+        set_lowercase_updates(self.collection, update)
 
         response = yield self.database[self.collection].update(criteria, update, manipulate=self.manipulate)
         raise Return(response)
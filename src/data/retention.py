@@ -0,0 +1,164 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+
+import pymongo
+from pymongo.operations import ReplaceOne
+from tornado.gen import coroutine, Return
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+EPOCH = datetime(1970, 1, 1)
+
+# Heapster resolution, used for the raw Metrics
+RAW_RESOLUTION = timedelta(minutes=1)
+
+# Ordered from the finest to the coarsest resolution, every level is rolled up from the previous one
+METRICS_RESOLUTIONS = [
+    dict(collection="Metrics", resolution=None, retention=timedelta(days=1)),
+    dict(collection="Metrics5m", resolution=timedelta(minutes=5), retention=timedelta(days=7)),
+    dict(collection="Metrics1h", resolution=timedelta(hours=1), retention=timedelta(days=90))
+]
+
+
+def parse_timestamp(timestamp):
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+
+
+def format_timestamp(date):
+    return date.strftime(TIMESTAMP_FORMAT)
+
+
+def get_resolution(collection):
+    for level in METRICS_RESOLUTIONS:
+        if level["collection"] == collection:
+            return level["resolution"] or RAW_RESOLUTION
+
+    return RAW_RESOLUTION
+
+
+def get_metrics_collection(window, max_points=None):
+    """Returns the Metrics collection with the finest resolution that still keeps the whole window.
+
+    When max_points is given the coarser collections are preferred if the finer ones would return more
+    points than requested.
+    """
+
+    candidates = [level for level in METRICS_RESOLUTIONS if window <= level["retention"]]
+    if not candidates:
+        return METRICS_RESOLUTIONS[-1]["collection"]
+
+    if max_points:
+        for level in candidates:
+            if window.total_seconds() / get_resolution(level["collection"]).total_seconds() <= max_points:
+                return level["collection"]
+
+    return candidates[0]["collection"]
+
+
+def build_downsample_pipeline(criteria, resolution):
+    """Aggregation pipeline averaging the metrics that match criteria in buckets of the given resolution.
+    """
+
+    resolution_ms = int(resolution.total_seconds() * 1000)
+    return [
+        {"$match": criteria},
+        {"$group": {
+            "_id": {
+                "name": "$involvedObject.name",
+                "bucket": {"$subtract": ["$date", {"$mod": [{"$subtract": ["$date", EPOCH]}, resolution_ms]}]}
+            },
+            "involvedObject": {"$first": "$involvedObject"},
+            "cpu_ratio": {"$avg": "$data.cpu_ratio"},
+            "mem_ratio": {"$avg": "$data.mem_ratio"}
+        }}
+    ]
+
+
+def build_downsampled_metric(result):
+    bucket = result["_id"]["bucket"]
+    return dict(
+        kind="Metric",
+        involvedObject=result["involvedObject"],
+        timestamp=format_timestamp(bucket),
+        date=bucket,
+        data=dict(cpu_ratio=result["cpu_ratio"], mem_ratio=result["mem_ratio"])
+    )
+
+
+@coroutine
+def setup_metrics_indexes(database):
+    for level in METRICS_RESOLUTIONS:
+        collection = database[level["collection"]]
+
+        yield collection.ensure_index(
+            key_or_list="date",
+            expireAfterSeconds=int(level["retention"].total_seconds()))
+        yield collection.ensure_index(
+            key_or_list=[("involvedObject.name", pymongo.ASCENDING), ("timestamp", pymongo.ASCENDING)])
+
+        if level["resolution"]:
+            yield collection.ensure_index(
+                key_or_list=[("involvedObject.name", pymongo.ASCENDING), ("date", pymongo.ASCENDING)],
+                unique=True)
+
+
+@coroutine
+def rollup_metrics(database, now=None):
+    """Downsamples every Metrics level into the next one averaging the points of each bucket.
+
+    The last bucket of every level is computed again on each run so it is completed once all its
+    points are available, buckets are replaced so running it again is harmless.
+    """
+
+    now = now or datetime.utcnow()
+    for source, target in zip(METRICS_RESOLUTIONS, METRICS_RESOLUTIONS[1:]):
+        count = yield _rollup_level(database, source, target, now)
+        logging.debug("Rolled up %d buckets from %s into %s", count, source["collection"], target["collection"])
+
+
+@coroutine
+def _rollup_level(database, source, target, now):
+    since = now - source["retention"]
+    cursor = database[target["collection"]].find(
+        {}, ["date"], sort=[("date", pymongo.DESCENDING)], limit=1)
+    if (yield cursor.fetch_next):
+        since = max(since, cursor.next_object()["date"])
+
+    pipeline = build_downsample_pipeline({"date": {"$gte": since, "$lt": now}}, target["resolution"])
+
+    operations = []
+    cursor = database[source["collection"]].aggregate(pipeline)
+    while (yield cursor.fetch_next):
+        document = build_downsampled_metric(cursor.next_object())
+        document["metadata"] = dict(
+            resourceVersion=time.time(),
+            creationTimestamp=time.time(),
+            deletionTimestamp=None
+        )
+
+        # Replaced instead of updated so the oplog keeps the whole document for the watchers
+        operations.append(ReplaceOne(
+            {"involvedObject.name": document["involvedObject"]["name"], "date": document["date"]},
+            document,
+            upsert=True))
+
+    if operations:
+        yield database[target["collection"]].bulk_write(operations, ordered=False)
+
+    raise Return(len(operations))
@@ -16,45 +16,120 @@ limitations under the License.
 
 from pymongo.son_manipulator import SONManipulator
 
+MAX_CACHED_DOCUMENTS = 1024
+
 
 class KeyManipulator(SONManipulator):
+    """Replaces the dots in the keys of the documents, MongoDB does not accept them in field names.
+
+    Only the given collections are manipulated. Documents are traversed iteratively, only the dicts
+    and lists are visited and just the keys that need it are renamed. The paths of the renamed keys
+    of the documents written with a commit are cached by _id and commit, so unchanged charts are not
+    traversed again when they are written or read.
+    """
 
-    def __init__(self, replace=".", replacement="__dot__"):
+    def __init__(self, replace=".", replacement="__dot__", collections=None):
         self.replace = replace
         self.replacement = replacement
+        self.collections = collections
+
+        self._paths = dict()
 
     def transform_incoming(self, son, collection):
-        return self._manipulate(son, collection, self._need_transform_key, self._transform_key)
+        return self._manipulate(son, collection, self.replace, self.replacement)
 
     def transform_outgoing(self, son, collection):
-        return self._manipulate(son, collection, self._need_revert_key, self._revert_key)
-
-    def _need_transform_key(self, key):
-        return self.replace in key
-
-    def _transform_key(self, key):
-        return key.replace(self.replace, self.replacement)
-
-    def _need_revert_key(self, key):
-        return self.replacement in key
-
-    def _revert_key(self, key):
-        return key.replace(self.replacement, self.replace)
-
-    def _manipulate(self, son, collection, need_transform, transform):
-        if isinstance(son, dict):
-            for (key, value) in son.items():
-                if need_transform(key):
-                    if isinstance(value, dict):
-                        son[transform(key)] = self._manipulate(son.pop(key), collection, need_transform, transform)
-                    elif isinstance(value, list):
-                        son[transform(key)] = [
-                            self._manipulate(item, collection, need_transform, transform) for item in son.pop(key)]
-                    else:
-                        son[transform(key)] = son.pop(key)
-                elif isinstance(value, dict):
-                    son[key] = self._manipulate(value, collection, need_transform, transform)
-                elif isinstance(value, list):
-                    son[key] = [self._manipulate(item, collection, need_transform, transform) for item in value]
+        return self._manipulate(son, collection, self.replacement, self.replace)
+
+    def _manipulate(self, son, collection, old, new):
+        if self.collections is not None and collection.name not in self.collections:
+            return son
+
+        cache_key = None
+        if isinstance(son, dict) and "commit" in son and "_id" in son:
+            cache_key = (collection.name, son["_id"], son["commit"])
+
+            # Paths of the whole document cover any projection of it, a projected read only misses some
+            paths = self._paths.get(cache_key)
+            if paths is not None:
+                if self._rename_paths(son, paths, old, new):
+                    return son
+
+                # Partially renamed, the remaining paths would not describe the whole document
+                if old == self.replace:
+                    self._paths.pop(cache_key, None)
+                cache_key = None
+
+        paths = self._rename_keys(son, old, new)
+
+        # Only written documents are known to be whole, reads may be projected and miss some of the paths
+        if cache_key is not None and old == self.replace:
+            if len(self._paths) >= MAX_CACHED_DOCUMENTS:
+                self._paths.clear()
+
+            # Stored with the keys as they are in the database so reads can use them too
+            self._paths[cache_key] = [
+                tuple(key.replace(old, new) if isinstance(key, basestring) else key for key in path)
+                for path in paths]
 
         return son
+
+    @staticmethod
+    def _rename_keys(son, old, new):
+        """Renames the keys containing old in the whole document and returns the paths of the renamed keys.
+        """
+
+        # Paths are linked (parent, key) pairs, only flattened for the renamed keys
+        renamed = []
+        pending = [(None, son)]
+        while pending:
+            parent, value = pending.pop()
+
+            if isinstance(value, dict):
+                for key in value.keys():
+                    child = value[key]
+                    if old in key:
+                        del value[key]
+                        value[key.replace(old, new)] = child
+                        renamed.append((parent, key))
+                        key = key.replace(old, new)
+
+                    if isinstance(child, (dict, list)):
+                        pending.append(((parent, key), child))
+            else:
+                for index, child in enumerate(value):
+                    if isinstance(child, (dict, list)):
+                        pending.append(((parent, index), child))
+
+        paths = []
+        for link in renamed:
+            path = []
+            while link is not None:
+                link, key = link
+                path.append(key)
+
+            path.reverse()
+            paths.append(tuple(path))
+
+        return paths
+
+    def _rename_paths(self, son, paths, old, new):
+        """Renames the keys at the cached paths, returns False if the document does not have them.
+        """
+
+        # Paths are discovered from the outermost key, the parents are already renamed
+        for path in paths:
+            container = son
+            try:
+                for key in path[:-1]:
+                    container = container[self._stored_key(key, new)]
+
+                key = self._stored_key(path[-1], old)
+                container[key.replace(old, new)] = container.pop(key)
+            except (KeyError, IndexError, TypeError):
+                return False
+
+        return True
+
+    def _stored_key(self, key, replacement):
+        return key.replace(self.replacement, replacement) if isinstance(key, basestring) else key
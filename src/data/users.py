@@ -0,0 +1,137 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from tornado.concurrent import Future
+from tornado.gen import coroutine, Return
+from tornado.ioloop import IOLoop
+
+from data import watch
+
+USER_TTL = timedelta(seconds=30)
+MAX_CACHED_USERS = 10000
+
+
+class UserCache(object):
+    """Users by username shared by all the websocket connections of the process.
+
+    Entries expire after USER_TTL and are invalidated by the Users oplog, concurrent lookups of the
+    same username share a single query. The cached users are shared so they must be treated as read only.
+    """
+
+    def __init__(self, database, ttl=USER_TTL):
+        self.database = database
+        self.ttl = ttl.total_seconds()
+
+        self.hits = 0
+        self.misses = 0
+
+        self._users = dict()
+        self._usernames = dict()
+        self._pending = dict()
+        self._subscription = None
+
+        # Incremented on every invalidation, a query started before it may have read an outdated user
+        self._generation = 0
+
+    @coroutine
+    def start(self):
+        self._subscription = yield watch.add_callback(
+            "Users",
+            self._on_change,
+            overflow=watch.OVERFLOW_DISCONNECT,
+            on_overflow=self._on_overflow,
+            on_resync=self._on_resync)
+
+    def stop(self):
+        if self._subscription is not None:
+            watch.remove_callback("Users", self._on_change)
+            self._subscription = None
+
+        self.clear()
+
+    def clear(self):
+        self._users.clear()
+        self._usernames.clear()
+
+    def get(self, username):
+        """Returns a Future resolved with the user, or None if it does not exist.
+        """
+
+        entry = self._users.get(username)
+        if entry is not None and entry[1] > time.time():
+            self.hits += 1
+            future = Future()
+            future.set_result(entry[0])
+            return future
+
+        if username in self._pending:
+            self.hits += 1
+            return self._pending[username]
+
+        self.misses += 1
+        future = self._pending[username] = self._load(username)
+        future.add_done_callback(lambda _: self._pending.pop(username, None))
+        return future
+
+    def stats(self):
+        total = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=float(self.hits) / total if total else 0.0,
+            users=len(self._users))
+
+    @coroutine
+    def _load(self, username):
+        generation = self._generation
+        user = yield self.database["Users"].find_one({"username": username})
+
+        if user is not None and generation == self._generation:
+            if len(self._users) >= MAX_CACHED_USERS:
+                self.clear()
+
+            self._users[username] = (user, time.time() + self.ttl)
+            self._usernames[user["_id"]] = username
+
+        raise Return(user)
+
+    def _invalidate(self, document_id):
+        self._generation += 1
+
+        username = self._usernames.pop(document_id, None)
+        if username is not None:
+            self._users.pop(username, None)
+
+    @coroutine
+    def _on_change(self, document):
+        self._invalidate(watch.get_document_id(document))
+
+    @coroutine
+    def _on_resync(self):
+        self._generation += 1
+        self.clear()
+
+    def _on_overflow(self):
+        logging.warning("User cache fell behind the Users oplog, clearing it")
+
+        self._generation += 1
+        self.clear()
+        self._subscription = None
+        IOLoop.current().spawn_callback(self.start)
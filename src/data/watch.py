@@ -15,9 +15,18 @@ limitations under the License.
 """
 
 import logging
+import random
+import time
+from collections import deque
+from datetime import timedelta
 
 import pymongo
-from tornado.gen import coroutine, Return
+from bson.timestamp import Timestamp
+from pymongo.errors import OperationFailure
+from tornado.concurrent import Future
+from tornado.gen import coroutine, sleep, Return
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.locks import Condition
 
 
 WATCHABLE_OPERATIONS = ["i", "u", "d"]
@@ -26,87 +35,780 @@ WATCHABLE_COLLECTIONS = [
     "elastickube.Namespaces",
     "elastickube.Settings",
     "elastickube.Charts",
-    "elastickube.Metrics"
+    "elastickube.Metrics",
+    "elastickube.Metrics5m",
+    "elastickube.Metrics1h"
 ]
 
+OVERFLOW_DROP = "drop"
+OVERFLOW_COALESCE = "coalesce"
+OVERFLOW_DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = [OVERFLOW_DROP, OVERFLOW_COALESCE, OVERFLOW_DISCONNECT]
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_OVERFLOW = OVERFLOW_COALESCE
+DEFAULT_BACKEND = "oplog"
+
+CHANGE_STREAM_OPERATIONS = {"insert": "i", "update": "u", "replace": "u", "delete": "d"}
+
+# ChangeStreamHistoryLost and ChangeStreamFatalError, the resume token is not in the oplog anymore
+RESUME_ERRORS = [280, 286]
+
+CHECKPOINT_COLLECTION = "WatchCheckpoints"
+CHECKPOINT_BATCH_SIZE = 100
+CHECKPOINT_INTERVAL = timedelta(seconds=5)
+
+MIN_BACKOFF = 1
+MAX_BACKOFF = 60
+
+# Seconds replayed when the oplog tail resumes after having no subscribers
+IDLE_RESUME_MARGIN = 5
+
+# Large or sensitive fields left out of the oplog documents when no subscriber of the collection needs them
+PROJECTABLE_FIELDS = {
+    "elastickube.Charts": ["resources"],
+    "elastickube.Users": ["password"]
+}
+
+_backend = None
 _callbacks = dict()
+_settings = dict(queue_size=DEFAULT_QUEUE_SIZE, overflow=DEFAULT_OVERFLOW, backend=DEFAULT_BACKEND)
+
+
+def configure(queue_size=DEFAULT_QUEUE_SIZE, overflow=DEFAULT_OVERFLOW, backend=DEFAULT_BACKEND):
+    if overflow not in OVERFLOW_POLICIES:
+        raise ValueError("Overflow policy %s not in %s" % (overflow, OVERFLOW_POLICIES))
+
+    if backend not in BACKENDS:
+        raise ValueError("Watch backend %s not in %s" % (backend, BACKENDS.keys()))
+
+    _settings.update(queue_size=queue_size, overflow=overflow, backend=backend)
+
+
+def get_document_id(document):
+    if document["op"] == "u":
+        return document.get("o2", {}).get("_id")
+
+    return document["o"].get("_id")
+
+
+class Subscription(object):
+    """Delivers the oplog documents of a collection to a single callback.
+
+    Documents are queued and the callback is called for one document at a time, so a slow subscriber
+    only delays its own queue. Once the queue is full the overflow policy either drops the oldest
+    document, coalesces the pending changes of the same document or disconnects the subscriber.
+    The acknowledgement of a queued document is held until it is delivered or discarded.
+
+    started_at is the cluster time when it subscribed, the earlier changes are already in the snapshot
+    the subscriber reads after subscribing.
+    """
+
+    def __init__(self, namespace, callback, predicate=None, queue_size=None, overflow=None,
+                 on_overflow=None, on_resync=None, criteria=None, projection=None, started_at=None):
+        self.namespace = namespace
+        self.callback = callback
+        self.predicate = predicate
+        self.criteria = criteria
+        self.projection = projection
+        self.queue_size = queue_size or _settings["queue_size"]
+        self.overflow = overflow or _settings["overflow"]
+        self.on_overflow = on_overflow
+        self.on_resync = on_resync
+        self.started_at = started_at
+
+        self.dropped = 0
+        self.closed = False
+
+        self._queue = deque()
+        self._condition = Condition()
+
+        IOLoop.current().spawn_callback(self._deliver)
+
+    def matches(self, document):
+        if self.predicate is None:
+            return True
+
+        try:
+            return self.predicate(document)
+        except Exception:
+            logging.exception("Predicate failed for %s subscription", self.namespace)
+            return False
+
+    def put(self, document, acknowledgement=None):
+        if self.closed:
+            return
+
+        if acknowledgement is not None:
+            acknowledgement.hold()
+
+        if len(self._queue) >= self.queue_size:
+            if self.overflow == OVERFLOW_DISCONNECT:
+                logging.warning("Disconnecting slow subscriber of %s with %d pending documents",
+                                self.namespace, len(self._queue))
+                _release(acknowledgement)
+                _remove_subscription(self)
+                if self.on_overflow is not None:
+                    try:
+                        self.on_overflow()
+                    except Exception:
+                        logging.exception("Failed to disconnect slow subscriber of %s", self.namespace)
+
+                return
+
+            if self.overflow != OVERFLOW_COALESCE or not self._coalesce(document, acknowledgement):
+                _release(self._queue.popleft()[1])
+                self.dropped += 1
+                logging.debug("Dropped document for slow subscriber of %s, %d dropped", self.namespace, self.dropped)
+
+                self._queue.append((document, acknowledgement))
+        else:
+            self._queue.append((document, acknowledgement))
+
+        self._condition.notify()
+
+    def close(self):
+        self.closed = True
+        self._clear()
+        self._condition.notify()
+
+    @coroutine
+    def resync(self):
+        # The pending changes are part of the new snapshot
+        self._clear()
+        if self.on_resync is not None and not self.closed:
+            try:
+                yield self.on_resync()
+            except Exception:
+                logging.exception("Failed to resync subscriber of %s", self.namespace)
+
+    def _clear(self):
+        while self._queue:
+            _release(self._queue.popleft()[1])
+
+    def _coalesce(self, document, acknowledgement):
+        # Only full documents and deletions replace a pending change, partial updates need the previous ones
+        if document["op"] == "u" and any(key.startswith("$") for key in document["o"]):
+            return False
+
+        document_id = get_document_id(document)
+        for index, (pending, pending_acknowledgement) in enumerate(self._queue):
+            if get_document_id(pending) == document_id:
+                if pending["op"] == "i" and document["op"] == "u":
+                    document = dict(document, op="i")
+
+                self._queue[index] = (document, acknowledgement)
+                _release(pending_acknowledgement)
+                self.dropped += 1
+                return True
+
+        return False
+
+    @coroutine
+    def _deliver(self):
+        while not self.closed:
+            if not self._queue:
+                yield self._condition.wait()
+                continue
+
+            document, acknowledgement = self._queue.popleft()
+            try:
+                yield self.callback(document)
+            except Exception as error:
+                logging.debug("Removing callback: %s", error)
+                _remove_subscription(self)
+            finally:
+                _release(acknowledgement)
+
+
+def _remove_subscription(subscription):
+    subscriptions = _callbacks.get(subscription.namespace)
+    if subscriptions is not None and subscription in subscriptions:
+        subscriptions.remove(subscription)
+
+    subscription.close()
+
+    if _backend is not None:
+        _backend.subscriptions_changed(subscription.namespace)
 
 
 @coroutine
-def add_callback(collection, coroutine_callback):
+def add_callback(collection, coroutine_callback, predicate=None, queue_size=None, overflow=None,
+                 on_overflow=None, on_resync=None, criteria=None, projection=None):
+    """Subscribes coroutine_callback to the oplog documents of the collection.
+
+    Filtering with a predicate of the oplog document skips the callback for the changes it does not
+    need. criteria is a query on the document fields that the backend may match in the database, the
+    predicate is still applied. projection excludes the fields the callback does not need, they may
+    be left out of the documents it receives.
+    on_resync is called when changes have been missed and the subscriber must read the collection again.
+    """
+
     logging.info("Adding elastikube.%s callback", collection)
 
     namespace = "elastickube.%s" % collection
-    if namespace in _callbacks:
-        _callbacks[namespace].append(coroutine_callback)
-    else:
-        _callbacks[namespace] = [coroutine_callback]
 
-    raise Return()
+    started_at = None
+    if _backend is not None:
+        started_at = yield _backend.get_cluster_time()
+
+    subscription = Subscription(namespace, coroutine_callback, predicate, queue_size, overflow,
+                                on_overflow, on_resync, criteria, projection, started_at)
+
+    _callbacks.setdefault(namespace, []).append(subscription)
+
+    if _backend is not None:
+        _backend.subscriptions_changed(namespace)
+
+    raise Return(subscription)
 
 
 @coroutine
 def remove_callback(collection, coroutine_callback):
     namespace = "elastickube.%s" % collection
-    if coroutine_callback in _callbacks[namespace]:
-        logging.info("Removing callback from %s namespace.", namespace)
-        _callbacks[namespace].remove(coroutine_callback)
+    if namespace in _callbacks:
+        for subscription in _get_subscriptions(namespace):
+            if subscription.callback == coroutine_callback:
+                logging.info("Removing callback from %s namespace.", namespace)
+                _remove_subscription(subscription)
 
     raise Return()
 
 
+class Acknowledgement(object):
+    """Counts the subscribers that have not delivered a dispatched document yet.
+
+    It is created held by the dispatcher, the checkpoint moves past the document once it is released.
+    """
+
+    def __init__(self, checkpoint, position):
+        self.checkpoint = checkpoint
+        self.position = position
+        self.holders = 1
+
+    def hold(self):
+        self.holders += 1
+
+    def release(self):
+        self.holders -= 1
+        if self.holders == 0:
+            self.checkpoint.acknowledged()
+
+
+def _release(acknowledgement):
+    if acknowledgement is not None:
+        acknowledgement.release()
+
+
+class Checkpoint(object):
+    """Persists the position of the last delivered document, an oplog ts or a change stream resume token.
+
+    position is the last dispatched document, where the backend resumes while the process runs. The
+    saved position only moves past the documents every subscriber has delivered or discarded, so the
+    documents still queued are dispatched again after a restart.
+
+    Writes are batched, the position is saved every CHECKPOINT_BATCH_SIZE documents and
+    periodically while there are unsaved documents.
+    """
+
+    def __init__(self, client, name):
+        self.name = name
+        self.collection = client["elastickube"][CHECKPOINT_COLLECTION]
+
+        self.position = None
+        self.acknowledged_position = None
+        self._acknowledgements = deque()
+        self._pending = 0
+        self._flushing = False
+        self._periodic_flush = PeriodicCallback(
+            self.flush, int(CHECKPOINT_INTERVAL.total_seconds() * 1000))
+
+    @coroutine
+    def load(self):
+        document = yield self.collection.find_one({"_id": self.name})
+
+        # Checkpoints saved before change streams were supported only have the oplog ts
+        self.position = document.get("position", document.get("ts")) if document else None
+        self.acknowledged_position = self.position
+        if not self._periodic_flush.is_running():
+            self._periodic_flush.start()
+
+        raise Return(self.position)
+
+    def track(self, position):
+        """Returns the held acknowledgement of the document at position.
+        """
+
+        self.position = position
+
+        acknowledgement = Acknowledgement(self, position)
+        self._acknowledgements.append(acknowledgement)
+        return acknowledgement
+
+    def update(self, position):
+        self.track(position).release()
+
+    def acknowledged(self):
+        while self._acknowledgements and self._acknowledgements[0].holders == 0:
+            self.acknowledged_position = self._acknowledgements.popleft().position
+            self._pending += 1
+
+        if self._pending >= CHECKPOINT_BATCH_SIZE:
+            IOLoop.current().spawn_callback(self.flush)
+
+    @coroutine
+    def flush(self):
+        if not self._pending or self._flushing:
+            raise Return()
+
+        self._flushing = True
+        pending, self._pending = self._pending, 0
+        try:
+            yield self.collection.update_one(
+                {"_id": self.name}, {"$set": {"position": self.acknowledged_position}}, upsert=True)
+        except Exception:
+            self._pending += pending
+            logging.exception("Failed to save the watch checkpoint %s", self.name)
+        finally:
+            self._flushing = False
+
+    def stop(self):
+        self._periodic_flush.stop()
+
+
 @coroutine
-def start_monitor(client):
-    logging.info("Initializing watcher...")
+def start_monitor(client, name="api"):
+    """Watches the collections forever with the configured backend, resuming from the last checkpoint.
+    """
 
-    try:
-        oplog = client["local"]["oplog.rs"]
+    global _backend
 
-        cursor = oplog.find().sort('ts', pymongo.DESCENDING).limit(-1)
-        if (yield cursor.fetch_next):
-            document = cursor.next_object()
+    logging.info("Initializing %s watcher...", _settings["backend"])
+
+    _backend = BACKENDS[_settings["backend"]](client, name)
+    yield _backend.run()
+
+
+class OplogBackend(object):
+    """Tails the replica set oplog, filtered by the watchable collections that have subscribers.
+
+    The tail is restarted with backoff on errors and resumed from the checkpointed ts. The cursor is
+    recreated when the subscribed collections change and closed while there are no subscribers. A
+    collection that was not tailed is read from the time its subscribers started, not from the last
+    entry of the other collections.
+    """
+
+    def __init__(self, client, name):
+        self.client = client
+        self.checkpoint = Checkpoint(client, name)
+
+        self._filter = None
+        self._filter_dirty = True
+        self._subscriptions_changed = Condition()
+
+    @coroutine
+    def run(self):
+        retries = 0
+        while True:
+            started_at = time.time()
+            try:
+                last_timestamp = self.checkpoint.position
+                if last_timestamp is None:
+                    last_timestamp = yield self.checkpoint.load()
+
+                yield self._tail(self.client["local"]["oplog.rs"], last_timestamp)
+            except Exception as e:
+                logging.exception(e)
 
-            last_timestamp = document['ts']
-            logging.info('Watching from timestamp: %s', last_timestamp.as_datetime())
+            # Only back off while the tail keeps failing
+            if time.time() - started_at > MAX_BACKOFF:
+                retries = 0
+
+            delay = _get_backoff(retries)
+            retries += 1
+
+            logging.warning("Oplog tail stopped, restarting in %.2f seconds", delay)
+            yield sleep(delay)
+
+    def subscriptions_changed(self, namespace):
+        self._filter_dirty = True
+        self._subscriptions_changed.notify_all()
+
+    @coroutine
+    def get_cluster_time(self):
+        try:
+            latest_timestamp = yield self._get_latest_timestamp(self.client["local"]["oplog.rs"])
+        except Exception:
+            logging.exception("Cannot read the latest oplog timestamp")
+            latest_timestamp = None
+
+        raise Return(latest_timestamp)
+
+    @staticmethod
+    def build_query(namespaces, last_timestamp):
+        """Returns the oplog query of the namespaces, every namespace is read after its earliest subscriber started.
+        """
+
+        starts = dict()
+        for namespace in namespaces:
+            started_at = [subscription.started_at for subscription in _get_subscriptions(namespace)]
+
+            # The namespaces already tailed, or with subscribers from before the tail started, continue the tail
+            start = last_timestamp
+            if started_at and None not in started_at:
+                start = max(start, min(started_at))
+
+            starts.setdefault(start, []).append(namespace)
+
+        query = {
+            'ts': {'$gt': min(starts)},
+            'op': {'$in': WATCHABLE_OPERATIONS}
+        }
+
+        if len(starts) == 1:
+            query['ns'] = {'$in': namespaces}
         else:
-            last_timestamp = None
+            query['$or'] = [{'ns': {'$in': starts[timestamp]}, 'ts': {'$gt': timestamp}}
+                            for timestamp in sorted(starts)]
 
+        return query
+
+    @staticmethod
+    def get_filter():
+        """Returns the subscribed namespaces and the projection of the fields none of their subscribers need.
+        """
+
+        namespaces = sorted(namespace for namespace in WATCHABLE_COLLECTIONS if _get_subscriptions(namespace))
+
+        excluded = set()
+        needed = set()
+        for namespace in namespaces:
+            subscriptions = _get_subscriptions(namespace)
+            for field in PROJECTABLE_FIELDS.get(namespace, []):
+                if all(subscription.projection and subscription.projection.get(field) == 0
+                       for subscription in subscriptions):
+                    excluded.add(field)
+                else:
+                    needed.add(field)
+
+        projection = dict(("o.%s" % field, 0) for field in excluded - needed)
+        return namespaces, projection or None
+
+    @coroutine
+    def _tail(self, oplog, last_timestamp):
+        latest_timestamp = yield self._get_latest_timestamp(oplog)
+        if latest_timestamp is None:
+            raise Return()
+
+        if last_timestamp is None:
+            last_timestamp = latest_timestamp
+        elif (yield self._has_gap(oplog, last_timestamp)):
+            logging.warning("Checkpoint %s is not in the oplog anymore, resyncing watchers",
+                            last_timestamp.as_datetime())
+
+            last_timestamp = latest_timestamp
+            _resync_subscriptions()
+
+        self.checkpoint.update(last_timestamp)
+        logging.info('Watching from timestamp: %s', last_timestamp.as_datetime())
+
+        cursor = None
+        current_filter = None
         while True:
-            if not cursor.alive:
-                cursor = oplog.find({
-                    'ts': {'$gt': last_timestamp},
-                    'op': {'$in': WATCHABLE_OPERATIONS},
-                    'ns': {'$in': WATCHABLE_COLLECTIONS}
-                }, cursor_type=pymongo.CursorType.TAILABLE_AWAIT)
+            # Only rebuilt when callbacks are added or removed, not for every oplog entry
+            if self._filter_dirty:
+                self._filter = self.get_filter()
+                self._filter_dirty = False
+
+            oplog_filter = self._filter
+            if not oplog_filter[0]:
+                if cursor is not None:
+                    logging.debug('No subscribers, closing tailable cursor.')
+                    cursor.close()
+                    cursor = None
+
+                yield self._subscriptions_changed.wait()
+
+                # Changes done while nobody was subscribed are already in the subscribers snapshots
+                latest_timestamp = yield self._get_latest_timestamp(oplog)
+                if latest_timestamp is not None:
+                    margin = Timestamp(max(latest_timestamp.time - IDLE_RESUME_MARGIN, 0), 0)
+                    last_timestamp = max(last_timestamp, margin)
+
+                continue
+
+            if cursor is None or not cursor.alive or oplog_filter != current_filter:
+                if cursor is not None and not cursor.alive and (yield self._has_gap(oplog, last_timestamp)):
+                    logging.warning("Oplog rolled over %s, resyncing watchers", last_timestamp.as_datetime())
+                    _resync_subscriptions()
+
+                if cursor is not None:
+                    cursor.close()
+
+                current_filter = oplog_filter
+                namespaces, projection = current_filter
+                cursor = oplog.find(self.build_query(namespaces, last_timestamp), projection,
+                                    cursor_type=pymongo.CursorType.TAILABLE_AWAIT)
 
                 cursor.add_option(8)
-                logging.debug('Tailable cursor recreated.')
+                logging.debug('Tailable cursor recreated for %s.', namespaces)
 
             if (yield cursor.fetch_next):
                 document = cursor.next_object()
                 last_timestamp = document['ts']
 
-                yield _dispatch_documents(document)
+                # Only queued here, the subscribers deliver at their own pace
+                acknowledgement = self.checkpoint.track(last_timestamp)
+                _dispatch_documents(document, acknowledgement)
+                acknowledgement.release()
+
+    @staticmethod
+    @coroutine
+    def _get_latest_timestamp(oplog):
+        cursor = oplog.find().sort('ts', pymongo.DESCENDING).limit(-1)
+        if not (yield cursor.fetch_next):
+            raise Return(None)
 
-    except Exception as e:
-        logging.exception(e)
+        raise Return(cursor.next_object()['ts'])
 
+    @staticmethod
+    @coroutine
+    def _has_gap(oplog, timestamp):
+        cursor = oplog.find().sort('$natural', pymongo.ASCENDING).limit(-1)
+        if not (yield cursor.fetch_next):
+            raise Return(False)
 
-@coroutine
-def _dispatch_documents(document):
-    namespace = document['ns']
+        raise Return(cursor.next_object()['ts'] > timestamp)
 
-    if namespace in _callbacks:
+
+class ChangeStreamBackend(object):
+    """Watches each collection with subscribers through a MongoDB change stream.
+
+    Updates carry the whole document (fullDocument updateLookup) and the subscription criteria are
+    matched by the server. Changes are translated to oplog documents so the callbacks do not depend
+    on the backend. Every stream resumes from its own checkpointed resume token.
+    """
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+        self._streams = dict()
+        self._checkpoints = dict()
+
+    @coroutine
+    def run(self):
+        for namespace in _callbacks.keys():
+            self.subscriptions_changed(namespace)
+
+        # Streams are started and stopped as subscriptions change
+        yield Condition().wait()
+
+    @coroutine
+    def get_cluster_time(self):
+        try:
+            response = yield self.client.admin.command("ping")
+        except Exception:
+            logging.exception("Cannot read the cluster time")
+            raise Return(None)
+
+        raise Return(response.get("operationTime"))
+
+    def subscriptions_changed(self, namespace):
+        if namespace not in WATCHABLE_COLLECTIONS:
+            return
+
+        pipeline = self.build_pipeline(_get_subscriptions(namespace))
+        stream = self._streams.get(namespace)
+
+        previous = None
+        if stream is not None and (pipeline is None or stream.pipeline != pipeline):
+            stream.stop()
+            del self._streams[namespace]
+            previous, stream = stream, None
+
+        if stream is None and pipeline is not None:
+            database, collection = namespace.split(".", 1)
+
+            # Kept between streams so a new pipeline resumes from the last change
+            if namespace not in self._checkpoints:
+                self._checkpoints[namespace] = Checkpoint(self.client, "%s.%s" % (self.name, collection))
+
+            stream = _CollectionStream(self.client[database][collection], namespace, pipeline,
+                                       self._checkpoints[namespace], previous)
+
+            self._streams[namespace] = stream
+            IOLoop.current().spawn_callback(stream.run)
+
+    @staticmethod
+    def build_pipeline(subscriptions):
+        """Returns the $match stage for the subscriptions or None when there are not subscriptions.
+
+        The stream resumes from the last change of the previous pipeline, so the changes of every
+        subscriber are only matched after the cluster time it subscribed at.
+        """
+
+        if not subscriptions:
+            return None
+
+        clauses = []
+        for subscription in subscriptions:
+            clause = dict()
+            if subscription.criteria and not any(key.startswith("$") for key in subscription.criteria):
+                clause = dict(("fullDocument.%s" % key, value) for key, value in subscription.criteria.iteritems())
+
+            if subscription.started_at is not None:
+                clause["clusterTime"] = {"$gt": subscription.started_at}
+
+            if not clause:
+                # A subscriber of the whole collection since the stream started needs every change
+                clauses = []
+                break
+
+            clauses.append(clause)
+
+        match = {"operationType": {"$in": CHANGE_STREAM_OPERATIONS.keys()}}
+        if clauses:
+            # Deleted documents are only known by their key
+            match["$or"] = [{"operationType": "delete"}] + clauses
+
+        return [{"$match": match}]
+
+
+class _CollectionStream(object):
+    """Change stream of a collection, restarted with backoff and resumed from the checkpointed token.
+
+    A stream replacing a previous one of the same collection only starts once the previous one has
+    stopped, so both never dispatch changes or update the checkpoint at the same time.
+    """
+
+    def __init__(self, collection, namespace, pipeline, checkpoint, previous=None):
+        self.collection = collection
+        self.namespace = namespace
+        self.pipeline = pipeline
+        self.checkpoint = checkpoint
+        self.previous = previous
+        self.stopped = Future()
+
+        self._stream = None
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+        IOLoop.current().spawn_callback(self.checkpoint.flush)
+
+        if self._stream is not None:
+            self._stream.close()
+
+    @coroutine
+    def run(self):
+        try:
+            if self.previous is not None:
+                yield self.previous.stopped
+                self.previous = None
+
+            yield self._run()
+        finally:
+            self.stopped.set_result(None)
+
+    @coroutine
+    def _run(self):
+        retries = 0
+        while not self._stopped:
+            started_at = time.time()
+            try:
+                token = self.checkpoint.position
+                if token is None:
+                    token = yield self.checkpoint.load()
+
+                yield self._watch(token)
+            except OperationFailure as error:
+                if error.code not in RESUME_ERRORS:
+                    logging.exception(error)
+                else:
+                    logging.warning("Resume token lost for %s, resyncing watchers", self.namespace)
+
+                    self.checkpoint.position = None
+                    _resync_subscriptions(self.namespace)
+            except Exception as error:
+                if self._stopped:
+                    break
+
+                logging.exception(error)
+
+            if time.time() - started_at > MAX_BACKOFF:
+                retries = 0
+
+            delay = _get_backoff(retries)
+            retries += 1
+
+            if not self._stopped:
+                logging.warning("Change stream for %s stopped, restarting in %.2f seconds", self.namespace, delay)
+                yield sleep(delay)
+
+    @coroutine
+    def _watch(self, token):
+        logging.info("Watching %s changes", self.namespace)
+
+        self._stream = self.collection.watch(self.pipeline, full_document="updateLookup", resume_after=token)
         try:
-            results = yield dict(
-                [(callback, callback(document)) for callback in _callbacks[namespace]]
-            )
+            while not self._stopped:
+                change = yield self._stream.next()
+                if self._stopped:
+                    break
+
+                acknowledgement = self.checkpoint.track(change["_id"])
+
+                document = self.to_oplog(self.namespace, change)
+                if document is not None:
+                    _dispatch_documents(document, acknowledgement)
+
+                acknowledgement.release()
+        finally:
+            self._stream.close()
+            self._stream = None
+
+    @staticmethod
+    def to_oplog(namespace, change):
+        op = CHANGE_STREAM_OPERATIONS.get(change["operationType"])
+        if op is None:
+            return None
+
+        document_id = change["documentKey"]["_id"]
+        if op == "d" or change.get("fullDocument") is None:
+            # An updated document that no longer exists is notified as deleted
+            return dict(ns=namespace, op="d", o=dict(_id=document_id))
 
-            # Remove all failed callbacks
-            for callback, result in results.iteritems():
-                if result and result.exception():
-                    logging.debug("Removing callback: %s", result.exception().message)
-                    yield remove_callback(namespace, callback)
+        document = dict(ns=namespace, op=op, o=change["fullDocument"])
+        if op == "u":
+            document["o2"] = dict(_id=document_id)
 
+        return document
+
+
+def _get_backoff(retries):
+    delay = min(MAX_BACKOFF, MIN_BACKOFF * 2 ** retries)
+    return random.uniform(delay / 2.0, delay)
+
+
+def _get_subscriptions(namespace):
+    return list(_callbacks.get(namespace, []))
+
+
+def _resync_subscriptions(namespace=None):
+    namespaces = [namespace] if namespace else _callbacks.keys()
+    for namespace in namespaces:
+        for subscription in _get_subscriptions(namespace):
+            IOLoop.current().spawn_callback(subscription.resync)
+
+
+BACKENDS = dict(oplog=OplogBackend, changestream=ChangeStreamBackend)
+
+
+def _dispatch_documents(document, acknowledgement=None):
+    for subscription in _get_subscriptions(document['ns']):
+        try:
+            if subscription.matches(document):
+                subscription.put(document, acknowledgement)
         except Exception as e:
             logging.exception(e)
@@ -0,0 +1,71 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest2
+
+from api.v1.batch import EventBatch
+
+
+def event(operation, uid, **body):
+    return dict(action="instances", operation=operation, status_code=200,
+                body=dict(kind="Pod", metadata=dict(uid=uid), **body))
+
+
+class TestEventBatch(unittest2.TestCase):
+
+    def test_collapse(self):
+        batch = EventBatch()
+        batch.add(event("updated", "a", phase="Pending"))
+        batch.add(event("updated", "b"))
+        batch.add(event("updated", "a", phase="Running"))
+
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch.collapsed, 1)
+
+        message = batch.pop_message()
+        self.assertEqual(message["operation"], "batch")
+        self.assertEqual([item["body"]["metadata"]["uid"] for item in message["body"]], ["a", "b"])
+        self.assertEqual(message["body"][0]["body"]["phase"], "Running")
+        self.assertEqual(len(batch), 0)
+
+    def test_created(self):
+        batch = EventBatch()
+        batch.add(event("created", "a"))
+        batch.add(event("updated", "a", phase="Running"))
+        self.assertEqual(batch.events, [event("created", "a", phase="Running")])
+
+        batch.add(event("updated", "b"))
+        batch.add(event("deleted", "a"))
+        self.assertEqual(batch.collapsed, 2)
+        self.assertEqual(batch.pop_message()["body"], [event("deleted", "a"), event("updated", "b")])
+
+    def test_deleted(self):
+        batch = EventBatch()
+        batch.add(event("updated", "a", phase="Running"))
+        batch.add(event("deleted", "a"))
+        self.assertEqual(batch.events, [event("deleted", "a")])
+
+    def test_barrier(self):
+        batch = EventBatch()
+        batch.add(event("updated", "a"))
+        batch.add(dict(action="instances", operation="watched", status_code=200, body=[]))
+        batch.add(event("updated", "a"))
+
+        self.assertEqual([item["operation"] for item in batch.events], ["updated", "watched", "updated"])
+
+
+if __name__ == "__main__":
+    unittest2.main()
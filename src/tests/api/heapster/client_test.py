@@ -0,0 +1,66 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import json
+
+import mock
+import unittest2
+from tornado import testing
+from tornado.gen import coroutine, Return
+
+from api.heapster.client import HeapsterClient, MetricQuery
+
+CONTAINER_VALUES = dict(first=1, second=2)
+
+
+class TestHeapsterClient(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestHeapsterClient, self).setUp()
+        self.heapster = HeapsterClient("http://heapster/api/v1/model")
+
+    @testing.gen_test
+    def test_metrics_batch(self):
+        @coroutine
+        def fetch(url, **_kwargs):
+            if "/containers/" in url:
+                container_name = url.split("/metrics/")[0].rsplit("/", 1)[1]
+                body = dict(metrics=[dict(value=CONTAINER_VALUES[container_name])])
+                raise Return(mock.Mock(error=None, body=json.dumps(body)))
+            elif "missing" in url:
+                raise Return(mock.Mock(error=mock.Mock(code=404), effective_url=url))
+            else:
+                raise Return(mock.Mock(error=None, body=json.dumps(dict(metrics=[dict(value=3)]))))
+
+        self.heapster._client = mock.Mock(fetch=mock.Mock(side_effect=fetch))
+
+        first = MetricQuery("containers", "cpu/usage_rate", name="first", namespace="default", pod_name="pod")
+        second = MetricQuery("containers", "cpu/usage_rate", name="second", namespace="default", pod_name="pod")
+        namespace = MetricQuery("namespaces", "cpu/usage_rate", name="default")
+        missing = MetricQuery("namespaces", "cpu/usage_rate", name="missing")
+
+        results = yield self.heapster.metrics_batch([first, second, namespace, missing, namespace])
+
+        self.assertEqual(self.heapster._client.fetch.call_count, 4)
+        self.assertEqual(results[first]["metrics"][0]["value"], 1)
+        self.assertEqual(results[second]["metrics"][0]["value"], 2)
+        self.assertEqual(results[namespace]["metrics"][0]["value"], 3)
+        self.assertIsNone(results[missing])
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -0,0 +1,107 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest2
+from tornado import testing
+from tornado.concurrent import Future
+from tornado.gen import coroutine, Return
+
+from api.kube.informer import InformerRegistry
+
+
+def build_pod(name, uid, resource_version):
+    return dict(kind="Pod", metadata=dict(name=name, uid=uid, resourceVersion=resource_version))
+
+
+class FakeResource(object):
+
+    def __init__(self):
+        self.list_calls = 0
+        self.watchers = []
+
+    @coroutine
+    def get(self, **_kwargs):
+        self.list_calls += 1
+        raise Return(dict(
+            kind="PodList",
+            metadata=dict(resourceVersion="1"),
+            items=[dict(metadata=dict(name="pod-a", uid="a", resourceVersion="1"))]
+        ))
+
+    def watch(self, on_data=None, **kwargs):
+        watcher = Future()
+        watcher.on_data = on_data
+        watcher.params = kwargs
+        watcher.cancel = lambda: watcher.set_result(None)
+        self.watchers.append(watcher)
+        return watcher
+
+
+class TestInformer(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestInformer, self).setUp()
+
+        self.resource = FakeResource()
+        self.registry = InformerRegistry(dict(pods=self.resource))
+
+    @testing.gen_test
+    def test_shared_list_and_watch(self):
+        first = self.registry.acquire("pods", namespace="default")
+        second = self.registry.acquire("pods", namespace="default", resourceVersion="10")
+        self.assertIs(first, second)
+
+        yield [first.start(), second.start()]
+        self.assertEqual(self.resource.list_calls, 1)
+        self.assertEqual(len(self.resource.watchers), 1)
+        self.assertEqual(self.resource.watchers[0].params["resourceVersion"], "1")
+
+        snapshot = first.snapshot()
+        self.assertEqual(snapshot["kind"], "PodList")
+        self.assertEqual(snapshot["items"][0]["kind"], "Pod")
+
+    @testing.gen_test
+    def test_events_update_store_and_handlers(self):
+        informer = self.registry.acquire("pods", namespace="default")
+        received = []
+        informer.add_handler(received.append)
+        yield informer.start()
+
+        on_data = self.resource.watchers[0].on_data
+        on_data(dict(type="ADDED", object=build_pod("pod-b", "b", "2")))
+        on_data(dict(type="DELETED", object=build_pod("pod-a", "a", "3")))
+
+        self.assertEqual(len(received), 2)
+        self.assertEqual(informer.resource_version, "3")
+        self.assertIsNone(informer.get("pod-a"))
+        self.assertEqual(informer.get("pod-b")["metadata"]["uid"], "b")
+
+    @testing.gen_test
+    def test_release_stops_last_reference(self):
+        first = self.registry.acquire("pods", namespace="default")
+        self.registry.acquire("pods", namespace="default")
+        yield first.start()
+
+        self.registry.release(first)
+        self.assertFalse(self.resource.watchers[0].done())
+
+        self.registry.release(first)
+        self.assertTrue(self.resource.watchers[0].done())
+        self.assertIsNot(self.registry.acquire("pods", namespace="default"), first)
+
+
+if __name__ == "__main__":
+    unittest2.main()
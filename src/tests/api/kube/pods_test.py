@@ -0,0 +1,83 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import json
+
+import mock
+import unittest2
+from tornado import testing
+from tornado.gen import coroutine, moment, Return
+
+from api.heapster.client import HeapsterClient
+from api.kube.pods import Pods
+
+
+class FakeMetric(object):
+
+    def __init__(self, values):
+        self.values = values
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @coroutine
+    def metric(self, metric_name, name=None, **_kwargs):
+        self.calls.append((metric_name, name))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        yield moment
+        self.in_flight -= 1
+
+        value = self.values[metric_name]
+        raise Return(dict(latestTimestamp="t1", metrics=[dict(timestamp="t1", value=value)]))
+
+
+class TestPodsMetrics(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_parallel_metrics(self):
+        containers = FakeMetric({"cpu/limit": 0, "memory/limit": 1000, "cpu/usage_rate": 512, "memory/usage": 500})
+        nodes = FakeMetric({"cpu/request": 0, "memory/request": 0})
+
+        heapster = HeapsterClient("http://heapster/api/v1/model")
+        heapster.metrics.update(containers=containers, nodes=nodes, pods=mock.Mock())
+        heapster.metrics["pods"].get.return_value = self._resolve(["pod"])
+        heapster.is_heapster_available = mock.Mock(return_value=self._resolve(True))
+
+        api = mock.Mock()
+        api.get.return_value = self._resolve(dict(spec=dict(
+            nodeName="node",
+            containers=[dict(name="container-%d" % index) for index in range(5)])))
+        api.http_client.get.return_value = self._resolve(mock.Mock(
+            body=json.dumps(dict(status=dict(capacity=dict(cpu="1", memory="1000Ki"))))))
+
+        metrics = yield Pods(api, "/api/v1", "pods").metrics(heapster, "default", "pod")
+
+        self.assertEqual(len(metrics["items"]), 5)
+        self.assertEqual(metrics["items"][0], dict(name="container-0", cpuUsage=50, memUsage=50))
+        self.assertEqual(len(containers.calls), 20)
+        self.assertTrue(containers.max_in_flight > 1)
+        self.assertEqual(api.http_client.get.call_count, 1)
+
+    @staticmethod
+    @coroutine
+    def _resolve(value):
+        raise Return(value)
+
+
+if __name__ == "__main__":
+    unittest2.main()
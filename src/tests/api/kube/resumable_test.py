@@ -0,0 +1,103 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import unittest2
+from tornado import testing
+from tornado.concurrent import Future
+from tornado.gen import coroutine, sleep, Return
+from tornado.httpclient import HTTPError
+
+from api.kube.exceptions import ResourceNotFoundException
+from api.kube.resumable import ResumableWatch
+
+
+def build_namespace(name, resource_version):
+    return dict(metadata=dict(name=name, uid=name, resourceVersion=resource_version))
+
+
+class FakeResource(object):
+
+    def __init__(self, items):
+        self.items = items
+        self.watchers = []
+
+    @coroutine
+    def get(self, **kwargs):
+        if "name" in kwargs and not any(item["metadata"]["name"] == kwargs["name"] for item in self.items):
+            raise ResourceNotFoundException("%s not found" % kwargs["name"])
+
+        raise Return(dict(kind="NamespaceList", metadata=dict(resourceVersion="10"), items=list(self.items)))
+
+    def watch(self, on_data=None, **kwargs):
+        watcher = Future()
+        watcher.on_data = on_data
+        watcher.params = kwargs
+        watcher.cancel = lambda: watcher.done() or watcher.set_result(None)
+        self.watchers.append(watcher)
+        return watcher
+
+
+class TestResumableWatch(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestResumableWatch, self).setUp()
+
+        self.events = []
+        self.resource = FakeResource([build_namespace("default", "1"), build_namespace("old", "2")])
+        self.watch = ResumableWatch(self.resource, self.events.append, min_backoff=0.01, max_backoff=0.05)
+
+    def tearDown(self):
+        self.watch.stop()
+        super(TestResumableWatch, self).tearDown()
+
+    @testing.gen_test
+    def test_resume_from_last_resource_version(self):
+        yield self.watch.start()
+        self.resource.watchers[0].on_data(dict(type="MODIFIED", object=build_namespace("default", "11")))
+        self.resource.watchers[0].set_exception(HTTPError(599))
+
+        yield sleep(0.1)
+        self.assertEqual(len(self.resource.watchers), 2)
+        self.assertEqual(self.resource.watchers[1].params["resourceVersion"], "11")
+        self.assertEqual([event["type"] for event in self.events], ["MODIFIED"])
+
+    @testing.gen_test
+    def test_relist_on_expired_resource_version(self):
+        yield self.watch.start()
+
+        self.resource.items = [build_namespace("default", "12"), build_namespace("new", "13")]
+        self.resource.watchers[0].on_data(dict(type="ERROR", object=dict(kind="Status", code=410)))
+        self.resource.watchers[0].set_result(None)
+
+        yield sleep(0.1)
+        events = sorted((event["type"], event["object"]["metadata"]["name"]) for event in self.events)
+        self.assertEqual(events, [("ADDED", "new"), ("DELETED", "old"), ("MODIFIED", "default")])
+        self.assertEqual(self.resource.watchers[-1].params["resourceVersion"], "10")
+        self.assertEqual(sorted(self.watch.objects.keys()), ["default", "new"])
+
+    @testing.gen_test
+    def test_missing_named_object(self):
+        watch = ResumableWatch(self.resource, self.events.append, name="missing")
+        yield watch.start()
+
+        self.assertNotIn("resourceVersion", self.resource.watchers[0].params)
+        self.assertEqual(self.resource.watchers[0].params["name"], "missing")
+        watch.stop()
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -0,0 +1,63 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import json
+
+import unittest2
+
+from api.kube.stream import JSONStreamDecoder
+
+
+class TestJSONStreamDecoder(unittest2.TestCase):
+
+    def setUp(self):
+        self.documents = []
+        self.decoder = JSONStreamDecoder(self.documents.append)
+
+    def test_split_object(self):
+        for chunk in ['{"type": "ADD', 'ED", "object": {"na', 'me": "pod"}}\n{"ty']:
+            self.decoder.feed(chunk)
+
+        self.assertEqual(self.documents, [{"type": "ADDED", "object": {"name": "pod"}}])
+
+        self.decoder.feed('pe": "DELETED"}\n')
+        self.assertEqual(self.documents[-1], {"type": "DELETED"})
+
+    def test_multiple_objects_per_chunk(self):
+        self.decoder.feed('{"a": 1}\n\n{"b": 2}\n{"c": 3}\n')
+
+        self.assertEqual(self.documents, [{"a": 1}, {"b": 2}, {"c": 3}])
+
+    def test_raw_object(self):
+        self.decoder.feed('{"type":"MODIFIED","object":{"kind":"Pod","metadata":{"name":"pod"}}}\n')
+
+        document = self.documents[0]
+        self.assertEqual(document["raw_object"], '{"kind":"Pod","metadata":{"name":"pod"}}')
+        self.assertEqual(json.loads(document["raw_object"]), document["object"])
+
+    def test_stats(self):
+        data = '{"a": 1}\n{"b": 2}\n'
+        self.decoder.feed(data)
+
+        stats = self.decoder.stats()
+        self.assertEqual(stats["bytes"], len(data))
+        self.assertEqual(stats["events"], 2)
+        self.assertTrue(stats["decode_time"] >= 0)
+
+
+if __name__ == "__main__":
+    unittest2.main()
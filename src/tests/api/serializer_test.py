@@ -0,0 +1,62 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+from datetime import datetime
+
+import unittest2
+from bson import json_util
+from bson.objectid import ObjectId
+
+from api.v1.batch import EventBatch
+from api.v1.serializer import RawJSON, dumps
+
+
+class TestSerializer(unittest2.TestCase):
+
+    def test_bson_types(self):
+        message = dict(
+            action="users",
+            status_code=200,
+            body=[dict(_id=ObjectId(), created=datetime(2016, 5, 1, 10, 30), tags=("a", "b"), name=u"é")])
+
+        self.assertEqual(json.loads(dumps(message)), json.loads(json_util.dumps(message)))
+        self.assertEqual(dumps("Invalid message"), '"Invalid message"')
+
+    def test_raw_body(self):
+        raw = RawJSON('{"kind":"Pod","metadata":{"uid":"a"}}', dict(kind="Pod", metadata=dict(uid="a")))
+        message = dict(action="instances", operation="updated", body=raw)
+
+        self.assertEqual(json.loads(dumps(message)), dict(action="instances", operation="updated",
+                                                          body=dict(kind="Pod", metadata=dict(uid="a"))))
+        self.assertEqual(json.loads(dumps(dict(body=raw))), dict(body=raw.value))
+
+    def test_raw_batch(self):
+        batch = EventBatch()
+        for version in [1, 2]:
+            raw = RawJSON('{"metadata":{"uid":"a"},"v":%d}' % version, dict(metadata=dict(uid="a"), v=version))
+            batch.add(dict(action="instances", operation="updated", body=raw))
+
+        batch.add(dict(action="instances", operation="updated", body=dict(metadata=dict(uid="b"))))
+
+        message = json.loads(dumps(batch.pop_message()))
+        self.assertEqual(message["operation"], "batch")
+        self.assertEqual([event["body"] for event in message["body"]],
+                         [dict(metadata=dict(uid="a"), v=2), dict(metadata=dict(uid="b"))])
+
+
+if __name__ == "__main__":
+    unittest2.main()
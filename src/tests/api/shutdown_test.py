@@ -0,0 +1,74 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import signal
+from functools import partial
+
+import mock
+import unittest2
+from tornado.gen import coroutine
+from tornado.ioloop import IOLoop
+
+from api.heapster.client import HeapsterClient
+from api.kube.client import KubeClient
+from api.server import stop_server
+from api.v1 import shutdown
+
+
+class TestShutdown(unittest2.TestCase):
+
+    def test_close_clients(self):
+        kube = KubeClient("localhost")
+        heapster = HeapsterClient("http://heapster/api/v1/model")
+
+        kube_client = kube.http_client.client
+        heapster_client = heapster.client
+
+        election = mock.Mock(stop=mock.Mock(side_effect=coroutine(lambda: None)))
+        settings = dict(kube=kube, heapster=heapster, membership=mock.Mock(), users=mock.Mock(), election=election)
+
+        with mock.patch.object(kube_client, "close", wraps=kube_client.close) as kube_close, \
+                mock.patch.object(heapster_client, "close", wraps=heapster_client.close) as heapster_close:
+            shutdown(settings)
+
+        kube_close.assert_called_once_with()
+        heapster_close.assert_called_once_with()
+        self.assertIsNone(kube.http_client._client)
+        self.assertIsNone(heapster._client)
+
+        settings["membership"].stop.assert_called_once_with()
+        settings["users"].stop.assert_called_once_with()
+        election.stop.assert_called_once_with()
+
+    def test_stop_on_signal(self):
+        settings = dict()
+        io_loop = IOLoop.current()
+
+        previous = signal.signal(signal.SIGTERM, partial(stop_server, settings))
+        try:
+            timeout = io_loop.call_later(5, io_loop.stop)
+            io_loop.add_callback(os.kill, os.getpid(), signal.SIGTERM)
+            io_loop.start()
+            io_loop.remove_timeout(timeout)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+
+        self.assertTrue(settings["stopping"])
+
+
+if __name__ == "__main__":
+    unittest2.main()
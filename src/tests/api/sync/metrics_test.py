@@ -0,0 +1,70 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import random
+
+import unittest2
+
+from api.v1.sync.metrics import SyncMetrics
+
+
+def compute_usages_naive(metrics, cluster_cpu_capacity, cluster_mem_capacity):
+    usages = []
+    for metric in metrics:
+        for timestamp, results in metric["results"]["timestamps"].iteritems():
+            others_ns_cpu = 0
+            others_ns_mem = 0
+            for other in metrics:
+                if other["name"] != metric["name"] and timestamp in other["results"]["timestamps"]:
+                    other_results = other["results"]["timestamps"][timestamp]
+                    others_ns_cpu += max(other_results["cpu_request"], other_results["cpu_usage"])
+                    others_ns_mem += max(other_results["mem_request"], other_results["mem_usage"])
+
+            usages.append((metric["name"], metric["uid"], timestamp, dict(
+                cpu_ratio=float(results["cpu_usage"]) / (cluster_cpu_capacity - others_ns_cpu) * 100,
+                mem_ratio=float(results["mem_usage"]) / (cluster_mem_capacity - others_ns_mem) * 100
+            )))
+
+    return usages
+
+
+class TestSyncMetrics(unittest2.TestCase):
+
+    def test_compute_usages(self):
+        metrics = []
+        for index in range(20):
+            timestamps = dict()
+            for timestamp in random.sample(range(30), 15):
+                timestamps["t%d" % timestamp] = dict(
+                    cpu_request=random.randint(0, 100),
+                    cpu_usage=random.randint(0, 100),
+                    mem_request=random.randint(0, 1000),
+                    mem_usage=random.randint(0, 1000))
+
+            metrics.append(dict(name="ns-%d" % index, uid="uid-%d" % index, results=dict(timestamps=timestamps)))
+
+        expected = compute_usages_naive(metrics, 100000, 1000000)
+        usages = SyncMetrics._compute_usages(metrics, 100000, 1000000)
+
+        self.assertEqual(len(usages), len(expected))
+        for (name, uid, timestamp, usage), (_, _, _, expected_usage) in zip(usages, expected):
+            self.assertAlmostEqual(usage["cpu_ratio"], expected_usage["cpu_ratio"])
+            self.assertAlmostEqual(usage["mem_ratio"], expected_usage["mem_ratio"])
+
+
+if __name__ == "__main__":
+    unittest2.main()
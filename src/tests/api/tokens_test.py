@@ -0,0 +1,59 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+
+import jwt
+import unittest2
+import mock
+
+from api.v1.tokens import TokenCache
+
+
+class TestTokenCache(unittest2.TestCase):
+
+    def test_decode(self):
+        cache = TokenCache("secret")
+        token = jwt.encode(dict(username="admin", exp=int(time.time()) + 60), "secret", algorithm="HS256")
+
+        self.assertEqual(cache.decode(token)["username"], "admin")
+        self.assertIs(cache.decode(token), cache.decode(token))
+
+    def test_invalid(self):
+        cache = TokenCache("secret")
+
+        token = jwt.encode(dict(username="admin"), "other", algorithm="HS256")
+        self.assertRaises(jwt.InvalidTokenError, cache.decode, token)
+
+        token = jwt.encode(dict(username="admin", exp=int(time.time()) - 1), "secret", algorithm="HS256")
+        self.assertRaises(jwt.ExpiredSignatureError, cache.decode, token)
+
+    def test_expired_cached_token(self):
+        cache = TokenCache("secret")
+        token = jwt.encode(dict(username="admin", exp=int(time.time()) + 60), "secret", algorithm="HS256")
+
+        with mock.patch("jwt.decode", wraps=jwt.decode) as decode:
+            cache.decode(token)
+            cache.decode(token)
+            self.assertEqual(decode.call_count, 1)
+
+            with mock.patch("time.time", return_value=time.time() + 120):
+                cache.decode(token)
+            self.assertEqual(decode.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest2.main()
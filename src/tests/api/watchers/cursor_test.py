@@ -16,11 +16,17 @@ limitations under the License.
 
 import uuid
 
+import mock
 import unittest2
 from pymongo import MongoClient
 from tornado import testing
+from tornado.gen import coroutine, moment
 
+from api.v1.watchers.cursor import CursorWatcher
+from data import watch
 from tests import api
+from tests.data.membership_test import FakeCollection
+from tests.data.watch_test import oplog_document
 
 
 class TestCursor(api.ApiTestCase):
@@ -79,5 +85,69 @@ class TestCursor(api.ApiTestCase):
                         "Message is %s instead of 'Action fake not supported.'" % response["body"]["message"])
 
 
+class TestCursorWatcher(testing.AsyncTestCase):
+
+    def tearDown(self):
+        watch._callbacks.clear()
+        super(TestCursorWatcher, self).tearDown()
+
+    @testing.gen_test
+    def test_changes_during_snapshot(self):
+        messages = []
+
+        @coroutine
+        def callback(message):
+            messages.append(message)
+
+        collection = FakeCollection()
+        collection.documents = [dict(_id=1, name="default")]
+
+        message = dict(action="settings", operation="watch", correlation="1")
+        settings = dict(database=dict(Settings=collection), heapster=None)
+        watcher = CursorWatcher(message, settings, dict(username="admin"), callback)
+
+        watching = watcher.watch()
+        watch._dispatch_documents(dict(oplog_document("u", 1, name="changed"), ns="elastickube.Settings"))
+        yield moment
+
+        self.assertEqual(messages, [])
+
+        collection.ready.set()
+        yield watching
+
+        self.assertEqual([response["operation"] for response in messages], ["watched", "updated"])
+        self.assertEqual(messages[1]["body"]["name"], "changed")
+
+        watcher.unwatch()
+        self.assertEqual(watch._get_subscriptions("elastickube.Settings"), [])
+
+    @testing.gen_test
+    def test_resync_pages(self):
+        messages = []
+
+        @coroutine
+        def callback(message):
+            messages.append(message)
+
+        collection = FakeCollection()
+        collection.ready.set()
+
+        message = dict(action="settings", operation="watch", correlation="1")
+        settings = dict(database=dict(Settings=collection), heapster=None)
+        watcher = CursorWatcher(message, settings, dict(username="admin"), callback)
+        yield watcher.watch()
+
+        collection.documents = [dict(_id=1, name="first"), dict(_id=2, name="second")]
+        with mock.patch("api.v1.watchers.cursor.SNAPSHOT_PAGE_SIZE", 1):
+            yield watcher.resync()
+
+        self.assertEqual([response["operation"] for response in messages], ["watched", "watching", "watched"])
+        self.assertTrue(all(response["watch"] == "1" for response in messages))
+        self.assertNotIn("correlation", messages[1])
+        self.assertNotIn("correlation", messages[2])
+
+        watcher.unwatch()
+
+
 if __name__ == '__main__':
     unittest2.main()
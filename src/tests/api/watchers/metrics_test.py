@@ -19,8 +19,11 @@ import uuid
 import unittest2
 from pymongo import MongoClient
 from tornado import testing
+from tornado.gen import coroutine, sleep
 
+from api.v1.watchers.metrics import BATCH_DELAY, BATCH_SIZE, MetricsWatcher
 from tests import api
+from tests.data.watch_test import oplog_document
 
 
 class TestWatchersMetrics(api.ApiTestCase):
@@ -64,6 +67,74 @@ class TestWatchersMetrics(api.ApiTestCase):
         self.assertTrue(isinstance(response['body'], dict), "Body is not a dict but %s" % type(response['body']))
         self.assertTrue(len(response['body'].keys()) == 0, "Body is not empty")
 
+    @testing.gen_test(timeout=60)
+    def test_watch_metrics_window(self):
+        correlation = self.send_message("metrics", "watch", body={"kind": "Namespace", "window": "invalid"})
+        response = yield self.wait_message(self.connection, correlation)
+        self.validate_response(response, 400, correlation, "watch", "metrics")
+
+        correlation = self.send_message(
+            "metrics", "watch", body={"kind": "Namespace", "window": 3600 * 24 * 30, "max_points": 100})
+        response = yield self.wait_message(self.connection, correlation)
+        self.validate_response(response, 200, correlation, "watched", "metrics")
+        self.assertTrue(len(response["body"]) <= 100, "Received %d metrics" % len(response["body"]))
+
+        correlation = self.send_message("metrics", "unwatch", body={"kind": "Namespace"})
+        response = yield self.wait_message(self.connection, correlation)
+        self.validate_response(response, 200, correlation, "unwatched", "metrics")
+
+
+class TestMetricsWatcher(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestMetricsWatcher, self).setUp()
+
+        self.messages = []
+
+        @coroutine
+        def callback(message):
+            self.messages.append(message)
+
+        message = dict(action="metrics", operation="watch", correlation="1", body=dict(kind="Namespace"))
+        self.watcher = MetricsWatcher(message, dict(heapster=None), dict(username="admin"), callback)
+
+    @staticmethod
+    def metric(index):
+        return dict(oplog_document("i", index, value=index, metadata=dict()), ns="elastickube.Metrics")
+
+    @testing.gen_test
+    def test_flush_batch_size(self):
+        for index in range(BATCH_SIZE):
+            yield self.watcher.data_callback(self.metric(index))
+
+        self.assertEqual(len(self.messages), 1)
+        self.assertEqual(self.messages[0]["operation"], "created")
+        self.assertEqual(len(self.messages[0]["body"]), BATCH_SIZE)
+        self.assertNotIn("metadata", self.messages[0]["body"][0])
+        self.assertIsNone(self.watcher._batch_timeout)
+
+    @testing.gen_test
+    def test_flush_batch_delay(self):
+        yield self.watcher.data_callback(self.metric(1))
+        yield self.watcher.data_callback(self.metric(2))
+        self.assertEqual(self.messages, [])
+        self.assertIsNotNone(self.watcher._batch_timeout)
+
+        yield sleep(BATCH_DELAY.total_seconds() + 0.1)
+
+        self.assertEqual(len(self.messages), 1)
+        self.assertEqual([metric["value"] for metric in self.messages[0]["body"]], [1, 2])
+        self.assertIsNone(self.watcher._batch_timeout)
+
+    @testing.gen_test
+    def test_unwatch_cancels_flush(self):
+        yield self.watcher.data_callback(self.metric(1))
+        self.watcher.unwatch()
+        self.assertIsNone(self.watcher._batch_timeout)
+
+        yield sleep(BATCH_DELAY.total_seconds() + 0.1)
+        self.assertEqual(self.messages, [])
+
 
 if __name__ == '__main__':
     unittest2.main()
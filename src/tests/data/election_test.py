@@ -0,0 +1,136 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from datetime import datetime, timedelta
+
+import unittest2
+from pymongo.errors import AutoReconnect, DuplicateKeyError
+from tornado import testing
+from tornado.concurrent import Future
+from tornado.gen import coroutine, moment
+
+from data.election import LeaderElection
+
+
+class FakeLeases(object):
+
+    def __init__(self):
+        self.error = None
+        self.deleted = 0
+        self.updates = 0
+
+    @coroutine
+    def find_one_and_update(self, *args, **kwargs):
+        self.updates += 1
+        if self.error is not None:
+            raise self.error
+
+    @coroutine
+    def delete_one(self, criteria):
+        self.deleted += 1
+
+
+class TestLeaderElection(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestLeaderElection, self).setUp()
+        self.leases = FakeLeases()
+        self.events = []
+        self.election = LeaderElection(
+            dict(Leases=self.leases),
+            "test",
+            on_elected=self.on_elected,
+            on_demoted=lambda: self.events.append("demoted"),
+            duration=timedelta(seconds=30))
+
+    @coroutine
+    def on_elected(self):
+        self.events.append("elected")
+
+    @coroutine
+    def campaign(self):
+        yield self.election.campaign()
+
+        # on_elected runs apart from the campaign
+        for _ in range(3):
+            yield moment
+
+    @testing.gen_test
+    def test_campaign(self):
+        yield self.campaign()
+        yield self.campaign()
+        self.assertTrue(self.election.leader)
+
+        self.leases.error = DuplicateKeyError("E11000")
+        yield self.campaign()
+        self.assertFalse(self.election.leader)
+
+        self.leases.error = None
+        yield self.campaign()
+        self.assertEqual(self.events, ["elected", "demoted", "elected"])
+
+    @testing.gen_test
+    def test_renew_error(self):
+        yield self.campaign()
+
+        # The lease has not expired yet
+        self.leases.error = AutoReconnect()
+        yield self.campaign()
+        self.assertTrue(self.election.leader)
+
+        # The lease could expire before the next campaign
+        self.election.lease.expires = datetime.utcnow() + timedelta(seconds=5)
+        yield self.campaign()
+        self.assertFalse(self.election.leader)
+        self.assertEqual(self.events, ["elected", "demoted"])
+
+    @testing.gen_test
+    def test_failed_election(self):
+        @coroutine
+        def on_elected():
+            raise AutoReconnect()
+
+        self.election.on_elected = on_elected
+        yield self.campaign()
+
+        self.assertFalse(self.election.leader)
+        self.assertEqual(self.leases.deleted, 1)
+        self.assertEqual(self.events, ["demoted"])
+
+    @testing.gen_test
+    def test_lease_lost_while_starting(self):
+        started = Future()
+
+        @coroutine
+        def on_elected():
+            self.events.append("elected")
+            yield started
+
+        self.election.on_elected = on_elected
+        yield self.campaign()
+
+        # Renewals go on while the leader starts
+        self.leases.error = DuplicateKeyError("E11000")
+        yield self.campaign()
+        self.assertEqual(self.leases.updates, 2)
+        self.assertFalse(self.election.leader)
+
+        started.set_result(None)
+        yield self.campaign()
+        self.assertEqual(self.events, ["elected", "demoted", "demoted"])
+
+if __name__ == "__main__":
+    unittest2.main()
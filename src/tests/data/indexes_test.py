@@ -0,0 +1,80 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+
+import pytest
+import unittest2
+from motor.motor_tornado import MotorClient
+from tornado import testing
+
+from data.indexes import setup_indexes
+from data.query import Query
+
+# The queries of the API hot paths, every one must be resolved with an index
+HOT_QUERIES = [
+    ("Users", {"username": "operations@elasticbox.com"}),
+    ("Users", {"email_lower": "operations@elasticbox.com"}),
+    ("Users", {"invite_token": "token"}),
+    ("Users", {"saml_id": "name_id"}),
+    ("Users", {"role": "administrator"}),
+    ("Users", {"invite_token": "token", "email": "operations@elasticbox.com"}),
+    ("Namespaces", {"name": "default"}),
+    ("Namespaces", {"members": "operations@elasticbox.com"}),
+    ("Charts", {"path": "/var/elastickube/charts/stable/mysql"})
+]
+
+
+def get_stages(plan):
+    yield plan["stage"]
+
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            for stage in get_stages(child):
+                yield stage
+
+
+@pytest.mark.integration
+class TestIndexes(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestIndexes, self).setUp()
+
+        mongo_url = "mongodb://%s:%s/" % (
+            os.getenv("ELASTICKUBE_MONGO_SERVICE_HOST", "localhost"),
+            os.getenv("ELASTICKUBE_MONGO_SERVICE_PORT", 27017))
+
+        self.client = MotorClient(mongo_url, io_loop=self.io_loop)
+        self.database = self.client.elastickube_indexes_test
+
+    def tearDown(self):
+        self.io_loop.run_sync(lambda: self.client.drop_database(self.database))
+        super(TestIndexes, self).tearDown()
+
+    @testing.gen_test(timeout=30)
+    def test_hot_queries_use_indexes(self):
+        yield setup_indexes(self.database)
+
+        for collection, criteria in HOT_QUERIES:
+            query = Query(self.database, collection)._generate_query(criteria)
+            explain = yield self.database[collection].find(query).explain()
+
+            stages = list(get_stages(explain["queryPlanner"]["winningPlan"]))
+            self.assertNotIn("COLLSCAN", stages, "%s query %s scans the collection" % (collection, criteria))
+
+
+if __name__ == "__main__":
+    unittest2.main()
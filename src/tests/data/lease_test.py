@@ -0,0 +1,64 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+from datetime import timedelta
+
+import pytest
+import unittest2
+from motor.motor_tornado import MotorClient
+from tornado import gen, testing
+
+from data.lease import Lease
+
+
+@pytest.mark.integration
+class TestLease(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestLease, self).setUp()
+
+        mongo_url = "mongodb://%s:%s/" % (
+            os.getenv("ELASTICKUBE_MONGO_SERVICE_HOST", "localhost"),
+            os.getenv("ELASTICKUBE_MONGO_SERVICE_PORT", 27017))
+
+        self.client = MotorClient(mongo_url, io_loop=self.io_loop)
+        self.database = self.client.elastickube_lease_test
+
+    def tearDown(self):
+        self.io_loop.run_sync(lambda: self.client.drop_database(self.database))
+        super(TestLease, self).tearDown()
+
+    @testing.gen_test(timeout=30)
+    def test_exclusive(self):
+        first = Lease(self.database, "test", holder="first", duration=timedelta(seconds=1))
+        second = Lease(self.database, "test", holder="second", duration=timedelta(seconds=1))
+
+        self.assertTrue((yield first.acquire()))
+        self.assertFalse((yield second.acquire()))
+        self.assertTrue((yield first.acquire()))
+
+        yield gen.sleep(1.5)
+        self.assertTrue((yield second.acquire()))
+        self.assertFalse((yield first.acquire()))
+        self.assertFalse(first.held)
+
+        yield second.release()
+        self.assertTrue((yield first.acquire()))
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -0,0 +1,62 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import glob
+import os
+import timeit
+
+import yaml
+
+from data.son.manipulators import KeyManipulator
+from tests.data.manipulators_test import FakeCollection
+
+REPETITIONS = 1000
+MANIFESTS = os.path.join(os.path.dirname(__file__), "..", "..", "..", "build", "kubegrunt", "*", "*.yaml")
+
+
+def load_chart():
+    resources = []
+    for path in sorted(glob.glob(MANIFESTS)):
+        with open(path) as manifest:
+            resources.extend(document for document in yaml.safe_load_all(manifest) if document)
+
+    return dict(_id="benchmark", commit="HEAD", name="kubegrunt", resources=resources)
+
+
+def run():
+    """Time of a round trip renaming the dotted keys of a chart built from the kubegrunt manifests, documents
+    without a commit are always traversed. Run with python -m tests.data.manipulators_benchmark
+    """
+
+    chart = load_chart()
+    uncached = dict((key, value) for key, value in chart.iteritems() if key != "commit")
+    collection = FakeCollection("Charts")
+
+    def round_trip(document):
+        manipulator = KeyManipulator()
+
+        def call():
+            manipulator.transform_incoming(document, collection)
+            manipulator.transform_outgoing(document, collection)
+
+        return timeit.timeit(call, number=REPETITIONS) * 1000000 / REPETITIONS
+
+    print "%-10s %-14s %-14s" % ("resources", "usec/uncached", "usec/cached")
+    print "%-10d %-14.2f %-14.2f" % (len(chart["resources"]), round_trip(uncached), round_trip(chart))
+
+
+if __name__ == "__main__":
+    run()
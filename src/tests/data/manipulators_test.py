@@ -0,0 +1,106 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import copy
+
+import unittest2
+
+from data.son.manipulators import KeyManipulator
+
+
+class FakeCollection(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+CHART = {
+    "_id": 1,
+    "commit": "abc",
+    "name": "mysql",
+    "resources": [
+        {
+            "metadata": {
+                "labels": {"kubernetes.io/name": "mysql", "app": "mysql"},
+                "annotations": {"scheduler.alpha.kubernetes.io/affinity": {"a.b": 1}}
+            },
+            "spec": {"ports": [{"port": 3306}]}
+        }
+    ]
+}
+
+
+class TestKeyManipulator(unittest2.TestCase):
+
+    def test_transform(self):
+        manipulator = KeyManipulator()
+        charts = FakeCollection("Charts")
+
+        document = manipulator.transform_incoming(copy.deepcopy(CHART), charts)
+        metadata = document["resources"][0]["metadata"]
+        self.assertEqual(metadata["labels"], {"kubernetes__dot__io/name": "mysql", "app": "mysql"})
+        self.assertEqual(metadata["annotations"], {"scheduler__dot__alpha__dot__kubernetes__dot__io/affinity": {
+            "a__dot__b": 1}})
+
+        self.assertEqual(manipulator.transform_outgoing(document, charts), CHART)
+
+    def test_cached_paths(self):
+        manipulator = KeyManipulator()
+        charts = FakeCollection("Charts")
+
+        first = manipulator.transform_incoming(copy.deepcopy(CHART), charts)
+        second = manipulator.transform_incoming(copy.deepcopy(CHART), charts)
+        self.assertEqual(first, second)
+        self.assertEqual(len(manipulator._paths), 1)
+
+        # A document that does not have the cached paths is traversed again
+        document = copy.deepcopy(CHART)
+        del document["resources"][0]["metadata"]["labels"]
+        document = manipulator.transform_incoming(document, charts)
+        self.assertIn("scheduler__dot__alpha__dot__kubernetes__dot__io/affinity",
+                      document["resources"][0]["metadata"]["annotations"])
+        self.assertEqual(len(manipulator._paths), 0)
+
+    def test_cached_reads(self):
+        manipulator = KeyManipulator()
+        charts = FakeCollection("Charts")
+
+        stored = manipulator.transform_incoming(copy.deepcopy(CHART), charts)
+        self.assertEqual(manipulator.transform_outgoing(copy.deepcopy(stored), charts), CHART)
+
+        # Reads use the paths of the written document but never cache theirs, they may be projected
+        projected = copy.deepcopy(stored)
+        del projected["resources"][0]["metadata"]["labels"]
+        document = manipulator.transform_outgoing(projected, charts)
+        self.assertEqual(document["resources"][0]["metadata"]["annotations"],
+                         CHART["resources"][0]["metadata"]["annotations"])
+        self.assertEqual(len(manipulator._paths), 1)
+
+        self.assertEqual(manipulator.transform_outgoing(copy.deepcopy(stored), charts), CHART)
+
+        manipulator = KeyManipulator()
+        manipulator.transform_outgoing(copy.deepcopy(stored), charts)
+        self.assertEqual(len(manipulator._paths), 0)
+
+    def test_collections(self):
+        manipulator = KeyManipulator(collections=["Charts"])
+
+        document = manipulator.transform_incoming(copy.deepcopy(CHART), FakeCollection("Users"))
+        self.assertEqual(document, CHART)
+
+
+if __name__ == "__main__":
+    unittest2.main()
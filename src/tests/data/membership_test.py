@@ -0,0 +1,133 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest2
+from tornado import testing
+from tornado.gen import coroutine, Return
+from tornado.locks import Event
+
+from data.membership import NamespaceMembership
+from tests.data.watch_test import oplog_document
+
+
+class FakeCursor(object):
+
+    def __init__(self, documents, ready):
+        self.documents = list(documents)
+        self.ready = ready
+
+    @property
+    def fetch_next(self):
+        return self._fetch_next()
+
+    @coroutine
+    def _fetch_next(self):
+        yield self.ready.wait()
+        raise Return(bool(self.documents))
+
+    def next_object(self):
+        return self.documents.pop(0)
+
+    def batch_size(self, _size):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCollection(object):
+
+    def __init__(self, document=None):
+        self.document = document
+        self.documents = []
+        self.queries = 0
+        self.ready = Event()
+
+    @coroutine
+    def find_one(self, *args, **kwargs):
+        self.queries += 1
+        return self.document
+
+    def find(self, *args, **kwargs):
+        return FakeCursor(self.documents, self.ready)
+
+
+class TestNamespaceMembership(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestNamespaceMembership, self).setUp()
+        self.collection = FakeCollection()
+        self.membership = NamespaceMembership(dict(Namespaces=self.collection))
+        self.membership.loaded = True
+
+    @testing.gen_test
+    def test_changes(self):
+        yield self.membership._on_change(oplog_document("i", 1, name="default", members=["admin"]))
+        self.assertTrue((yield self.membership.is_member("default", "admin")))
+        self.assertFalse((yield self.membership.is_member("default", "user")))
+
+        yield self.membership._on_change(oplog_document("u", 1, name="renamed", members=["user"]))
+        self.assertFalse((yield self.membership.is_member("default", "user")))
+        self.assertTrue((yield self.membership.is_member("renamed", "user")))
+
+        yield self.membership._on_change(oplog_document("d", 1))
+        self.assertFalse((yield self.membership.is_member("renamed", "user")))
+
+        self.assertEqual(self.collection.queries, 0)
+        self.assertEqual(self.membership.stats()["hit_rate"], 1.0)
+
+    @testing.gen_test
+    def test_partial_update(self):
+        self.collection.document = dict(_id=1, name="default", members=["admin", "user"])
+        yield self.membership._on_change(oplog_document("u", 1, **{"$set": {"members.1": "user"}}))
+
+        self.assertTrue((yield self.membership.is_member("default", "user")))
+        self.assertEqual(self.collection.queries, 1)
+
+    @testing.gen_test
+    def test_without_members(self):
+        yield self.membership._on_change(oplog_document("i", 1, name="default"))
+
+        self.assertFalse((yield self.membership.is_member("default", "admin")))
+        self.assertTrue((yield self.membership.is_member("default", "admin", default=True)))
+
+    @testing.gen_test
+    def test_changes_while_loading(self):
+        self.collection.documents = [dict(_id=1, name="default", members=["admin"])]
+
+        loading = self.membership.load()
+        yield self.membership._on_change(oplog_document("u", 1, name="default", members=["user"]))
+        yield self.membership._on_change(oplog_document("i", 2, name="other", members=["admin"]))
+
+        self.collection.ready.set()
+        yield loading
+
+        self.assertTrue(self.membership.loaded)
+        self.assertTrue((yield self.membership.is_member("default", "user")))
+        self.assertFalse((yield self.membership.is_member("default", "admin")))
+        self.assertTrue((yield self.membership.is_member("other", "admin")))
+
+    @testing.gen_test
+    def test_not_loaded(self):
+        self.membership.loaded = False
+        self.collection.document = dict(_id=1, name="default", members=["admin"])
+
+        self.assertTrue((yield self.membership.is_member("default", "admin")))
+        self.assertEqual(self.membership.stats(), dict(hits=0, misses=1, hit_rate=0.0, namespaces=0))
+
+
+if __name__ == "__main__":
+    unittest2.main()
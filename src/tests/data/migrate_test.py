@@ -0,0 +1,63 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from datetime import datetime
+
+import unittest2
+from pymongo import UpdateOne
+from tornado import testing
+from tornado.gen import coroutine
+
+import data
+from data import update_documents
+from data.retention import parse_timestamp
+from tests.data.query_test import FakeCursor
+
+
+class FakeCollection(object):
+
+    def __init__(self):
+        self.writes = []
+
+    @coroutine
+    def bulk_write(self, requests, ordered=True):
+        self.writes.append((list(requests), ordered))
+
+
+class TestMigrate(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_update_documents(self):
+        collection = FakeCollection()
+        cursor = FakeCursor([dict(_id=index, timestamp="2016-06-0%dT10:00:00Z" % (index + 1)) for index in range(5)])
+
+        original = data.MIGRATION_BATCH_SIZE
+        data.MIGRATION_BATCH_SIZE = 2
+        try:
+            yield update_documents(
+                collection, cursor, lambda metric: {"$set": {"date": parse_timestamp(metric["timestamp"])}})
+        finally:
+            data.MIGRATION_BATCH_SIZE = original
+
+        self.assertEqual([len(requests) for requests, _ in collection.writes], [2, 2, 1])
+        self.assertTrue(all(not ordered for _, ordered in collection.writes))
+        self.assertEqual(
+            collection.writes[2][0],
+            [UpdateOne({"_id": 4}, {"$set": {"date": datetime(2016, 6, 5, 10)}})])
+
+
+if __name__ == "__main__":
+    unittest2.main()
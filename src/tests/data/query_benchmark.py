@@ -0,0 +1,48 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import timeit
+
+from bson import BSON
+
+from data.query import CompiledQuery, Query
+
+BATCHES = 5
+BATCH_SIZE = 10000
+
+
+def run():
+    """Size and time of the filters generated by a reused Query, run with python -m tests.data.query_benchmark
+    """
+
+    query = Query(dict(), "Namespaces")
+    criteria = {"name": "default", "members": "admin"}
+    compiled = CompiledQuery(criteria)
+
+    print "%-8s %-14s %-14s %-14s" % ("batch", "filter bytes", "usec/query", "usec/compiled")
+    for batch in range(BATCHES):
+        elapsed = timeit.timeit(lambda: query._generate_query(criteria), number=BATCH_SIZE)
+        compiled_elapsed = timeit.timeit(lambda: query._generate_query(compiled), number=BATCH_SIZE)
+
+        print "%-8d %-14d %-14.2f %-14.2f" % (
+            batch,
+            len(BSON.encode(query._generate_query(criteria))),
+            elapsed * 1000000 / BATCH_SIZE,
+            compiled_elapsed * 1000000 / BATCH_SIZE)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,234 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import unittest2
+from pymongo import ReturnDocument
+from pymongo.results import InsertManyResult
+from tornado import testing
+from tornado.gen import coroutine, Return
+
+from data.query import BatchCursor, CompiledQuery, ObjectNotFoundError, Query
+
+
+class FakeCollection(object):
+
+    def __init__(self, result=None):
+        self.result = result
+        self.calls = []
+
+    @coroutine
+    def find_one_and_update(self, criteria, update, projection=None, upsert=False, return_document=None):
+        self.calls.append(("find_one_and_update", criteria, update, upsert, return_document))
+        raise Return(self.result)
+
+    @coroutine
+    def find_one_and_replace(self, criteria, document, upsert=False, return_document=None):
+        self.calls.append(("find_one_and_replace", criteria, document, upsert, return_document))
+        raise Return(self.result)
+
+    @coroutine
+    def update(self, criteria, document, upsert=False, manipulate=False):
+        self.calls.append(("update", criteria, document, upsert, manipulate))
+        raise Return(dict(n=1 if self.result else 0))
+
+    @coroutine
+    def insert_many(self, documents, ordered=True):
+        self.calls.append(("insert_many", documents, ordered))
+        raise Return(InsertManyResult([document["_id"] for document in documents], True))
+
+    @coroutine
+    def find_one(self, *args, **kwargs):
+        raise AssertionError("Documents must not be read back")
+
+    @coroutine
+    def insert(self, document, manipulate=False, continue_on_error=False):
+        self.calls.append(("insert", document, manipulate, continue_on_error))
+        if isinstance(document, list):
+            raise Return([item["_id"] for item in document])
+
+        raise Return(document["_id"])
+
+
+class FakeCursor(object):
+
+    def __init__(self, documents):
+        self.documents = list(documents)
+        self.closed = False
+
+    @coroutine
+    def _fetch_next(self):
+        raise Return(bool(self.documents))
+
+    @property
+    def fetch_next(self):
+        return self._fetch_next()
+
+    def next_object(self):
+        return self.documents.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+class TestQuery(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_batch_cursor(self):
+        cursor = BatchCursor(FakeCursor(range(5)), batch_size=2)
+
+        batches = []
+        while not cursor.exhausted:
+            batches.append((yield cursor.next_batch()))
+
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+
+        fake_cursor = FakeCursor(range(5))
+        cursor = BatchCursor(fake_cursor, batch_size=2)
+        yield cursor.next_batch()
+        cursor.close()
+        self.assertTrue(fake_cursor.closed)
+
+    def test_generate_query(self):
+        query = Query(dict(), "Users")
+        for _ in range(3):
+            self.assertEqual(query._generate_query({"name": "test", "role": "user"}),
+                             {"metadata.deletionTimestamp": None, "name": "test", "role": "user"})
+
+        self.assertEqual(query._generate_query(None), {"metadata.deletionTimestamp": None})
+        self.assertEqual(query._generate_query({"$and": [{"name": "test"}]}),
+                         {"metadata.deletionTimestamp": None, "name": "test"})
+        self.assertEqual(query._generate_query({"$and": [{"age": {"$gt": 1}}, {"age": {"$lt": 5}}]}),
+                         {"metadata.deletionTimestamp": None, "age": {"$gt": 1}, "$and": [{"age": {"$lt": 5}}]})
+
+    def test_compiled_query(self):
+        compiled = CompiledQuery({"name": "test"})
+
+        query = Query(dict(), "Users")._generate_query(compiled)
+        query["name"] = "changed"
+        self.assertEqual(compiled.as_filter(), {"metadata.deletionTimestamp": None, "name": "test"})
+
+    @testing.gen_test
+    def test_insert(self):
+        collection = FakeCollection()
+        document = yield Query(dict(Users=collection), "Users").insert(dict(name="test"))
+
+        self.assertIn("_id", document)
+        self.assertIsNone(document["metadata"]["deletionTimestamp"])
+        self.assertEqual(len(collection.calls), 1)
+
+    @testing.gen_test
+    def test_insert_many(self):
+        collection = FakeCollection()
+        documents = [dict(name="first"), dict(_id=2, name="second")]
+
+        document_ids = yield Query(dict(Users=collection), "Users").insert_many(documents)
+        self.assertEqual(document_ids, [documents[0]["_id"], 2])
+        self.assertTrue(all(document["metadata"]["deletionTimestamp"] is None for document in documents))
+
+        method, inserted, ordered = collection.calls[-1]
+        self.assertEqual(method, "insert_many")
+        self.assertIs(inserted, documents)
+        self.assertFalse(ordered)
+
+    @testing.gen_test
+    def test_insert_many_manipulated(self):
+        collection = FakeCollection()
+        documents = [dict(name="first"), dict(name="second")]
+
+        document_ids = yield Query(dict(Charts=collection), "Charts", manipulate=True).insert_many(documents)
+        self.assertEqual(document_ids, [document["_id"] for document in documents])
+
+        # insert_many does not apply the SON manipulators, the legacy insert does
+        method, inserted, manipulate, continue_on_error = collection.calls[-1]
+        self.assertEqual(method, "insert")
+        self.assertIs(inserted, documents)
+        self.assertTrue(manipulate)
+        self.assertTrue(continue_on_error)
+
+    @testing.gen_test
+    def test_find_one_and_replace(self):
+        stored = dict(_id=1, name="stored")
+        collection = FakeCollection(stored)
+
+        document = yield Query(dict(Users=collection), "Users").find_one_and_replace(dict(_id=1, metadata=dict()))
+        self.assertEqual(document, stored)
+
+        method, criteria, _, upsert, return_document = collection.calls[-1]
+        self.assertEqual(method, "find_one_and_replace")
+        self.assertEqual(criteria, {"metadata.deletionTimestamp": None, "_id": 1})
+        self.assertFalse(upsert)
+        self.assertEqual(return_document, ReturnDocument.AFTER)
+
+        local = dict(_id=1, metadata=dict())
+        document = yield Query(dict(Users=collection), "Users").find_one_and_replace(local, read_back=False)
+        self.assertIs(document, local)
+        self.assertEqual(collection.calls[-1][0], "update")
+
+        with self.assertRaises(ObjectNotFoundError):
+            yield Query(dict(Users=FakeCollection()), "Users").find_one_and_replace(dict(_id=1, metadata=dict()))
+
+    @testing.gen_test
+    def test_find_one_and_update(self):
+        collection = FakeCollection(dict(_id=1))
+
+        yield Query(dict(Namespaces=collection), "Namespaces").find_one_and_update(
+            {"_id": 1}, {"$set": {"metadata.deletionTimestamp": 10}}, upsert=True)
+
+        _, _, update, upsert, return_document = collection.calls[-1]
+        self.assertTrue(upsert)
+        self.assertEqual(return_document, ReturnDocument.AFTER)
+        self.assertIn("metadata.resourceVersion", update["$set"])
+        self.assertIn("metadata.creationTimestamp", update["$setOnInsert"])
+        self.assertNotIn("metadata.deletionTimestamp", update["$setOnInsert"])
+
+        with self.assertRaises(ObjectNotFoundError):
+            yield Query(dict(Namespaces=FakeCollection()), "Namespaces").find_one_and_update(
+                {"_id": 1}, {"$set": {"members": []}})
+
+    @testing.gen_test
+    def test_lowercase_fields(self):
+        collection = FakeCollection(dict(_id=1))
+        query = Query(dict(Users=collection), "Users")
+
+        document = yield query.insert(dict(email="User@ElasticBox.com"))
+        self.assertEqual(document["email_lower"], "user@elasticbox.com")
+
+        documents = [dict(email="First@ElasticBox.com"), dict(name="no email")]
+        yield query.insert_many(documents)
+        self.assertEqual(documents[0]["email_lower"], "first@elasticbox.com")
+        self.assertNotIn("email_lower", documents[1])
+
+        yield query.find_one_and_replace(dict(_id=1, email="Replaced@ElasticBox.com", metadata=dict()))
+        self.assertEqual(collection.calls[-1][2]["email_lower"], "replaced@elasticbox.com")
+
+        yield query.find_one_and_update({"_id": 1}, {"$set": {"email": "Updated@ElasticBox.com"}})
+        self.assertEqual(collection.calls[-1][2]["$set"]["email_lower"], "updated@elasticbox.com")
+
+        yield query.find_one_and_update({"_id": 1}, {"$setOnInsert": {"email": "New@ElasticBox.com"}}, upsert=True)
+        self.assertEqual(collection.calls[-1][2]["$setOnInsert"]["email_lower"], "new@elasticbox.com")
+
+        yield query.find_one_and_update({"_id": 1}, {"$unset": {"email": ""}})
+        self.assertIn("email_lower", collection.calls[-1][2]["$unset"])
+
+        yield query.update_fields({"_id": 1}, {"email": "Fields@ElasticBox.com"})
+        self.assertEqual(collection.calls[-1][2]["$set"]["email_lower"], "fields@elasticbox.com")
+
+        yield Query(dict(Namespaces=collection), "Namespaces").update_fields({"_id": 1}, {"email": "Other"})
+        self.assertNotIn("email_lower", collection.calls[-1][2]["$set"])
+
+
+if __name__ == "__main__":
+    unittest2.main()
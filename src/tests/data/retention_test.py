@@ -0,0 +1,47 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from datetime import datetime, timedelta
+
+import unittest2
+
+from data.retention import format_timestamp, get_metrics_collection, parse_timestamp
+
+
+class TestRetention(unittest2.TestCase):
+
+    def test_get_metrics_collection(self):
+        self.assertEqual(get_metrics_collection(timedelta(hours=1)), "Metrics")
+        self.assertEqual(get_metrics_collection(timedelta(days=1)), "Metrics")
+        self.assertEqual(get_metrics_collection(timedelta(days=3)), "Metrics5m")
+        self.assertEqual(get_metrics_collection(timedelta(days=30)), "Metrics1h")
+        self.assertEqual(get_metrics_collection(timedelta(days=365)), "Metrics1h")
+
+    def test_get_metrics_collection_max_points(self):
+        self.assertEqual(get_metrics_collection(timedelta(hours=1), max_points=60), "Metrics")
+        self.assertEqual(get_metrics_collection(timedelta(hours=1), max_points=12), "Metrics5m")
+        self.assertEqual(get_metrics_collection(timedelta(days=1), max_points=24), "Metrics1h")
+        self.assertEqual(get_metrics_collection(timedelta(days=30), max_points=10), "Metrics1h")
+
+    def test_timestamps(self):
+        date = parse_timestamp("2016-05-10T12:35:00Z")
+        self.assertEqual(date, datetime(2016, 5, 10, 12, 35))
+        self.assertEqual(format_timestamp(date), "2016-05-10T12:35:00Z")
+
+
+if __name__ == "__main__":
+    unittest2.main()
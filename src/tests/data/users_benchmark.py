@@ -0,0 +1,91 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+
+import jwt
+from tornado.gen import coroutine, sleep, Return
+from tornado.ioloop import IOLoop
+
+from api.v1.tokens import TokenCache
+from data.users import UserCache
+
+CONNECTIONS = 2000
+USERS = 50
+QUERY_LATENCY = 0.002
+SECRET = "ElasticKube"
+
+
+class LatencyUsers(object):
+
+    def __init__(self):
+        self.queries = 0
+
+    @coroutine
+    def find_one(self, criteria):
+        self.queries += 1
+        yield sleep(QUERY_LATENCY)
+        raise Return(dict(_id=criteria["username"], username=criteria["username"], role="user"))
+
+
+@coroutine
+def storm(tokens, authenticate):
+    start_time = time.time()
+    yield [authenticate(token) for token in tokens]
+    raise Return(time.time() - start_time)
+
+
+@coroutine
+def run_storms(tokens):
+    users = LatencyUsers()
+
+    @coroutine
+    def uncached(token):
+        payload = jwt.decode(token, SECRET, algorithms=["HS256"])
+        yield users.find_one({"username": payload["username"]})
+
+    elapsed = yield storm(tokens, uncached)
+    print "%-10s %-10d %-10.2f" % ("uncached", users.queries, elapsed * 1000)
+
+    users = LatencyUsers()
+    token_cache = TokenCache(SECRET)
+    user_cache = UserCache(dict(Users=users))
+
+    @coroutine
+    def cached(token):
+        payload = token_cache.decode(token)
+        yield user_cache.get(payload["username"])
+
+    elapsed = yield storm(tokens, cached)
+    print "%-10s %-10d %-10.2f" % ("cached", users.queries, elapsed * 1000)
+
+
+def run():
+    """Authentication of a burst of websocket reconnections with and without the token and user caches,
+    run with python -m tests.data.users_benchmark
+    """
+
+    exp = int(time.time()) + 3600
+    encoded = [jwt.encode(dict(username="user%d" % user, exp=exp), SECRET, algorithm="HS256") for user in range(USERS)]
+    tokens = [encoded[connection % USERS] for connection in range(CONNECTIONS)]
+
+    print "%d connections of %d users" % (CONNECTIONS, USERS)
+    print "%-10s %-10s %-10s" % ("", "queries", "msec")
+    IOLoop.current().run_sync(lambda: run_storms(tokens))
+
+
+if __name__ == "__main__":
+    run()
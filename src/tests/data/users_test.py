@@ -0,0 +1,93 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from datetime import timedelta
+
+import unittest2
+from tornado import testing
+from tornado.gen import coroutine, moment, Return
+
+from data.users import UserCache
+from tests.data.watch_test import oplog_document
+
+
+class FakeUsers(object):
+
+    def __init__(self, *users):
+        self.users = dict((user["username"], user) for user in users)
+        self.queries = 0
+
+    @coroutine
+    def find_one(self, criteria):
+        self.queries += 1
+        yield moment
+        raise Return(self.users.get(criteria["username"]))
+
+
+class TestUserCache(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestUserCache, self).setUp()
+        self.users = FakeUsers(dict(_id=1, username="admin", role="administrator"))
+        self.cache = UserCache(dict(Users=self.users))
+
+    @testing.gen_test
+    def test_concurrent_lookups(self):
+        users = yield [self.cache.get("admin") for _ in range(10)]
+        self.assertEqual([user["role"] for user in users], ["administrator"] * 10)
+
+        user = yield self.cache.get("admin")
+        self.assertEqual(user["username"], "admin")
+        self.assertEqual(self.users.queries, 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    @testing.gen_test
+    def test_invalidation(self):
+        yield self.cache.get("admin")
+
+        self.users.users["admin"] = dict(_id=1, username="admin", role="user")
+        yield self.cache._on_change(oplog_document("u", 1, **{"$set": {"role": "user"}}))
+
+        user = yield self.cache.get("admin")
+        self.assertEqual(user["role"], "user")
+        self.assertEqual(self.users.queries, 2)
+
+    @testing.gen_test
+    def test_invalidation_while_loading(self):
+        future = self.cache.get("admin")
+        yield self.cache._on_change(oplog_document("d", 1))
+        yield future
+
+        yield self.cache.get("admin")
+        self.assertEqual(self.users.queries, 2)
+
+    @testing.gen_test
+    def test_expiration(self):
+        cache = UserCache(dict(Users=self.users), ttl=timedelta(0))
+        yield cache.get("admin")
+        yield cache.get("admin")
+
+        self.assertEqual(self.users.queries, 2)
+
+    @testing.gen_test
+    def test_missing_user(self):
+        self.assertIsNone((yield self.cache.get("unknown")))
+        self.assertIsNone((yield self.cache.get("unknown")))
+        self.assertEqual(self.users.queries, 2)
+
+
+if __name__ == "__main__":
+    unittest2.main()
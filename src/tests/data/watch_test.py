@@ -0,0 +1,385 @@
+"""
+Copyright 2016 ElasticBox All rights reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from bson.objectid import ObjectId
+from bson.timestamp import Timestamp
+import unittest2
+from tornado import testing
+from tornado.concurrent import Future
+from tornado.gen import coroutine, moment, Return
+from tornado.ioloop import IOLoop
+
+from data import watch
+
+
+def oplog_document(op, document_id, **fields):
+    document = dict(ns="elastickube.Namespaces", op=op, o=dict(_id=document_id, **fields))
+    if op == "u":
+        document["o2"] = dict(_id=document_id)
+
+    return document
+
+
+class FakeBackend(object):
+
+    def __init__(self, cluster_time):
+        self.cluster_time = cluster_time
+
+    @coroutine
+    def get_cluster_time(self):
+        raise Return(self.cluster_time)
+
+    def subscriptions_changed(self, _namespace):
+        pass
+
+
+class FakeChangeStream(object):
+
+    def __init__(self):
+        self.changes = []
+        self.waiting = Future()
+        self.closed = False
+
+    @coroutine
+    def next(self):
+        while not self.changes:
+            if self.closed:
+                raise StopIteration()
+
+            yield self.waiting
+
+        raise Return(self.changes.pop(0))
+
+    def push(self, change):
+        self.changes.append(change)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        self.waiting, waiting = Future(), self.waiting
+        waiting.set_result(None)
+
+
+class TestWatch(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TestWatch, self).setUp()
+        self.received = []
+        self.blocker = Future()
+
+    def tearDown(self):
+        for subscriptions in watch._callbacks.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+        watch._callbacks.clear()
+        super(TestWatch, self).tearDown()
+
+    @coroutine
+    def fast_callback(self, document):
+        self.received.append(document)
+
+    @coroutine
+    def slow_callback(self, document):
+        self.received.append(document)
+        yield self.blocker
+
+    @testing.gen_test
+    def test_slow_subscriber_does_not_block(self):
+        fast_documents = []
+
+        @coroutine
+        def other_callback(document):
+            fast_documents.append(document)
+
+        yield watch.add_callback("Namespaces", self.slow_callback)
+        yield watch.add_callback("Namespaces", other_callback)
+
+        for _ in range(3):
+            watch._dispatch_documents(oplog_document("i", ObjectId()))
+
+        yield moment
+        self.assertEqual(len(fast_documents), 3)
+        self.assertEqual(len(self.received), 1)
+
+        self.blocker.set_result(None)
+        yield moment
+        yield moment
+        self.assertEqual(len(self.received), 3)
+
+    @testing.gen_test
+    def test_overflow_coalesce(self):
+        document_id = ObjectId()
+        yield watch.add_callback("Namespaces", self.slow_callback, queue_size=2, overflow=watch.OVERFLOW_COALESCE)
+
+        watch._dispatch_documents(oplog_document("i", ObjectId()))
+        yield moment
+        watch._dispatch_documents(oplog_document("i", document_id, name="first"))
+        watch._dispatch_documents(oplog_document("i", ObjectId()))
+        watch._dispatch_documents(oplog_document("u", document_id, name="last"))
+
+        self.blocker.set_result(None)
+        for _ in range(4):
+            yield moment
+
+        self.assertEqual(len(self.received), 3)
+        self.assertEqual(self.received[1]["op"], "i")
+        self.assertEqual(self.received[1]["o"]["name"], "last")
+
+    @testing.gen_test
+    def test_overflow_disconnect(self):
+        disconnected = []
+        yield watch.add_callback("Namespaces", self.slow_callback, queue_size=1, overflow=watch.OVERFLOW_DISCONNECT,
+                                 on_overflow=lambda: disconnected.append(True))
+
+        for _ in range(3):
+            watch._dispatch_documents(oplog_document("i", ObjectId()))
+        yield moment
+
+        self.assertEqual(disconnected, [True])
+        self.assertEqual(watch._callbacks["elastickube.Namespaces"], [])
+
+    @testing.gen_test
+    def test_resync(self):
+        resyncs = []
+
+        @coroutine
+        def on_resync():
+            resyncs.append(True)
+
+        yield watch.add_callback("Namespaces", self.slow_callback, on_resync=on_resync)
+        for _ in range(3):
+            watch._dispatch_documents(oplog_document("i", ObjectId()))
+
+        watch._resync_subscriptions()
+        yield moment
+
+        self.assertEqual(resyncs, [True])
+        self.blocker.set_result(None)
+        yield moment
+        self.assertEqual(len(self.received), 1)
+
+    @testing.gen_test
+    def test_checkpoint(self):
+        updates = []
+
+        class FakeCollection(object):
+
+            @coroutine
+            def find_one(self, _criteria):
+                raise Return(dict(_id="api", position=Timestamp(10, 1)))
+
+            @coroutine
+            def update_one(self, criteria, update, upsert=False):
+                updates.append(update["$set"]["position"])
+
+        checkpoint = watch.Checkpoint(dict(elastickube={watch.CHECKPOINT_COLLECTION: FakeCollection()}), "api")
+        timestamp = yield checkpoint.load()
+        self.assertEqual(timestamp, Timestamp(10, 1))
+
+        for increment in range(watch.CHECKPOINT_BATCH_SIZE - 1):
+            checkpoint.update(Timestamp(11, increment))
+        yield moment
+        self.assertEqual(updates, [])
+
+        checkpoint.update(Timestamp(12, 0))
+        yield moment
+        self.assertEqual(updates, [Timestamp(12, 0)])
+
+        checkpoint.stop()
+
+    @testing.gen_test
+    def test_checkpoint_acknowledgement(self):
+        checkpoint = watch.Checkpoint(dict(elastickube={watch.CHECKPOINT_COLLECTION: None}), "api")
+        checkpoint.update(Timestamp(10, 0))
+
+        yield watch.add_callback("Namespaces", self.slow_callback)
+        yield watch.add_callback("Namespaces", self.fast_callback)
+
+        for increment in range(1, 3):
+            acknowledgement = checkpoint.track(Timestamp(10, increment))
+            watch._dispatch_documents(oplog_document("i", ObjectId()), acknowledgement)
+            acknowledgement.release()
+
+        yield moment
+        self.assertEqual(checkpoint.position, Timestamp(10, 2))
+        self.assertEqual(checkpoint.acknowledged_position, Timestamp(10, 0))
+
+        self.blocker.set_result(None)
+        yield moment
+        yield moment
+        self.assertEqual(checkpoint.acknowledged_position, Timestamp(10, 2))
+
+        checkpoint.stop()
+
+    @testing.gen_test
+    def test_checkpoint_ts(self):
+        class FakeCollection(object):
+
+            @coroutine
+            def find_one(self, _criteria):
+                raise Return(dict(_id="api", ts=Timestamp(10, 1)))
+
+        checkpoint = watch.Checkpoint(dict(elastickube={watch.CHECKPOINT_COLLECTION: FakeCollection()}), "api")
+        timestamp = yield checkpoint.load()
+        self.assertEqual(timestamp, Timestamp(10, 1))
+
+        checkpoint.stop()
+
+    @testing.gen_test
+    def test_change_stream_pipeline(self):
+        self.assertIsNone(watch.ChangeStreamBackend.build_pipeline([]))
+
+        yield watch.add_callback("Metrics", self.fast_callback, criteria={"involvedObject.name": "default"})
+        yield watch.add_callback("Metrics", self.fast_callback, criteria={"involvedObject.name": "kube-system"})
+
+        match = watch.ChangeStreamBackend.build_pipeline(watch._get_subscriptions("elastickube.Metrics"))[0]["$match"]
+        self.assertItemsEqual(match["$or"], [
+            {"operationType": "delete"},
+            {"fullDocument.involvedObject.name": "default"},
+            {"fullDocument.involvedObject.name": "kube-system"}
+        ])
+
+        watch._backend = FakeBackend(Timestamp(50, 0))
+        try:
+            yield watch.add_callback("Metrics", self.fast_callback, criteria={"involvedObject.name": "new"})
+            yield watch.add_callback("Metrics", self.slow_callback)
+        finally:
+            watch._backend = None
+
+        # The stream resumes from the last change of the previous pipeline, the new subscribers start now
+        match = watch.ChangeStreamBackend.build_pipeline(watch._get_subscriptions("elastickube.Metrics"))[0]["$match"]
+        self.assertItemsEqual(match["$or"], [
+            {"operationType": "delete"},
+            {"fullDocument.involvedObject.name": "default"},
+            {"fullDocument.involvedObject.name": "kube-system"},
+            {"fullDocument.involvedObject.name": "new", "clusterTime": {"$gt": Timestamp(50, 0)}},
+            {"clusterTime": {"$gt": Timestamp(50, 0)}}
+        ])
+
+        yield watch.add_callback("Metrics", self.fast_callback)
+        match = watch.ChangeStreamBackend.build_pipeline(watch._get_subscriptions("elastickube.Metrics"))[0]["$match"]
+        self.assertNotIn("$or", match)
+
+    @testing.gen_test
+    def test_change_stream_replaced(self):
+        streams = []
+
+        class FakeCollection(object):
+
+            def watch(self, pipeline, **_kwargs):
+                streams.append(FakeChangeStream())
+                return streams[-1]
+
+        checkpoint = watch.Checkpoint(dict(elastickube={watch.CHECKPOINT_COLLECTION: None}), "api.Namespaces")
+        checkpoint.position = "token"
+
+        yield watch.add_callback("Namespaces", self.fast_callback)
+        previous = watch._CollectionStream(FakeCollection(), "elastickube.Namespaces", [], checkpoint)
+        IOLoop.current().spawn_callback(previous.run)
+        yield moment
+
+        stream = watch._CollectionStream(FakeCollection(), "elastickube.Namespaces", [], checkpoint, previous)
+        IOLoop.current().spawn_callback(stream.run)
+        yield moment
+
+        # The previous stream does not dispatch once stopped and the new one waits for it
+        previous.stop()
+        streams[0].push(dict(_id="stale", operationType="insert", documentKey=dict(_id=1), fullDocument=dict(_id=1)))
+        yield previous.stopped
+        yield moment
+
+        self.assertEqual(len(streams), 2)
+        self.assertEqual(self.received, [])
+        self.assertEqual(checkpoint.position, "token")
+
+        streams[1].push(dict(_id="next", operationType="insert", documentKey=dict(_id=2), fullDocument=dict(_id=2)))
+        for _ in range(3):
+            yield moment
+
+        self.assertEqual([document["o"]["_id"] for document in self.received], [2])
+        self.assertEqual(checkpoint.position, "next")
+
+        stream.stop()
+        yield stream.stopped
+        checkpoint.stop()
+
+    def test_change_to_oplog(self):
+        document_id = ObjectId()
+        change = dict(operationType="update", documentKey=dict(_id=document_id),
+                      fullDocument=dict(_id=document_id, name="test"))
+
+        document = watch._CollectionStream.to_oplog("elastickube.Namespaces", change)
+        self.assertEqual(document, dict(ns="elastickube.Namespaces", op="u", o=dict(_id=document_id, name="test"),
+                                        o2=dict(_id=document_id)))
+
+        change["fullDocument"] = None
+        document = watch._CollectionStream.to_oplog("elastickube.Namespaces", change)
+        self.assertEqual(document["op"], "d")
+
+        change["operationType"] = "invalidate"
+        self.assertIsNone(watch._CollectionStream.to_oplog("elastickube.Namespaces", change))
+
+    @testing.gen_test
+    def test_oplog_query(self):
+        yield watch.add_callback("Settings", self.fast_callback)
+        self.assertEqual(watch.OplogBackend.build_query(["elastickube.Settings"], Timestamp(10, 0)), {
+            "ts": {"$gt": Timestamp(10, 0)},
+            "op": {"$in": watch.WATCHABLE_OPERATIONS},
+            "ns": {"$in": ["elastickube.Settings"]}
+        })
+
+        # Settings has been quiet since 10 when Charts is subscribed at 50
+        watch._backend = FakeBackend(Timestamp(50, 0))
+        try:
+            yield watch.add_callback("Charts", self.fast_callback)
+        finally:
+            watch._backend = None
+
+        query = watch.OplogBackend.build_query(["elastickube.Charts", "elastickube.Settings"], Timestamp(10, 0))
+        self.assertEqual(query["ts"], {"$gt": Timestamp(10, 0)})
+        self.assertEqual(query["$or"], [
+            {"ns": {"$in": ["elastickube.Settings"]}, "ts": {"$gt": Timestamp(10, 0)}},
+            {"ns": {"$in": ["elastickube.Charts"]}, "ts": {"$gt": Timestamp(50, 0)}}
+        ])
+
+        # Once the tail is past the subscription of Charts both are read from the last entry
+        query = watch.OplogBackend.build_query(["elastickube.Charts", "elastickube.Settings"], Timestamp(60, 0))
+        self.assertEqual(query["ns"], {"$in": ["elastickube.Charts", "elastickube.Settings"]})
+
+    @testing.gen_test
+    def test_oplog_filter(self):
+        self.assertEqual(watch.OplogBackend.get_filter(), ([], None))
+
+        yield watch.add_callback("Charts", self.fast_callback, projection={"resources": 0})
+        yield watch.add_callback("Users", self.fast_callback, projection={"password": 0})
+        self.assertEqual(watch.OplogBackend.get_filter(), (
+            ["elastickube.Charts", "elastickube.Users"], {"o.resources": 0, "o.password": 0}))
+
+        yield watch.add_callback("Charts", self.fast_callback)
+        self.assertEqual(watch.OplogBackend.get_filter(), (
+            ["elastickube.Charts", "elastickube.Users"], {"o.password": 0}))
+
+        yield watch.remove_callback("Charts", self.fast_callback)
+        yield watch.remove_callback("Users", self.fast_callback)
+        self.assertEqual(watch.OplogBackend.get_filter(), ([], None))
+
+
+if __name__ == "__main__":
+    unittest2.main()
@@ -18,6 +18,7 @@ import { EventEmitter } from 'events';
 
 const ERROR = 'ERROR';
 const EVENT = 'EVENT';
+const BATCH_PROTOCOL = 'elastickube.batch';
 
 class WebsocketClientService extends EventEmitter {
 
@@ -31,6 +32,7 @@ class WebsocketClientService extends EventEmitter {
         this._connectionAttempts = 1;
         this._eventsSubscribed = new Set();
         this._currentOnGoingMessages = {};
+        this._snapshotPages = {};
         this._apiPath = location.pathname.replace($location.path(), '');
 
         if (this._apiPath[0] !== '/') {
@@ -49,9 +51,9 @@ class WebsocketClientService extends EventEmitter {
 
         if (_.isUndefined(this._websocket) || this._websocket.readyState === WebSocket.CLOSED) {
             if (location.protocol === 'https:') {
-                this._websocket = new WebSocket(`wss://${location.hostname}${this._apiPath}`);
+                this._websocket = new WebSocket(`wss://${location.hostname}${this._apiPath}`, BATCH_PROTOCOL);
             } else {
-                this._websocket = new WebSocket(`ws://${location.hostname}:${location.port}${this._apiPath}`);
+                this._websocket = new WebSocket(`ws://${location.hostname}:${location.port}${this._apiPath}`, BATCH_PROTOCOL);
             }
 
             this._websocket.onopen = () => {
@@ -59,6 +61,7 @@ class WebsocketClientService extends EventEmitter {
 
                 this._connectionAttempts = 1;
                 this._reconnect = true;
+                this._snapshotPages = {};
 
                 _.each(this._eventsSubscribed, (watcher) =>
                     watcherPromises.push(this.sendMessage(watcher)
@@ -71,19 +74,10 @@ class WebsocketClientService extends EventEmitter {
             this._websocket.onmessage = (evt) => {
                 const message = JSON.parse(evt.data);
 
-                this._$rootScope.$apply(() => {
-                    if (message.correlation) {
-                        if (message.status_code >= 400) {
-                            this._currentOnGoingMessages[message.correlation].reject(message);
-                        } else {
-                            this._currentOnGoingMessages[message.correlation].resolve(message);
-                        }
-
-                        delete this._currentOnGoingMessages[message.correlation];
-                    } else {
-                        this.emit(EVENT, message);
-                    }
-                });
+                // Events are received in batches when the server accepted the batch protocol
+                const messages = message.operation === 'batch' ? message.body : [message];
+
+                this._$rootScope.$apply(() => _.each(messages, (batchMessage) => this._handleMessage(batchMessage)));
             };
 
             this._websocket.onerror = (x) => {
@@ -112,6 +106,30 @@ class WebsocketClientService extends EventEmitter {
         return defer.promise;
     }
 
+    _handleMessage(message) {
+        // Snapshots are streamed in pages tagged with their watch, the final watched message carries all of them
+        const pagesKey = message.watch;
+        if (message.operation === 'watching') {
+            this._snapshotPages[pagesKey] = (this._snapshotPages[pagesKey] || []).concat(message.body);
+            return;
+        } else if (message.operation === 'watched' && this._snapshotPages[pagesKey]) {
+            message.body = this._snapshotPages[pagesKey].concat(message.body);
+            delete this._snapshotPages[pagesKey];
+        }
+
+        if (message.correlation) {
+            if (message.status_code >= 400) {
+                this._currentOnGoingMessages[message.correlation].reject(message);
+            } else {
+                this._currentOnGoingMessages[message.correlation].resolve(message);
+            }
+
+            delete this._currentOnGoingMessages[message.correlation];
+        } else {
+            this.emit(EVENT, message);
+        }
+    }
+
     disconnect() {
         const promises = [];
 
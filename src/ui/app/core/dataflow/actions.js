@@ -43,6 +43,7 @@ const actions = {
     LOGS_LOADED: 'LOGS_LOADED',
 
     METRIC_CREATED: 'METRIC_CREATED',
+    METRIC_UPDATED: 'METRIC_UPDATED',
 
     METRICS_SUBSCRIBE: 'METRICS_SUBSCRIBE',
     METRICS_SUBSCRIBED: 'METRICS_SUBSCRIBED',
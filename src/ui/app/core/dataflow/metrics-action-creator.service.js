@@ -24,6 +24,7 @@ class MetricsActionCreatorService {
         this._dispatcher = dispatcher;
 
         metricsAPI.addOnCreatedListener((metric) => this._dispatcher.dispatch({ type: this._actions.METRIC_CREATED, metric }));
+        metricsAPI.addOnUpdatedListener((metric) => this._dispatcher.dispatch({ type: this._actions.METRIC_UPDATED, metric }));
     }
 
     subscribe(namespace) {
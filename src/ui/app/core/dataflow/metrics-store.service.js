@@ -35,7 +35,8 @@ class MetricsStoreService extends AbstractStore {
                     break;
 
                 case this._actions.METRIC_CREATED:
-                    this._addMetric(action.metric);
+                case this._actions.METRIC_UPDATED:
+                    this._addMetrics(action.metric);
                     this.emit(CHANGE_EVENT);
                     break;
 
@@ -44,12 +45,10 @@ class MetricsStoreService extends AbstractStore {
         });
     }
 
-    _addMetric(metric) {
-        this.metrics.push(metric);
-        if (this.metrics.length > MAX_RECORDS) {
-            this.metrics.shift();
-        }
-        this.metrics = _.sortBy(this.metrics, 'timestamp');
+    _addMetrics(metrics) {
+        // Created metrics are received in batches, rolled up buckets are updated until they are complete
+        const latest = _.uniqBy([].concat(metrics, this.metrics), (x) => `${_.get(x, 'involvedObject.name')} ${x.timestamp}`);
+        this.metrics = _.takeRight(_.sortBy(latest, 'timestamp'), MAX_RECORDS);
     }
 
     getMetrics() {